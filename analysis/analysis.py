@@ -17,40 +17,235 @@ SPDX-License-Identifier: GPL-3.0-or-later
 """
 
 import os
-import sys
 import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import yaml
+import numpy as np
+import pandas as pd
 
-from analysis_helper import shell, shell_return, load, git_annex
-from plot_helper import plot
+from analysis_helper import (shell, shell_return, load, prepare_result,
+                             annex_fields, aborted_runs, git_annex_add,
+                             git_annex_metadata_batch, ingested_jube_ids)
+from plot_helper import plot, plot_hardware, plot_energy, plot_chunks
+from results_index import ResultsIndex
+from scaling_model import ScalingModel
+from efficiency import add_efficiency
 
 with open('../config/analysis_config.yaml') as analysis_config_file:
     config = yaml.load(analysis_config_file, Loader=yaml.FullLoader)
 
-jube_id = str(sys.argv[1])
-base_path = os.path.join(config['jube_outpath'], jube_id.zfill(6))
-uuidgen_hash = shell_return('uuidgen')
-shell(
-    f"module load JUBE; jube analyse {config['jube_outpath']} --id {jube_id};"
-    + f" jube result {config['jube_outpath']} --id {jube_id} > "
-    + os.path.join(base_path, uuidgen_hash + ".csv"))
-
-# take the job and cpu info from first bench job, assuming all nodes are equal
-bench_path = glob.glob(os.path.join(base_path, '*_bench/work'))
-bench_path.sort()
-
-cpu_info = load(os.path.join(bench_path[0], 'cpu.json'))
-job_info = load(os.path.join(bench_path[0], 'job.json'))
-
-git_annex(cpu_info=cpu_info,
-          job_info=job_info,
-          uuidgen_hash=uuidgen_hash,
-          base_path=base_path)
-
-plot(
-    scaling_type=config['scaling_type'],
-    timer_hash=uuidgen_hash,
-    timer_file=os.path.join(
-        config['jube_outpath'], jube_id.zfill(6), uuidgen_hash + ".csv"),
-    save_path=os.path.join(config['jube_outpath'], jube_id.zfill(6))
-)
+
+def collect(jube_id):
+    """
+    Run the JUBE analysis of one benchmark and prepare its result files.
+    """
+    timings = {}
+    starttime = time.time()
+    base_path = os.path.join(config['jube_outpath'], jube_id.zfill(6))
+    uuidgen_hash = shell_return('uuidgen')
+    shell(
+        f"module load JUBE; jube analyse {config['jube_outpath']} --id {jube_id};"
+        + f" jube result {config['jube_outpath']} --id {jube_id} > "
+        + os.path.join(base_path, uuidgen_hash + ".csv"))
+    timings['jube'] = time.time() - starttime
+
+    # take the job and cpu info from first bench job, assuming all nodes are
+    # equal
+    starttime = time.time()
+    bench_path = glob.glob(os.path.join(base_path, '*_bench/work'))
+    bench_path.sort()
+
+    cpu_info = load(os.path.join(bench_path[0], 'cpu.json'))
+    job_info = load(os.path.join(bench_path[0], 'job.json'))
+    weak_scaling = job_info.get('scaling_type') == 'weak'
+
+    # speedup and efficiencies relative to the smallest configuration
+    timer_file = os.path.join(base_path, uuidgen_hash + ".csv")
+    add_efficiency(pd.read_csv(timer_file), config['scaling_type'],
+                   weak=weak_scaling).to_csv(
+        timer_file, index=False)
+
+    result_file_path, archive_path, object_paths = prepare_result(
+        uuidgen_hash, base_path,
+        metadata_store=config.get('metadata_store')
+        or os.environ.get('BENNCH_METADATA_STORE'))
+    fields = annex_fields(cpu_info, job_info, uuidgen_hash, result_file_path)
+    # identify the benchmark for later ingests
+    fields['jube_id'] = jube_id
+    fields['jube_outpath'] = os.path.abspath(config['jube_outpath'])
+    aborted = aborted_runs(result_file_path)
+    if aborted:
+        fields['aborted_runs'] = str(len(aborted))
+        for metadata_uuid, reason in aborted:
+            print(f'JUBE id {jube_id}: run {metadata_uuid} was aborted '
+                  + f'by the watchdog: {reason}')
+    timings['archive'] = time.time() - starttime
+    return {
+        'jube_id': jube_id,
+        'uuidgen_hash': uuidgen_hash,
+        'base_path': base_path,
+        'result_file_path': result_file_path,
+        'archive_path': archive_path,
+        'object_paths': object_paths,
+        'weak_scaling': weak_scaling,
+        'fields': fields,
+        'timings': timings,
+    }
+
+
+def render(result):
+    starttime = time.time()
+    timer_file = os.path.join(
+        result['base_path'], result['uuidgen_hash'] + ".csv")
+    prediction = None
+    if config['scaling_type'] == 'nodes' and config.get('predict_nodes') \
+            and not result['weak_scaling']:
+        # extrapolate the measured strong-scaling curve
+        model = ScalingModel.from_csv(timer_file)
+        nodes = list(model.num_nodes) + list(config['predict_nodes'])
+        prediction = model.predict(np.geomspace(min(nodes), max(nodes), 100))
+    plot(
+        scaling_type=config['scaling_type'],
+        timer_hash=result['uuidgen_hash'],
+        timer_file=timer_file,
+        save_path=result['base_path'],
+        prediction=prediction
+    )
+    plot_hardware(
+        scaling_type=config['scaling_type'],
+        timer_hash=result['uuidgen_hash'],
+        timer_file=timer_file,
+        save_path=result['base_path']
+    )
+    plot_energy(
+        scaling_type=config['scaling_type'],
+        timer_hash=result['uuidgen_hash'],
+        timer_file=timer_file,
+        save_path=result['base_path']
+    )
+    # timers over model time of simulations run in chunks
+    chunk_files = sorted(glob.glob(os.path.join(
+        result['base_path'], '*_bench/work/timer_chunks.npy')))
+    if chunk_files:
+        labels = []
+        for chunk_file in chunk_files:
+            job_info = load(os.path.join(os.path.dirname(chunk_file),
+                                         'job.json'))
+            labels.append(f"{job_info['num_nodes']} nodes, "
+                          + f"{job_info['tasks_per_node']}x"
+                          + f"{job_info['threads_per_task']} per node")
+        plot_chunks(
+            timer_hash=result['uuidgen_hash'],
+            chunk_files=chunk_files,
+            labels=labels,
+            save_path=result['base_path']
+        )
+    return time.time() - starttime
+
+
+def parse_jube_ids(args):
+    """
+    Expand single ids (12) and inclusive ranges (10-20).
+    """
+    jube_ids = []
+    for arg in args:
+        if '-' in arg:
+            first, last = arg.split('-')
+            jube_ids += [str(i) for i in range(int(first), int(last) + 1)]
+        else:
+            jube_ids.append(str(int(arg)))
+    return jube_ids
+
+
+def available_jube_ids():
+    return [str(int(name)) for name in os.listdir(config['jube_outpath'])
+            if name.isdigit() and glob.glob(
+                os.path.join(config['jube_outpath'], name, '*_bench/work'))]
+
+
+def main(jube_ids, processes=None, skip_ingested=True):
+    if skip_ingested:
+        ingested = ingested_jube_ids(os.path.abspath(config['jube_outpath']))
+        for jube_id in jube_ids:
+            if jube_id in ingested:
+                print(f'Skipping JUBE id {jube_id}, already ingested.')
+        jube_ids = [jube_id for jube_id in jube_ids
+                    if jube_id not in ingested]
+    if not jube_ids:
+        print('Nothing to ingest.')
+        return
+
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {jube_id: pool.submit(collect, jube_id)
+                   for jube_id in jube_ids}
+        for jube_id, future in futures.items():
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f'Collecting JUBE id {jube_id} failed: {e}')
+        if not results:
+            return
+
+        # annex all results at once, each git-annex call rewrites its branch
+        starttime = time.time()
+        # benchmarks may reference the same metadata objects
+        object_paths = {path for result in results
+                        for path in result['object_paths']}
+        git_annex_add([path for result in results
+                       for path in (result['result_file_path'],
+                                    result['archive_path'])]
+                      + sorted(object_paths))
+        git_annex_metadata_batch({result['result_file_path']: result['fields']
+                                  for result in results})
+        annex_time = time.time() - starttime
+
+        index = ResultsIndex()
+        for result in results:
+            index.add(result['result_file_path'], result['fields'])
+        index.close()
+
+        # a failing plot does not affect the other benchmarks
+        futures = {result['jube_id']: pool.submit(render, result)
+                   for result in results}
+        for result in results:
+            try:
+                result['timings']['plot'] = futures[result['jube_id']].result()
+            except Exception as e:
+                print(f"Plotting JUBE id {result['jube_id']} failed: {e}")
+                result['timings']['plot'] = float('nan')
+
+    print(f"{'jube_id':>8} {'jube':>8} {'archive':>8} {'plot':>8}  [s]")
+    for result in results:
+        timings = result['timings']
+        print(f"{result['jube_id']:>8} {timings['jube']:8.1f} "
+              + f"{timings['archive']:8.1f} {timings['plot']:8.1f}")
+    print(f'git annex (all results): {annex_time:.1f} s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Ingest JUBE benchmark results into the results '
+                    'repository. Run from within the results repository.')
+    parser.add_argument('jube_ids', nargs='*',
+                        help='JUBE ids, either single ids or ranges like '
+                             '10-20')
+    parser.add_argument('--new', action='store_true',
+                        help='ingest all benchmarks in the JUBE output path '
+                             'that are not yet in the results repository')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of benchmarks processed concurrently')
+    parser.add_argument('--force', action='store_true',
+                        help='ingest benchmarks even if they are already in '
+                             'the results repository')
+    args = parser.parse_args()
+
+    jube_ids = parse_jube_ids(args.jube_ids)
+    if args.new:
+        jube_ids += [jube_id for jube_id in available_jube_ids()
+                     if jube_id not in jube_ids]
+    if not jube_ids:
+        parser.error('no JUBE ids given')
+    main(jube_ids, processes=args.processes, skip_ingested=not args.force)
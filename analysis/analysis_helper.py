@@ -18,8 +18,8 @@ SPDX-License-Identifier: GPL-3.0-or-later
 
 import os
 import json
-import tarfile
 import glob
+import subprocess
 
 import numpy as np
 import pandas as pd
@@ -29,10 +29,6 @@ def shell(command):
     return os.system(command)
 
 
-def shell_without_print(command):
-    return os.system(command + '>/dev/null 2>&1')
-
-
 def shell_return(command):
     return os.popen(command).read().strip()
 
@@ -43,13 +39,24 @@ def load(filepath):
     return data
 
 
-def git_annex(cpu_info, job_info, uuidgen_hash, base_path):
+def prepare_result(uuidgen_hash, base_path, metadata_store=None):
+    """
+    Collect the metadata archives of all runs and write the result csv.
+
+    Node metadata that the runs took from the `metadata_store` of the
+    benchmarks is copied once into `metadata_objects` of the results
+    repository. Returns the paths of the result csv, of the metadata archive
+    and of the referenced metadata objects, all relative to the results
+    repository.
+    """
+    # imported here, the flipbook imports this module as part of a package
+    from results_archive import archive_name, write_archive
 
     tmp_result_file_path = os.path.join(base_path, uuidgen_hash + '.csv')
     result_file_path = os.path.join('./', uuidgen_hash + '.csv')
-    archive_path = f'{uuidgen_hash}.tgz'
+    archive_path = archive_name(uuidgen_hash)
 
-    ## tar gzip metadata archives, append uuids to results csv file
+    ## zip metadata archives, append uuids to results csv file
 
     metadata_archives = glob.glob(f"{base_path}/**/*.tgz", recursive=True)
     # sort metadata in same way as they are sorted in the csv
@@ -57,41 +64,131 @@ def git_annex(cpu_info, job_info, uuidgen_hash, base_path):
     # get metadata uuids from absolute paths
     metadata_uuids = [os.path.split(archive)[-1].split('.')[0]
                       for archive in metadata_archives]
-    # tar metadata archives for each run
-    with tarfile.open(archive_path, "w") as tar_obj:
-        for archive in metadata_archives:
-            tar_obj.add(archive,
-                        arcname=os.path.join(
-                            uuidgen_hash,
-                            os.path.split(archive)[-1]))
+    # one member per file of every run, see results_archive.py
+    object_paths = write_archive(archive_path, metadata_archives,
+                                 metadata_store)
     # add metadata uuid to corresponding csv entry
     csv = pd.read_csv(tmp_result_file_path)
     csv['metadata_uuid'] = metadata_uuids
     csv.to_csv(result_file_path)
-    
-    # works for machines with the naming scheme XXX.name (used for JSC
-    # clusters, might need adjustment for other machines)
-    machine = os.popen('echo $HOSTNAME').read().strip().split('.')[-1]
-    user = os.popen('echo $USER').read().strip()
-
-    shell(f'git annex add {result_file_path}')
-    shell(f'git annex add {archive_path}')
-    shell_without_print(
-        f'git annex metadata {result_file_path} --set key={uuidgen_hash}')
-
+    return result_file_path, archive_path, object_paths
+
+
+def aborted_runs(result_file_path):
+    """
+    Runs stopped by the watchdog, as (metadata uuid, reason) pairs.
+    """
+    csv = pd.read_csv(result_file_path)
+    if 'aborted' not in csv:
+        return []
+    aborted = csv[csv.aborted.fillna(0).astype(int) == 1]
+    reasons = aborted.abort_reason if 'abort_reason' in aborted \
+        else [None] * len(aborted)
+    return list(zip(aborted.metadata_uuid, reasons))
+
+
+def annex_fields(cpu_info, job_info, uuidgen_hash, result_file_path):
+    """
+    Metadata fields attached to a result file in the annex.
+    """
+    fields = {'key': uuidgen_hash}
     for info_dict in [job_info, cpu_info]:
         for key, value in info_dict.items():
-            value_without_spaces = value.replace(' ', ';')
-            shell_without_print(f'git annex metadata {result_file_path} '
-                                + f'--set {key}="{value_without_spaces}" '
-                                + '--force')
-    # additionally add machine and user name
-    shell_without_print(f'git annex metadata {result_file_path} '
-                        + f'--set machine="{machine}" --force')
-    shell_without_print(f'git annex metadata {result_file_path} '
-                        + f'--set user="{user}" --force')
+            fields[key] = value.replace(' ', ';')
+
+    # works for machines with the naming scheme XXX.name (used for JSC
+    # clusters, might need adjustment for other machines)
+    fields['machine'] = os.popen('echo $HOSTNAME').read().strip().split('.')[-1]
+    fields['user'] = os.popen('echo $USER').read().strip()
 
     averaged_over = len(
         np.unique(pd.read_csv(result_file_path)['rng_seed'].values))
-    shell_without_print(f'git annex metadata {result_file_path} '
-                        + f'--set averaged_over="{averaged_over}" --force')
+    fields['averaged_over'] = str(averaged_over)
+    return fields
+
+
+def git_annex_add(paths):
+    if paths:
+        shell('git annex add ' + ' '.join(paths))
+
+
+def git_annex_metadata_batch(metadata):
+    """
+    Set metadata of many annexed files in a single git-annex session.
+
+    Parameters
+    ----------
+    metadata : dict
+        Maps file paths to dictionaries of metadata fields. Values replace
+        existing values of the same field.
+
+    Returns
+    -------
+    failed : list
+        Files for which git-annex did not report success.
+    """
+    failed = []
+    with subprocess.Popen(['git', 'annex', 'metadata', '--batch', '--json'],
+                          stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                          text=True) as proc:
+        for file_path, fields in metadata.items():
+            request = {'file': file_path,
+                       'fields': {key: [str(value)]
+                                  for key, value in fields.items()}}
+            proc.stdin.write(json.dumps(request) + '\n')
+            proc.stdin.flush()
+            # git-annex answers every request with one line
+            reply = proc.stdout.readline()
+            try:
+                success = json.loads(reply).get('success', False)
+            except ValueError:
+                success = False
+            if not success:
+                failed.append(file_path)
+        proc.stdin.close()
+    for file_path in failed:
+        print(f'Setting git annex metadata failed for {file_path}')
+    return failed
+
+
+def annex_metadata(paths=None):
+    """
+    Metadata of annexed files, read in a single git-annex call.
+
+    Parameters
+    ----------
+    paths : list
+        Files or directories to query, defaults to the whole repository
+        below the working directory.
+
+    Returns
+    -------
+    metadata : dict
+        Maps file paths to dictionaries of metadata fields; fields with
+        several values are joined by ','.
+    """
+    output = subprocess.run(['git', 'annex', 'metadata', '--json']
+                            + list(paths or []),
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            text=True).stdout
+    metadata = {}
+    for line in output.splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        fields = {key: ','.join(values)
+                  for key, values in entry.get('fields', {}).items()
+                  if not key.endswith('lastchanged')}
+        metadata[entry['file']] = fields
+    return metadata
+
+
+def ingested_jube_ids(jube_outpath):
+    """
+    JUBE ids of the benchmarks in `jube_outpath` whose results are already
+    annexed in the results repository.
+    """
+    return {fields['jube_id'] for fields in annex_metadata().values()
+            if fields.get('jube_outpath') == jube_outpath
+            and 'jube_id' in fields}
@@ -0,0 +1,161 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+"""
+Speedup and parallel efficiency of a scaling experiment.
+
+The resources R are the number of nodes for scaling_type "nodes" and the
+number of virtual processes for "threads". Runs are grouped by all
+configuration parameters that are not scaled, and every timer is averaged
+over the seeds of a configuration. Relative to the configuration with the
+fewest resources R0 of its group, with mean time T0:
+
+- strong scaling: speedup T0 / T, parallel efficiency T0 / T * R0 / R
+- weak scaling: weak-scaling efficiency T0 / T, scaled speedup
+  T0 / T * R / R0
+
+using wall_time_sim as T, and each phase timer for the per-phase
+efficiencies `efficiency_phase_<phase>`. Every quantity comes with an
+`_err` column, the standard error propagated from the standard errors of
+the means of both times. The values of a configuration are repeated in
+the rows of all its seeds.
+
+analysis.py adds these columns to the result csv.
+
+Usage
+-----
+python efficiency.py <result.csv> --scaling-type nodes [--weak]
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+config_columns = ['num_nodes', 'tasks_per_node', 'threads_per_task',
+                  'model_time_sim']
+# parameters that make up the resources of each scaling type
+scaled_columns = {'nodes': ['num_nodes'],
+                  'threads': ['tasks_per_node', 'threads_per_task']}
+
+phases = ['update', 'collocate', 'communicate', 'deliver']
+
+
+def resources(df, scaling_type):
+    if scaling_type == 'nodes':
+        return df.num_nodes
+    return df.num_nodes * df.tasks_per_node * df.threads_per_task
+
+
+def efficiency_columns(weak=False):
+    main = ['speedup', 'weak_scaling_efficiency' if weak
+            else 'parallel_efficiency']
+    columns = main + [f'efficiency_phase_{phase}' for phase in phases]
+    return columns + [c + '_err' for c in columns]
+
+
+def add_efficiency(df, scaling_type, weak=False):
+    """
+    Add speedup and efficiency columns to a result table with one row per
+    run.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Result table
+    scaling_type : str
+        'nodes' or 'threads'
+    weak : bool
+        True for weak scaling, where the problem grows with the resources
+
+    Returns
+    -------
+    df : pd.DataFrame
+        Copy of `df` with the columns of `efficiency_columns(weak)`
+    """
+    df = df.copy()
+    df['_resources'] = resources(df, scaling_type)
+    # constant key for experiments without further parameters
+    df['_group'] = 0
+    keys = ['_group'] + [c for c in config_columns if c in df
+                         and c not in scaled_columns[scaling_type]]
+    timers = {'': 'wall_time_sim'}
+    timers.update({f'phase_{phase}': f'wall_time_phase_{phase}'
+                   for phase in phases})
+    timers = {name: timer for name, timer in timers.items() if timer in df}
+
+    # seed-aggregated means and their standard errors per configuration
+    configs = df.groupby(keys + ['_resources'])[list(timers.values())] \
+        .agg(['mean', 'sem'])
+    configs.columns = [f'{timer}_{stat}' for timer, stat in configs.columns]
+    # a single seed has no spread
+    configs = configs.fillna({f'{timer}_sem': 0. for timer in timers.values()})
+    configs = configs.reset_index()
+    # the configuration with the fewest resources of every group
+    reference = configs.loc[configs.groupby(keys)['_resources'].idxmin()]
+    configs = configs.merge(reference, on=keys, suffixes=('', '_ref'))
+
+    is_reference = configs['_resources'] == configs['_resources_ref']
+    ratio_resources = configs['_resources'] / configs['_resources_ref']
+    quantities = pd.DataFrame(index=configs.index)
+    for name, timer in timers.items():
+        ratio = configs[f'{timer}_mean_ref'] / configs[f'{timer}_mean']
+        error = ratio * np.sqrt(
+            (configs[f'{timer}_sem_ref'] / configs[f'{timer}_mean_ref']) ** 2
+            + (configs[f'{timer}_sem'] / configs[f'{timer}_mean']) ** 2)
+        # the reference configuration is compared with itself
+        error = error.where(~is_reference, 0.)
+        if name == '':
+            if weak:
+                quantities['speedup'] = ratio * ratio_resources
+                quantities['speedup_err'] = error * ratio_resources
+                quantities['weak_scaling_efficiency'] = ratio
+                quantities['weak_scaling_efficiency_err'] = error
+            else:
+                quantities['speedup'] = ratio
+                quantities['speedup_err'] = error
+                quantities['parallel_efficiency'] = ratio / ratio_resources
+                quantities['parallel_efficiency_err'] = \
+                    error / ratio_resources
+        else:
+            factor = 1. if weak else 1. / ratio_resources
+            quantities[f'efficiency_{name}'] = ratio * factor
+            quantities[f'efficiency_{name}_err'] = error * factor
+    quantities[keys + ['_resources']] = configs[keys + ['_resources']]
+
+    df = df.drop(columns=[c for c in quantities if c in df
+                          and c not in keys + ['_resources']])
+    df = df.reset_index().merge(quantities, on=keys + ['_resources'],
+                                how='left').set_index('index')
+    df.index.name = None
+    return df.drop(columns=['_resources', '_group'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('timer_file')
+    parser.add_argument('--scaling-type', choices=['nodes', 'threads'],
+                        default='nodes')
+    parser.add_argument('--weak', action='store_true')
+    args = parser.parse_args()
+
+    df = add_efficiency(pd.read_csv(args.timer_file), args.scaling_type,
+                        args.weak)
+    columns = [c for c in config_columns if c in df] \
+        + [c for c in efficiency_columns(args.weak) if c in df]
+    print(df[columns].drop_duplicates().to_string(index=False))
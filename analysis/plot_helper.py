@@ -17,6 +17,7 @@ SPDX-License-Identifier: GPL-3.0-or-later
 """
 
 import numpy as np
+import pandas as pd
 import bennchplot as bp
 from matplotlib import pyplot as plt
 import matplotlib.gridspec as gridspec
@@ -25,7 +26,16 @@ import tol_colors
 import os
 
 
-def plot(scaling_type, timer_hash, timer_file, save_path):
+def plot(scaling_type, timer_hash, timer_file, save_path, prediction=None):
+    """
+    prediction : pd.DataFrame, optional
+        Output of scaling_model.ScalingModel.predict; its real-time factor
+        and uncertainty band are drawn into the "nodes" plot.
+
+    If the result file contains the efficiency columns of efficiency.py,
+    a panel with the parallel efficiency is added below.
+    """
+    has_efficiency = efficiency_column(pd.read_csv(timer_file)) is not None
 
     if scaling_type == 'nodes':
         args = {
@@ -40,13 +50,14 @@ def plot(scaling_type, timer_hash, timer_file, save_path):
 
         # Plotting
         widths = [1, 1]
-        heights = [3, 1]
-        fig = plt.figure(figsize=(12, 6), constrained_layout=True)
-        spec = gridspec.GridSpec(ncols=2, nrows=2, figure=fig,
+        heights = [3, 1, 1.5] if has_efficiency else [3, 1]
+        fig = plt.figure(figsize=(12, 8 if has_efficiency else 6),
+                         constrained_layout=True)
+        spec = gridspec.GridSpec(ncols=2, nrows=len(heights), figure=fig,
                                  width_ratios=widths,
                                  height_ratios=heights)
 
-        ax1 = fig.add_subplot(spec[:, 0])
+        ax1 = fig.add_subplot(spec[:2, 0])
         ax2 = fig.add_subplot(spec[0, 1])
         ax3 = fig.add_subplot(spec[1, 1])
 
@@ -58,6 +69,12 @@ def plot(scaling_type, timer_hash, timer_file, save_path):
                  fontsize='medium', va='bottom', fontweight='bold')
         ax3.text(0.0, 1.0, 'C', transform=ax3.transAxes + trans,
                  fontsize='medium', va='bottom', fontweight='bold')
+        if has_efficiency:
+            ax4 = fig.add_subplot(spec[2, :])
+            ax4.text(0.0, 1.0, 'D', transform=ax4.transAxes + trans,
+                     fontsize='medium', va='bottom', fontweight='bold')
+            plot_efficiency(ax4, timer_file, scaling_type)
+            ax4.set_xlabel('Number of Nodes')
 
         B.plot_fractions(axis=ax1,
                          fill_variables=[
@@ -68,6 +85,14 @@ def plot(scaling_type, timer_hash, timer_file, save_path):
                          error=True)
         B.plot_main(quantities=['sim_factor'], axis=ax2,
                     error=True)
+        if prediction is not None:
+            prediction = prediction.sort_values('num_nodes')
+            ax2.plot(prediction.num_nodes, prediction.sim_factor,
+                     color='k', linestyle='--', label='model')
+            ax2.fill_between(prediction.num_nodes,
+                             prediction.sim_factor_low,
+                             prediction.sim_factor_high,
+                             color='k', alpha=0.15, linewidth=0)
         B.plot_fractions(axis=ax2,
                          fill_variables=[
                              'phase_update_factor',
@@ -107,6 +132,7 @@ def plot(scaling_type, timer_hash, timer_file, save_path):
             B.simple_axis(ax)
 
         plt.savefig(f'{save_path}/{timer_hash}.png', dpi=400)
+        plt.close(fig)
 
     elif scaling_type == 'threads':
 
@@ -121,14 +147,19 @@ def plot(scaling_type, timer_hash, timer_file, save_path):
 
         # Plotting
         widths = [1]
-        heights = [3, 1]
-        fig = plt.figure(figsize=(6, 6), constrained_layout=True)
-        spec = gridspec.GridSpec(ncols=1, nrows=2, figure=fig,
+        heights = [3, 1, 1.5] if has_efficiency else [3, 1]
+        fig = plt.figure(figsize=(6, 8 if has_efficiency else 6),
+                         constrained_layout=True)
+        spec = gridspec.GridSpec(ncols=1, nrows=len(heights), figure=fig,
                                  width_ratios=widths,
                                  height_ratios=heights)
 
         ax1 = fig.add_subplot(spec[0, :])
         ax2 = fig.add_subplot(spec[1, :])
+        if has_efficiency:
+            ax3 = fig.add_subplot(spec[2, :])
+            plot_efficiency(ax3, timer_file, scaling_type)
+            ax3.set_xlabel('number of vps')
 
         B.plot_main(quantities=['sim_factor'], axis=ax1, log=(False, True))
         B.plot_fractions(axis=ax2,
@@ -147,9 +178,207 @@ def plot(scaling_type, timer_hash, timer_file, save_path):
         B.merge_legends(ax1, ax2)
 
         plt.savefig(f'{save_path}/{timer_hash}.png', dpi=600)
+        plt.close(fig)
 
 
-def plot_comparison(scaling_type, timer_files, save_path, colors=None):
+def x_axis(df, scaling_type):
+    """
+    Values and label of the x axis of the plots of `scaling_type`.
+    """
+    if scaling_type == 'nodes':
+        return df.num_nodes, 'Number of Nodes'
+    return df.num_nodes * df.tasks_per_node * df.threads_per_task, \
+        'Number of Virtual Processes'
+
+
+def efficiency_column(df):
+    for column in ['parallel_efficiency', 'weak_scaling_efficiency']:
+        if column in df and df[column].notna().any():
+            return column
+    return None
+
+
+def plot_efficiency(ax, timer_file, scaling_type):
+    """
+    Efficiency of the simulation phase and of its phases, as computed by
+    efficiency.py, relative to the smallest configuration.
+    """
+    df = pd.read_csv(timer_file)
+    column = efficiency_column(df)
+    df['x'], _ = x_axis(df, scaling_type)
+    # the values are repeated for every seed of a configuration
+    configs = df.groupby('x').mean(numeric_only=True)
+    ax.errorbar(configs.index, configs[column],
+                yerr=configs.get(column + '_err'), color='k', marker='o',
+                capsize=3, label='simulation')
+    for phase in ['update', 'collocate', 'communicate', 'deliver']:
+        phase_column = f'efficiency_phase_{phase}'
+        if phase_column in configs and configs[phase_column].notna().any():
+            ax.errorbar(configs.index, configs[phase_column],
+                        yerr=configs.get(phase_column + '_err'), marker='.',
+                        capsize=2, label=phase)
+    ax.axhline(1., color='grey', linestyle=':', linewidth=1)
+    ax.set_ylabel(column.replace('_', ' '))
+    ax.legend(ncol=5, fontsize='small')
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+
+
+def plot_hardware(scaling_type, timer_hash, timer_file, save_path):
+    """
+    Instructions per cycle and miss rates from the hardware counters, saved
+    as <timer_hash>_hardware.png.
+
+    Returns
+    -------
+    plotted : bool
+        False if the benchmark was run without perf_events
+    """
+    df = pd.read_csv(timer_file)
+    if 'perf_ipc' not in df or df.perf_ipc.isna().all():
+        return False
+    df['x'], xlabel = x_axis(df, scaling_type)
+    grouped = df.groupby('x')
+    mean, std = grouped.mean(numeric_only=True), grouped.std(numeric_only=True)
+
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(6, 6), sharex=True,
+                                   constrained_layout=True)
+    ax1.errorbar(mean.index, mean.perf_ipc, yerr=std.perf_ipc, marker='o',
+                 capsize=3, label='mean')
+    if 'perf_ipc_min' in mean and 'perf_ipc_max' in mean:
+        ax1.fill_between(mean.index, mean.perf_ipc_min, mean.perf_ipc_max,
+                         alpha=0.2, linewidth=0, label='range across ranks')
+    ax1.set_ylabel('instructions per cycle')
+    ax1.legend()
+
+    rates = {'perf_llc_miss_rate': 'LLC load misses',
+             'perf_branch_miss_rate': 'branch misses',
+             'perf_frontend_stall_fraction': 'frontend stalls',
+             'perf_backend_stall_fraction': 'backend stalls'}
+    for column, label in rates.items():
+        if column in mean and mean[column].notna().any():
+            ax2.errorbar(mean.index, 100 * mean[column],
+                         yerr=100 * std[column], marker='o', capsize=3,
+                         label=label)
+    ax2.set_ylabel('rate [%]')
+    ax2.set_xlabel(xlabel)
+    ax2.legend()
+    for ax in [ax1, ax2]:
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+
+    plt.savefig(f'{save_path}/{timer_hash}_hardware.png', dpi=400)
+    plt.close(fig)
+    return True
+
+
+def plot_energy(scaling_type, timer_hash, timer_file, save_path):
+    """
+    Energy to solution and energy per second of model time from the RAPL
+    counters, saved as <timer_hash>_energy.png.
+
+    Returns
+    -------
+    plotted : bool
+        False if no energy was recorded
+    """
+    df = pd.read_csv(timer_file)
+    if 'energy_total' not in df or df.energy_total.isna().all():
+        return False
+    df['x'], xlabel = x_axis(df, scaling_type)
+    grouped = df.groupby('x')
+    mean, std = grouped.mean(numeric_only=True), grouped.std(numeric_only=True)
+
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(6, 6), sharex=True,
+                                   constrained_layout=True)
+    for column, label in [('energy_total', 'total'),
+                          ('energy_package', 'packages'),
+                          ('energy_dram', 'DRAM')]:
+        if column in mean and mean[column].notna().any():
+            ax1.errorbar(mean.index, 1e-3 * mean[column],
+                         yerr=1e-3 * std[column], marker='o', capsize=3,
+                         label=label)
+    ax1.set_ylabel('energy to solution [kJ]')
+    ax1.legend()
+    if 'energy_per_model_second' in mean:
+        ax2.errorbar(mean.index, 1e-3 * mean.energy_per_model_second,
+                     yerr=1e-3 * std.energy_per_model_second, marker='o',
+                     capsize=3, color='k')
+    # the energy includes network construction
+    ax2.set_ylabel(r'energy of script per $T_{\mathrm{model}}$ [kJ/s]')
+    ax2.set_xlabel(xlabel)
+    for ax in [ax1, ax2]:
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+
+    plt.savefig(f'{save_path}/{timer_hash}_energy.png', dpi=400)
+    plt.close(fig)
+    return True
+
+
+def plot_chunks(timer_hash, chunk_files, labels, save_path):
+    """
+    Real-time factor and phase breakdown over model time of simulations run
+    in chunks, from the timer_chunks.npy of collect_timer_data.py, saved as
+    <timer_hash>_chunks.png.
+
+    Parameters
+    ----------
+    chunk_files : list
+        timer_chunks.npy of every run
+    labels : list
+        Legend entry of every run; the phases are shown for the first run
+
+    Returns
+    -------
+    plotted : bool
+        False if no run has more than one chunk with model times
+    """
+    runs = []
+    for chunk_file, label in zip(chunk_files, labels):
+        chunks = np.load(chunk_file)
+        if len(chunks) > 1 and 'time_simulate' in chunks.dtype.names \
+                and not np.isnan(chunks['model_time']).all():
+            runs.append((chunks, label))
+    if not runs:
+        return False
+
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(6, 6), sharex=True,
+                                   constrained_layout=True)
+    for chunks, label in runs:
+        duration = np.diff(chunks['model_time'], prepend=0.)
+        ax1.plot(chunks['model_time'],
+                 chunks['time_simulate'] / (duration / 1e3),
+                 marker='o', label=label)
+    ax1.set_ylabel(r'real-time factor $T_{\mathrm{wall}}/T_{\mathrm{model}}$')
+    if len(runs) > 1:
+        ax1.legend()
+
+    chunks, label = runs[0]
+    phases = {'time_update': 'update',
+              'time_collocate_spike_data': 'collocate',
+              'time_communicate_spike_data': 'communicate',
+              'time_deliver_spike_data': 'deliver'}
+    phases = {timer: name for timer, name in phases.items()
+              if timer in chunks.dtype.names}
+    total = np.sum([chunks[timer] for timer in phases], axis=0)
+    ax2.stackplot(chunks['model_time'],
+                  [100 * chunks[timer] / total for timer in phases],
+                  labels=list(phases.values()), step='pre')
+    ax2.set_ylabel(f'phases of {label} [%]')
+    ax2.set_xlabel('model time [ms]')
+    ax2.legend(loc='lower right')
+    for ax in [ax1, ax2]:
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+
+    plt.savefig(f'{save_path}/{timer_hash}_chunks.png', dpi=400)
+    plt.close(fig)
+    return True
+
+
+def plot_comparison(scaling_type, timer_files, save_path, colors=None,
+                    labels=None):
 
     if colors is None:
         vibrant = tol_colors.tol_cset('vibrant')
@@ -174,9 +403,12 @@ def plot_comparison(scaling_type, timer_files, save_path, colors=None):
             'time_scaling': 1e3,
             'detailed_timers': False
         }
-        timer_hash = timer_file.split('/')[-1].split('.')[0]
-        file_path = os.popen(f"find . -name '*{timer_hash}.csv'").read().strip()
-        version = os.popen(f'git annex metadata {file_path} --get simulator-version').read().strip()
+        if labels is None:
+            timer_hash = timer_file.split('/')[-1].split('.')[0]
+            file_path = os.popen(f"find . -name '*{timer_hash}.csv'").read().strip()
+            version = os.popen(f'git annex metadata {file_path} --get simulator-version').read().strip()
+        else:
+            version = labels[i]
 
         # Instantiate class
         B = bp.Plot(**args)
@@ -0,0 +1,258 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+"""
+Performance-regression check between two sets of benchmark results.
+
+Baseline and candidate are selected from the results index with the
+filter syntax of results_index.py. Configurations (model, machine, number
+of nodes, tasks and threads) present in both are compared timer by timer,
+using every seed as a sample. For each timer, the relative change of the
+mean comes with a bootstrap confidence interval and a one-sided
+permutation test. A timer regresses if the whole confidence interval lies
+above the threshold and the test is significant.
+
+With few seeds, the exact permutation test cannot become significant: its
+smallest p-value is 1 / binom(n_b + n_c, n_c), i.e. 1/6 for two seeds on
+each side and 1/20 for three. Such comparisons are reported as
+'inconclusive' together with this `p_min` instead of as 'unchanged'; at
+the default alpha of 0.05, at least three seeds on one side and four on
+the other are needed.
+
+Usage, from within the results repository
+-----------------------------------------
+python ../analysis/regression.py \
+    --baseline simulator-version=3.5 --candidate simulator-version=3.6 \
+    --filter machine=jureca --report regression.json
+
+The exit code is 1 if any regression was found, 2 if none was found but
+some comparisons were inconclusive, 3 if no configuration matched the
+selection, and 0 otherwise.
+"""
+
+import sys
+import json
+import argparse
+import itertools
+from math import comb
+
+import numpy as np
+
+from results_index import ResultsIndex, parse_filters
+
+config_columns = ['model_name', 'machine', 'num_nodes', 'tasks_per_node',
+                  'threads_per_task']
+
+default_timers = ['sim_factor',
+                  'wall_time_sim',
+                  'wall_time_phase_update',
+                  'wall_time_phase_collocate',
+                  'wall_time_phase_communicate',
+                  'wall_time_phase_deliver']
+
+
+def completed(df):
+    # runs stopped by the watchdog (helpers/watchdog.py) are incomplete
+    if 'aborted' in df:
+        df = df[df.aborted.fillna(0).astype(int) != 1]
+    return df
+
+
+def add_sim_factor(df):
+    # real-time factor, wall_time_sim is in s and model_time_sim in ms
+    if 'wall_time_sim' in df and 'model_time_sim' in df:
+        df['sim_factor'] = df['wall_time_sim'] / (df['model_time_sim'] / 1e3)
+    return df
+
+
+def relative_change_ci(baseline, candidate, confidence, num_bootstrap, rng):
+    """
+    Bootstrap confidence interval of mean(candidate) / mean(baseline) - 1.
+    """
+    b = rng.choice(baseline, size=(num_bootstrap, len(baseline)))
+    c = rng.choice(candidate, size=(num_bootstrap, len(candidate)))
+    changes = c.mean(axis=1) / b.mean(axis=1) - 1.
+    alpha = 1. - confidence
+    return np.quantile(changes, [alpha / 2., 1. - alpha / 2.])
+
+
+def permutation_p_value(baseline, candidate, num_permutations, rng):
+    """
+    One-sided p-value of the candidate being slower than the baseline, with
+    the difference of the means as statistic. All permutations are tested
+    if there are at most `num_permutations`, otherwise a random sample.
+    """
+    pooled = np.concatenate([baseline, candidate])
+    n = len(candidate)
+    observed = candidate.mean() - baseline.mean()
+    if comb(len(pooled), n) <= num_permutations:
+        samples = [np.array(c) for c in
+                   itertools.combinations(range(len(pooled)), n)]
+    else:
+        samples = [rng.permutation(len(pooled))[:n]
+                   for _ in range(num_permutations)]
+    total = pooled.sum()
+    count = 0
+    for indices in samples:
+        c_sum = pooled[indices].sum()
+        diff = c_sum / n - (total - c_sum) / (len(pooled) - n)
+        if diff >= observed - 1e-12 * abs(observed):
+            count += 1
+    return count / len(samples)
+
+
+def compare(baseline, candidate, timers, threshold=0.05, confidence=0.95,
+            alpha=0.05, num_bootstrap=10000, num_permutations=100000,
+            seed=12345):
+    """
+    Compare matching configurations of two result DataFrames.
+
+    Returns
+    -------
+    comparisons : list
+        One dictionary per configuration and timer with sample sizes, means,
+        relative change, its confidence interval, p-values, the smallest
+        attainable p-value and verdict ('regression', 'improvement',
+        'unchanged' or 'inconclusive' if the samples are too small for the
+        test to reach `alpha`).
+    """
+    rng = np.random.default_rng(seed)
+    columns = [c for c in config_columns
+               if c in baseline.columns and c in candidate.columns]
+    comparisons = []
+    if not columns or baseline.empty or candidate.empty:
+        return comparisons
+    candidate_groups = dict(list(candidate.groupby(columns)))
+    for config, b_group in baseline.groupby(columns):
+        if config not in candidate_groups:
+            continue
+        c_group = candidate_groups[config]
+        for timer in timers:
+            if timer not in b_group or timer not in c_group:
+                continue
+            b = b_group[timer].dropna().values.astype(float)
+            c = c_group[timer].dropna().values.astype(float)
+            if len(b) < 2 or len(c) < 2 or b.mean() == 0:
+                continue
+            change = c.mean() / b.mean() - 1.
+            ci = relative_change_ci(b, c, confidence, num_bootstrap, rng)
+            p_slower = permutation_p_value(b, c, num_permutations, rng)
+            p_faster = permutation_p_value(-b, -c, num_permutations, rng)
+            p_min = 1. / comb(len(b) + len(c), len(c))
+            if p_min > alpha:
+                verdict = 'inconclusive'
+            elif ci[0] > threshold and p_slower <= alpha:
+                verdict = 'regression'
+            elif ci[1] < -threshold and p_faster <= alpha:
+                verdict = 'improvement'
+            else:
+                verdict = 'unchanged'
+            comparisons.append({
+                **{key: (value.item() if hasattr(value, 'item') else value)
+                   for key, value in zip(columns, config)},
+                'timer': timer,
+                'n_baseline': len(b),
+                'n_candidate': len(c),
+                'mean_baseline': b.mean(),
+                'mean_candidate': c.mean(),
+                'relative_change': change,
+                'ci': list(ci),
+                'p_slower': p_slower,
+                'p_faster': p_faster,
+                'p_min': p_min,
+                'verdict': verdict,
+            })
+    return comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Detect performance regressions between two sets of '
+                    'results in the results index.')
+    parser.add_argument('--baseline', nargs='+', required=True,
+                        help='filters selecting the baseline, key=value')
+    parser.add_argument('--candidate', nargs='+', required=True,
+                        help='filters selecting the candidate, key=value')
+    parser.add_argument('--filter', nargs='*', default=[],
+                        help='filters applied to both, key=value')
+    parser.add_argument('--timers', nargs='+', default=default_timers)
+    parser.add_argument('--threshold', type=float, default=0.05,
+                        help='relative slowdown that is tolerated')
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--alpha', type=float, default=0.05,
+                        help='significance level of the permutation test')
+    parser.add_argument('--report', default=None,
+                        help='write the report to this json file instead of '
+                             'stdout')
+    args = parser.parse_args()
+
+    common = parse_filters(args.filter)
+    index = ResultsIndex()
+    # --baseline and --candidate take precedence over --filter
+    baseline = add_sim_factor(completed(
+        index.query(**{**common, **parse_filters(args.baseline)})))
+    candidate = add_sim_factor(completed(
+        index.query(**{**common, **parse_filters(args.candidate)})))
+    index.close()
+
+    comparisons = compare(baseline, candidate, args.timers,
+                          threshold=args.threshold,
+                          confidence=args.confidence, alpha=args.alpha)
+    regressions = [c for c in comparisons if c['verdict'] == 'regression']
+    inconclusive = [c for c in comparisons if c['verdict'] == 'inconclusive']
+    report = {
+        'baseline': parse_filters(args.baseline),
+        'candidate': parse_filters(args.candidate),
+        'filter': common,
+        'threshold': args.threshold,
+        'confidence': args.confidence,
+        'alpha': args.alpha,
+        'num_comparisons': len(comparisons),
+        'num_regressions': len(regressions),
+        'num_inconclusive': len(inconclusive),
+        'comparisons': comparisons,
+    }
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+
+    for c in regressions:
+        print(f"REGRESSION {c['timer']} "
+              + ' '.join(f'{key}={c[key]}' for key in config_columns
+                         if key in c)
+              + f": {100 * c['relative_change']:+.1f}% "
+              + f"[{100 * c['ci'][0]:+.1f}%, {100 * c['ci'][1]:+.1f}%]",
+              file=sys.stderr)
+    if inconclusive:
+        p_min = min(c['p_min'] for c in inconclusive)
+        print(f'WARNING {len(inconclusive)} of {len(comparisons)} '
+              + 'comparisons are inconclusive: with the given seeds, the '
+              + f'smallest attainable p-value is {p_min:.3g} > alpha = '
+              + f'{args.alpha}. Run more seeds.', file=sys.stderr)
+    if not comparisons:
+        # most likely a typo in the selection, which must not pass
+        print('No matching configurations found.', file=sys.stderr)
+        sys.exit(3)
+    sys.exit(1 if regressions else 2 if inconclusive else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+"""
+Plan additional repetitions (seeds) only where the timings of a benchmark
+have not converged yet.
+
+For every configuration (number of nodes, tasks and threads) of a result
+csv, the 95% confidence interval of the mean of each timer is computed
+from the seeds run so far. Where its width relative to the mean exceeds
+the threshold, the number of seeds needed to reach it is estimated.
+Additional seeds are granted to the noisiest configurations first, as long
+as the estimated cost stays within the node-hour budget.
+
+The plan is written as a JUBE parameterset. Each value of
+`followup_index` is one (configuration, seed) pair, and the machine
+parameters and the seed are derived from it. It replaces `num_nodes`,
+`tasks_per_node` and `threads_per_task` of the machine_parameters and
+`rng_seed` of the model_parameters in the benchmark's `use` list.
+
+Usage
+-----
+python repetition_planner.py <result.csv | jube_id> --threshold 0.05 \
+    --budget 100 --output followup.yaml
+"""
+
+import io
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+import yaml
+
+config_columns = ['num_nodes', 'tasks_per_node', 'threads_per_task']
+
+default_timers = ['wall_time_sim',
+                  'wall_time_phase_update',
+                  'wall_time_phase_collocate',
+                  'wall_time_phase_communicate',
+                  'wall_time_phase_deliver']
+
+# parts of a run counted for its cost
+cost_timers = ['wall_time_create', 'wall_time_connect', 'wall_time_sim']
+
+# two-sided 95% quantiles of Student's t distribution for 1 to 30 degrees
+# of freedom, the normal quantile is used beyond
+t_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262,
+        2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101,
+        2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052,
+        2.048, 2.045, 2.042]
+
+
+def t_quantile(dof):
+    return t_95[dof - 1] if dof <= len(t_95) else 1.96
+
+
+def relative_ci_width(mean, std, n):
+    return 2. * t_quantile(n - 1) * std / np.sqrt(n) / mean
+
+
+def seeds_needed(mean, std, n, threshold, max_seeds):
+    """
+    Smallest number of seeds for which the relative width of the confidence
+    interval is expected to be below the threshold, at most `max_seeds`.
+    """
+    for n_new in range(n, max_seeds + 1):
+        if relative_ci_width(mean, std, n_new) <= threshold:
+            return n_new
+    return max_seeds
+
+
+def plan(df, threshold, budget, max_seeds=20, timers=default_timers,
+         overhead=60.):
+    """
+    Decide how many seeds to add to every configuration.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Result table with one row per run
+    threshold : float
+        Target relative width of the 95% confidence intervals
+    budget : float
+        Node hours available for additional runs
+    max_seeds : int
+        Upper limit of seeds per configuration
+    overhead : float
+        Seconds added to the measured run time for the cost estimate
+
+    Returns
+    -------
+    configurations : list
+        One dictionary per configuration with the current relative widths,
+        the number of seeds run, needed and granted, and the estimated cost
+        per run in node hours.
+    """
+    columns = [c for c in config_columns if c in df]
+    timers = [t for t in timers if t in df]
+    configurations = []
+    for config, group in df.groupby(columns):
+        n = group.rng_seed.nunique()
+        widths = {}
+        needed = n
+        for timer in timers:
+            values = group[timer].dropna().values
+            if len(values) < 2 or values.mean() == 0:
+                continue
+            mean, std = values.mean(), values.std(ddof=1)
+            widths[timer] = relative_ci_width(mean, std, len(values))
+            needed = max(needed, seeds_needed(mean, std, len(values),
+                                              threshold, max_seeds))
+        run_time = group[[t for t in cost_timers if t in group]].sum(
+            axis=1).mean() + overhead
+        configurations.append({
+            **{key: (value.item() if hasattr(value, 'item') else value)
+               for key, value in zip(columns, config)},
+            'seeds': n,
+            'max_relative_ci_width': max(widths.values(), default=np.nan),
+            'relative_ci_width': widths,
+            'seeds_needed': needed,
+            'node_hours_per_run': dict(zip(columns, config)).get(
+                'num_nodes', 1) * run_time / 3600.,
+            'seeds_added': 0,
+        })
+
+    # noisiest configurations first
+    remaining = budget
+    for c in sorted(configurations,
+                    key=lambda c: -np.nan_to_num(c['max_relative_ci_width'])):
+        extra = c['seeds_needed'] - c['seeds']
+        if np.isinf(remaining) or c['node_hours_per_run'] <= 0:
+            affordable = extra
+        else:
+            affordable = int(remaining // c['node_hours_per_run'])
+        c['seeds_added'] = max(0, min(extra, affordable))
+        remaining -= c['seeds_added'] * c['node_hours_per_run']
+    return configurations
+
+
+def followup_parameterset(configurations, first_seed):
+    """
+    JUBE parameterset running the granted seeds of every configuration.
+    """
+    runs = []
+    for c in configurations:
+        for seed in range(first_seed, first_seed + c['seeds_added']):
+            runs.append({**{key: c[key] for key in config_columns if key in c},
+                         'rng_seed': seed})
+    if not runs:
+        return None
+    parameters = [{'name': 'followup_index', 'type': 'int',
+                   '_': ','.join(str(i) for i in range(len(runs)))}]
+    for key in list(runs[0]):
+        values = [run[key] for run in runs]
+        parameters.append({'name': key, 'type': 'int', 'mode': 'python',
+                           '_': f'{values}[$followup_index]'})
+    return {'parameterset': [{'name': 'followup', 'parameter': parameters}]}
+
+
+def load_results(source):
+    """
+    Result table from a csv file or, given a JUBE id, from `jube result`
+    using the analysis config.
+    """
+    if os.path.exists(source):
+        return pd.read_csv(source)
+    with open('../config/analysis_config.yaml') as analysis_config_file:
+        config = yaml.safe_load(analysis_config_file)
+    csv = os.popen(f"module load JUBE; jube result {config['jube_outpath']} "
+                   + f"--id {source}").read()
+    return pd.read_csv(io.StringIO(csv))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('source', help='result csv or JUBE id')
+    parser.add_argument('--threshold', type=float, default=0.05,
+                        help='target relative width of the 95%% confidence '
+                             'interval of every timer')
+    parser.add_argument('--budget', type=float, default=np.inf,
+                        help='node hours available for additional runs')
+    parser.add_argument('--max-seeds', type=int, default=20)
+    parser.add_argument('--timers', nargs='+', default=default_timers)
+    parser.add_argument('--output', default='followup.yaml',
+                        help='file for the JUBE parameterset')
+    args = parser.parse_args()
+
+    df = load_results(args.source)
+    configurations = plan(df, args.threshold, args.budget,
+                          max_seeds=args.max_seeds, timers=args.timers)
+    for c in configurations:
+        print(' '.join(f'{key}={c[key]}' for key in config_columns if key in c)
+              + f": {c['seeds']} seeds, CI width "
+              + f"{100 * c['max_relative_ci_width']:.1f}%, needs "
+              + f"{c['seeds_needed']}, adding {c['seeds_added']} "
+              + f"({c['seeds_added'] * c['node_hours_per_run']:.2f} node hours)")
+
+    parameterset = followup_parameterset(configurations,
+                                         int(df.rng_seed.max()) + 1)
+    if parameterset is None:
+        print('All configurations have converged or no budget is left.')
+    else:
+        with open(args.output, 'w') as f:
+            yaml.safe_dump(parameterset, f, sort_keys=False)
+        print(f'Follow-up parameterset written to {args.output}.')
@@ -0,0 +1,374 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+"""
+Metadata archive of a benchmark in the results repository.
+
+Every run of a benchmark leaves a gzipped tar of its metadata
+(`<metadata_uuid>.tgz`, see helpers/helpers.yaml). analysis.py stores the
+files of all runs in one zip archive `<uuidgen_hash>.zip` next to the result
+csv, as members `<metadata_uuid>/<path>`. Each member is compressed on its
+own and located through the central directory of the zip, so a single file
+of a single run, e.g. its stderr, is read without decompressing the rest.
+The metadata uuid of every run is the `metadata_uuid` column of the csv.
+
+Static node metadata that a job took from the metadata store
+(helpers/metadata_store.py) is only referenced by `<name>.ref` files in
+the archive of the run. The references are kept, and every referenced
+object is copied once into `metadata_objects/<digest[:2]>/<digest[2:]>` of
+the results repository, next to the archives. `ResultsArchive` resolves the
+references when members are read or extracted; archives with references
+that are neither in `metadata_objects` nor in the metadata store are not
+written.
+
+Archives of earlier versions, `<uuidgen_hash>.tgz` holding the tgz of every
+run, are converted with `convert`.
+
+Usage, from within the results repository
+-----------------------------------------
+python ../analysis/results_archive.py list <hash>.zip [<metadata_uuid>]
+python ../analysis/results_archive.py extract <hash>.zip <metadata_uuid> \
+    [<member> ...] [--directory <dir>] [--no-resolve]
+python ../analysis/results_archive.py convert <hash>.tgz ... [--annex] \
+    [--metadata-store <store>]
+"""
+
+import os
+import sys
+import shutil
+import tarfile
+import zipfile
+import argparse
+import tempfile
+import subprocess
+import time
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'helpers'))
+from metadata_store import MetadataStore, object_path  # noqa: E402
+
+# members that do not shrink any further
+stored_extensions = ('.gz', '.tgz', '.zip', '.png', '.jpg', '.bz2', '.xz')
+
+# objects of the metadata store, relative to the results repository
+objects_dirname = 'metadata_objects'
+
+
+def archive_name(uuidgen_hash):
+    return f'{uuidgen_hash}.zip'
+
+
+def _add_object(objects_dir, store, name, digest):
+    """
+    Copy the object `digest` from the metadata store into `objects_dir`
+    unless it is already there, return its path in `objects_dir`.
+    """
+    path = object_path(objects_dir, digest)
+    # an annexed object may be a symlink without content
+    if os.path.lexists(path):
+        return path
+    if store is None or not os.path.isfile(store.object_path(digest)):
+        raise FileNotFoundError(
+            f'{name} references {digest}, which is neither in {objects_dir} '
+            f'nor in the metadata store {store and store.path!r}; set '
+            'metadata_store to the store the benchmarks were run with')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # archives of several benchmarks may be written concurrently
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with open(store.object_path(digest), 'rb') as src, \
+            os.fdopen(fd, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _add_run(zip_obj, metadata_uuid, tar_obj, objects_dir, store=None):
+    """
+    Copy the regular files of the metadata tar of one run into the zip,
+    streaming member by member, and the objects referenced by `.ref` files
+    into `objects_dir`.
+
+    Returns
+    -------
+    object_paths : set
+        Paths of the referenced objects in `objects_dir`
+    """
+    object_paths = set()
+    for tarinfo in tar_obj:
+        if not tarinfo.isfile():
+            continue
+        name = tarinfo.name
+        if name.startswith('./'):
+            name = name[2:]
+        if not name.startswith(metadata_uuid + '/'):
+            name = f'{metadata_uuid}/{name}'
+        # zip timestamps start in 1980
+        zipinfo = zipfile.ZipInfo(name, date_time=max(
+            time.localtime(tarinfo.mtime)[:6], (1980, 1, 1, 0, 0, 0)))
+        zipinfo.external_attr = (tarinfo.mode & 0o7777) << 16
+        zipinfo.compress_type = zipfile.ZIP_STORED \
+            if name.endswith(stored_extensions) else zipfile.ZIP_DEFLATED
+        if name.endswith('.ref'):
+            with tar_obj.extractfile(tarinfo) as src:
+                digest = src.read().decode().strip()
+            object_paths.add(_add_object(objects_dir, store, name, digest))
+        with tar_obj.extractfile(tarinfo) as src, \
+                zip_obj.open(zipinfo, 'w', force_zip64=True) as dst:
+            shutil.copyfileobj(src, dst)
+    return object_paths
+
+
+def _objects_dir(archive_path):
+    return os.path.join(os.path.dirname(archive_path), objects_dirname)
+
+
+def _open_store(metadata_store):
+    if metadata_store and os.path.isdir(metadata_store):
+        return MetadataStore(metadata_store)
+    return None
+
+
+def _metadata_uuid(path):
+    return os.path.basename(path).split('.')[0]
+
+
+def write_archive(archive_path, metadata_archives, metadata_store=None):
+    """
+    Write the metadata tgz files of all runs into one zip archive.
+
+    Parameters
+    ----------
+    archive_path : str
+        Path of the zip archive
+    metadata_archives : list
+        Paths of the `<metadata_uuid>.tgz` of every run
+    metadata_store : str, optional
+        Path of the metadata store that `.ref` files refer to
+
+    Returns
+    -------
+    object_paths : list
+        Paths of the referenced objects in `metadata_objects` next to the
+        archive, to be added to the results repository with the archive
+    """
+    objects_dir = _objects_dir(archive_path)
+    store = _open_store(metadata_store)
+    object_paths = set()
+    try:
+        with zipfile.ZipFile(archive_path, 'w') as zip_obj:
+            for metadata_archive in metadata_archives:
+                with tarfile.open(metadata_archive, 'r:gz') as tar_obj:
+                    object_paths |= _add_run(
+                        zip_obj, _metadata_uuid(metadata_archive), tar_obj,
+                        objects_dir, store)
+    except FileNotFoundError:
+        os.remove(archive_path)
+        raise
+    return sorted(object_paths)
+
+
+def convert(tgz_path, archive_path=None, metadata_store=None):
+    """
+    Convert an archive of earlier versions, a tar of the tgz of every run,
+    into a zip archive.
+
+    Returns
+    -------
+    archive_path : str
+        Path of the zip archive, by default next to `tgz_path`
+    object_paths : list
+        Paths of the referenced objects in `metadata_objects` next to the
+        archive
+    """
+    if archive_path is None:
+        archive_path = os.path.splitext(tgz_path)[0] + '.zip'
+    objects_dir = _objects_dir(archive_path)
+    store = _open_store(metadata_store)
+    object_paths = set()
+    try:
+        with tarfile.open(tgz_path, 'r:*') as outer, \
+                zipfile.ZipFile(archive_path, 'w') as zip_obj:
+            for tarinfo in outer:
+                if not (tarinfo.isfile() and tarinfo.name.endswith('.tgz')):
+                    continue
+                with outer.extractfile(tarinfo) as fileobj, \
+                        tarfile.open(fileobj=fileobj, mode='r:gz') as tar_obj:
+                    object_paths |= _add_run(
+                        zip_obj, _metadata_uuid(tarinfo.name), tar_obj,
+                        objects_dir, store)
+    except FileNotFoundError:
+        os.remove(archive_path)
+        raise
+    return archive_path, sorted(object_paths)
+
+
+class ResultsArchive(object):
+    """
+    Random access to the metadata of the runs of one benchmark.
+
+    Member names are relative to the directory of their run, e.g.
+    `stderr` or `resources/<hostname>.json`. References `<name>.ref` to
+    static node metadata are resolved from `objects_dir`, by default
+    `metadata_objects` next to the archive.
+    """
+
+    def __init__(self, path, objects_dir=None):
+        self.zip_obj = zipfile.ZipFile(path, 'r')
+        self.names = set(self.zip_obj.namelist())
+        self.objects_dir = objects_dir or _objects_dir(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.zip_obj.close()
+
+    def runs(self):
+        """
+        Metadata uuids of all runs in the archive.
+        """
+        return sorted({name.split('/', 1)[0]
+                       for name in self.zip_obj.namelist()})
+
+    def members(self, metadata_uuid):
+        prefix = metadata_uuid + '/'
+        return [name[len(prefix):] for name in self.zip_obj.namelist()
+                if name.startswith(prefix)]
+
+    def open(self, metadata_uuid, member):
+        """
+        File object of one member, decompressed while it is read.
+        """
+        return self.zip_obj.open(f'{metadata_uuid}/{member}')
+
+    def resolve(self, metadata_uuid, member):
+        """
+        Content of the object that the `<name>.ref` member refers to.
+        """
+        digest = self.zip_obj.read(
+            f'{metadata_uuid}/{member}').decode().strip()
+        path = object_path(self.objects_dir, digest)
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise FileNotFoundError(
+                f'{member} of {metadata_uuid} references {path}, which is '
+                'missing; get it with git annex get') from None
+
+    def read(self, metadata_uuid, member):
+        """
+        Content of one member. `<name>.out` of node metadata that the run
+        only references is read from the referenced object.
+        """
+        name = f'{metadata_uuid}/{member}'
+        if member.endswith('.out') and name not in self.names:
+            ref = member[:-len('.out')] + '.ref'
+            if f'{metadata_uuid}/{ref}' in self.names:
+                return self.resolve(metadata_uuid, ref)
+        return self.zip_obj.read(name)
+
+    def extract(self, metadata_uuid, members=None, path='.', resolve=True):
+        """
+        Extract members of one run, all of them by default, into
+        `path`/`metadata_uuid`. With `resolve`, `<name>.ref` members are
+        extracted as `<name>.out` files with the referenced content.
+
+        Returns
+        -------
+        paths : list
+            Paths of the extracted files
+        """
+        if members is None:
+            members = self.members(metadata_uuid)
+        paths = []
+        for member in members:
+            if not (resolve and member.endswith('.ref')):
+                paths.append(self.zip_obj.extract(
+                    f'{metadata_uuid}/{member}', path))
+                continue
+            out_path = os.path.join(path, metadata_uuid,
+                                    member[:-len('.ref')] + '.out')
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            with open(out_path, 'wb') as f:
+                f.write(self.resolve(metadata_uuid, member))
+            paths.append(out_path)
+        return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Read and convert the metadata archives of the results '
+                    'repository.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    list_parser = subparsers.add_parser(
+        'list', help='list the runs, or the members of one run')
+    list_parser.add_argument('archive')
+    list_parser.add_argument('metadata_uuid', nargs='?')
+    extract_parser = subparsers.add_parser(
+        'extract', help='extract members of one run')
+    extract_parser.add_argument('archive')
+    extract_parser.add_argument('metadata_uuid')
+    extract_parser.add_argument('members', nargs='*',
+                                help='all members if none are given')
+    extract_parser.add_argument('--directory', '-C', default='.')
+    extract_parser.add_argument('--no-resolve', action='store_true',
+                                help='extract <name>.ref files as they are '
+                                     'instead of the referenced metadata')
+    convert_parser = subparsers.add_parser(
+        'convert', help='convert <hash>.tgz archives into zip archives')
+    convert_parser.add_argument('archives', nargs='+')
+    convert_parser.add_argument('--annex', action='store_true',
+                                help='get the old archives, annex the new '
+                                     'ones and remove the old ones from git')
+    convert_parser.add_argument('--metadata-store', default=None,
+                                help='store referenced by .ref files of '
+                                     'the runs')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        with ResultsArchive(args.archive) as archive:
+            names = archive.members(args.metadata_uuid) \
+                if args.metadata_uuid else archive.runs()
+            print('\n'.join(names))
+    elif args.command == 'extract':
+        with ResultsArchive(args.archive) as archive:
+            for path in archive.extract(args.metadata_uuid,
+                                        args.members or None,
+                                        args.directory,
+                                        resolve=not args.no_resolve):
+                print(path)
+    else:
+        for tgz_path in args.archives:
+            if args.annex:
+                subprocess.run(['git', 'annex', 'get', tgz_path], check=True)
+            archive_path, object_paths = convert(
+                tgz_path, metadata_store=args.metadata_store)
+            print(f'{tgz_path} -> {archive_path}')
+            if args.annex:
+                subprocess.run(['git', 'annex', 'add', archive_path]
+                               + object_paths, check=True)
+                subprocess.run(['git', 'rm', '-q', tgz_path], check=True)
+
+
+if __name__ == '__main__':
+    main()
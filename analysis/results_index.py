@@ -0,0 +1,210 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+"""
+Local SQLite index of the results repository.
+
+The index holds the rows of every result csv together with the git-annex
+metadata of the file, so benchmarks can be selected and compared without
+touching the git-annex branch or the working tree. It lives next to the
+results (`results_index.sqlite`, not to be committed) and is updated by
+analysis.py whenever a benchmark is ingested.
+
+Usage, from within the results repository
+-----------------------------------------
+python ../analysis/results_index.py rebuild
+python ../analysis/results_index.py query machine=jureca num_nodes='{1,2}'
+python ../analysis/results_index.py query --runs simulator-version='3.*'
+
+Filters follow the syntax of `git annex view`: `*` is a wildcard and
+`{a,b}` matches either value.
+"""
+
+import os
+import sys
+import sqlite3
+
+import pandas as pd
+
+from analysis_helper import annex_metadata
+
+index_name = 'results_index.sqlite'
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _glob_patterns(value):
+    if value.startswith('{') and value.endswith('}'):
+        return value[1:-1].split(',')
+    return [value]
+
+
+class ResultsIndex(object):
+    def __init__(self, path=index_name):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS runs '
+            + '(timer_hash TEXT PRIMARY KEY, file TEXT)')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS results (timer_hash TEXT)')
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS results_hash ON results (timer_hash)')
+
+    def _columns(self, table):
+        return [row[1] for row in
+                self.connection.execute(f'PRAGMA table_info({table})')]
+
+    def _add_columns(self, table, columns):
+        existing = set(self._columns(table))
+        for column in columns:
+            if column not in existing:
+                self.connection.execute(
+                    f'ALTER TABLE {table} ADD COLUMN {_quote(column)}')
+
+    def _insert(self, table, rows):
+        if not rows:
+            return
+        columns = list(rows[0])
+        self._add_columns(table, columns)
+        self.connection.executemany(
+            f'INSERT OR REPLACE INTO {table} '
+            + f'({", ".join(_quote(c) for c in columns)}) '
+            + f'VALUES ({", ".join("?" for _ in columns)})',
+            [tuple(row[c] for c in columns) for row in rows])
+
+    def add(self, result_file_path, fields):
+        """
+        Add or replace a result csv and its metadata fields.
+        """
+        timer_hash = fields.get(
+            'key', os.path.basename(result_file_path).split('.')[0])
+        df = pd.read_csv(result_file_path, index_col=0)
+        df.insert(0, 'timer_hash', timer_hash)
+        # sqlite only stores plain Python values
+        rows = [{key: (None if pd.isna(value) else
+                       value.item() if hasattr(value, 'item') else value)
+                 for key, value in row.items()}
+                for row in df.to_dict('records')]
+        with self.connection:
+            self.connection.execute(
+                'DELETE FROM results WHERE timer_hash = ?', (timer_hash,))
+            self._insert('results', rows)
+            self._insert('runs', [dict(fields, timer_hash=timer_hash,
+                                       file=result_file_path)])
+
+    def rebuild(self):
+        """
+        Index all result files of the repository below the working directory.
+        """
+        for file_path, fields in annex_metadata().items():
+            if not file_path.endswith('.csv') or 'key' not in fields:
+                continue
+            if not os.path.exists(file_path):
+                print(f'Skipping {file_path}, content not available locally '
+                      + '(git annex get).')
+                continue
+            self.add(file_path, fields)
+
+    def _run_selection(self, filters):
+        """
+        SELECT of the runs matching the filters and its parameters, None if
+        a filter refers to an unknown field.
+        """
+        columns = set(self._columns('runs'))
+        conditions = []
+        parameters = []
+        for key, value in filters.items():
+            if key not in columns:
+                return None
+            patterns = _glob_patterns(str(value))
+            conditions.append(
+                '(' + ' OR '.join(f'{_quote(key)} GLOB ?' for _ in patterns)
+                + ')')
+            parameters += patterns
+        query = 'FROM runs'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        return query, parameters
+
+    def runs(self, **filters):
+        """
+        Metadata of all result files matching the filters, one row per file.
+        """
+        selection = self._run_selection(filters)
+        if selection is None:
+            return pd.DataFrame(columns=sorted(self._columns('runs')))
+        query, parameters = selection
+        return pd.read_sql_query('SELECT * ' + query, self.connection,
+                                 params=parameters)
+
+    def query(self, **filters):
+        """
+        Result rows of all files matching the filters, with the metadata of
+        their file attached as additional columns.
+        """
+        runs = self.runs(**filters)
+        if runs.empty:
+            return pd.DataFrame()
+        # a subquery, the number of bound parameters of sqlite is limited
+        query, parameters = self._run_selection(filters)
+        results = pd.read_sql_query(
+            'SELECT * FROM results WHERE timer_hash IN '
+            + f'(SELECT timer_hash {query})',
+            self.connection, params=parameters)
+        # values in the csv take precedence over the metadata of the file
+        runs = runs[[c for c in runs.columns
+                     if c == 'timer_hash' or c not in results.columns]]
+        results = results.dropna(axis='columns', how='all')
+        return results.merge(runs, on='timer_hash')
+
+    def close(self):
+        self.connection.close()
+
+
+def parse_filters(args):
+    filters = {}
+    for arg in args:
+        key, value = arg.split('=', 1)
+        filters[key] = value.strip('"\'')
+    return filters
+
+
+if __name__ == '__main__':
+    usage = (f'usage: {sys.argv[0]} rebuild\n'
+             + f'       {sys.argv[0]} query [--runs] [key=value ...]')
+    if len(sys.argv) < 2 or sys.argv[1] not in ['rebuild', 'query']:
+        sys.exit(usage)
+
+    index = ResultsIndex()
+    if sys.argv[1] == 'rebuild':
+        index.rebuild()
+    else:
+        args = sys.argv[2:]
+        if '--runs' in args:
+            args.remove('--runs')
+            df = index.runs(**parse_filters(args))
+        else:
+            df = index.query(**parse_filters(args))
+        with pd.option_context('display.max_rows', None,
+                               'display.max_columns', None,
+                               'display.width', None):
+            print(df)
+    index.close()
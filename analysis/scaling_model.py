@@ -0,0 +1,193 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+"""
+Performance models of the state-propagation phases over the number of
+nodes N, fitted to the result csv of a scaling experiment.
+
+Every phase is modelled as a linear combination of basis functions,
+fitted by least squares to all seeds:
+
+- update, collocate, deliver: c + a / N (work divided among the nodes)
+- communicate: c + b log2(N) + alpha N + beta / N (a log(N) collective
+  term, latency alpha per communication partner and bandwidth beta for the
+  share of the data sent by every node)
+- remaining time of the simulation phase: c + a / N
+
+Terms are dropped from the end of a list if there are not more distinct
+node counts than terms. The wall time of the simulation phase is the sum
+of all parts, the real-time factor is this wall time divided by the model
+time. Uncertainties are 95% prediction intervals, assuming independent
+parts.
+
+The predicted real-time factor is overlaid on the "nodes" plot of
+plot_helper.plot if `predict_nodes` is set in the analysis config.
+
+Usage
+-----
+python scaling_model.py <result.csv> --predict 64 128
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+basis_functions = {
+    'constant': lambda n: np.ones_like(n),
+    'inverse': lambda n: 1. / n,
+    'log': lambda n: np.log2(n),
+    'linear': lambda n: n,
+}
+
+phase_models = {
+    'wall_time_phase_update': ['constant', 'inverse'],
+    'wall_time_phase_collocate': ['constant', 'inverse'],
+    'wall_time_phase_deliver': ['constant', 'inverse'],
+    'wall_time_phase_communicate': ['constant', 'log', 'linear', 'inverse'],
+}
+# part of wall_time_sim not covered by the phase timers
+other = 'wall_time_other'
+other_model = ['constant', 'inverse']
+
+z_95 = 1.96
+
+
+class PhaseFit(object):
+    """
+    Least-squares fit of one phase.
+    """
+
+    def __init__(self, terms, num_nodes, times):
+        num_distinct = len(np.unique(num_nodes))
+        self.terms = terms[:max(1, min(len(terms), num_distinct - 1))]
+        X = self.design(num_nodes)
+        self.coefficients, *_ = np.linalg.lstsq(X, times, rcond=None)
+        residuals = times - X @ self.coefficients
+        dof = max(1, len(times) - len(self.terms))
+        self.residual_variance = residuals @ residuals / dof
+        self.covariance = self.residual_variance * np.linalg.pinv(X.T @ X)
+        self.rmse = np.sqrt(np.mean(residuals ** 2))
+        total = np.sum((times - times.mean()) ** 2)
+        self.r_squared = 1. - residuals @ residuals / total if total > 0 \
+            else 1.
+
+    def design(self, num_nodes):
+        num_nodes = np.asarray(num_nodes, dtype=float)
+        return np.column_stack([basis_functions[term](num_nodes)
+                                for term in self.terms])
+
+    def predict(self, num_nodes):
+        """
+        Predicted times and the variance of a new measurement.
+        """
+        X = self.design(num_nodes)
+        mean = X @ self.coefficients
+        variance = np.einsum('ij,jk,ik->i', X, self.covariance, X) \
+            + self.residual_variance
+        return mean, variance
+
+    def summary(self):
+        return {
+            'terms': dict(zip(self.terms, self.coefficients.tolist())),
+            'r_squared': self.r_squared,
+            'rmse': self.rmse,
+        }
+
+
+class ScalingModel(object):
+    def __init__(self, df):
+        """
+        Fit all phases to a result DataFrame with one row per run.
+        """
+        self.model_time_sim = np.unique(df.model_time_sim.values)[0]
+        self.num_nodes = np.unique(df.num_nodes.values)
+        df = df.copy()
+        phases = [phase for phase in phase_models if phase in df]
+        df[other] = df.wall_time_sim - df[phases].sum(axis=1)
+        self.fits = {}
+        for phase, terms in list(phase_models.items()) + [(other, other_model)]:
+            if phase not in df:
+                continue
+            data = df[['num_nodes', phase]].dropna()
+            if len(data) == 0:
+                continue
+            self.fits[phase] = PhaseFit(terms, data.num_nodes.values,
+                                        data[phase].values)
+
+    @classmethod
+    def from_csv(cls, timer_file):
+        return cls(pd.read_csv(timer_file))
+
+    def predict(self, num_nodes):
+        """
+        Predicted phase times, wall time and real-time factor.
+
+        Returns
+        -------
+        prediction : pd.DataFrame
+            One row per entry of `num_nodes`; every quantity comes with
+            `<quantity>_low` and `<quantity>_high` bounds.
+        """
+        num_nodes = np.asarray(num_nodes, dtype=float)
+        prediction = pd.DataFrame({'num_nodes': num_nodes})
+        wall_time = np.zeros_like(num_nodes)
+        variance = np.zeros_like(num_nodes)
+        for phase, fit in self.fits.items():
+            mean, var = fit.predict(num_nodes)
+            error = z_95 * np.sqrt(var)
+            prediction[phase] = mean
+            prediction[phase + '_low'] = mean - error
+            prediction[phase + '_high'] = mean + error
+            wall_time += mean
+            variance += var
+        error = z_95 * np.sqrt(variance)
+        prediction['wall_time_sim'] = wall_time
+        prediction['wall_time_sim_low'] = wall_time - error
+        prediction['wall_time_sim_high'] = wall_time + error
+        # real-time factor, wall times are in s and model_time_sim in ms
+        for suffix in ['', '_low', '_high']:
+            prediction['sim_factor' + suffix] = \
+                prediction['wall_time_sim' + suffix] \
+                / (self.model_time_sim / 1e3)
+        return prediction
+
+    def summary(self):
+        return {phase: fit.summary() for phase, fit in self.fits.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('timer_file')
+    parser.add_argument('--predict', type=float, nargs='+', default=[])
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.timer_file)
+    model = ScalingModel(df)
+    for phase, summary in model.summary().items():
+        terms = ', '.join(f'{term}={value:.4g}'
+                          for term, value in summary['terms'].items())
+        print(f"{phase}: R^2={summary['r_squared']:.3f} "
+              + f"RMSE={summary['rmse']:.4g} s ({terms})")
+
+    if args.predict:
+        prediction = model.predict(args.predict)
+        print(prediction[['num_nodes', 'wall_time_sim', 'wall_time_sim_low',
+                          'wall_time_sim_high', 'sim_factor',
+                          'sim_factor_low', 'sim_factor_high']]
+              .to_string(index=False))
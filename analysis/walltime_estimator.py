@@ -0,0 +1,183 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+"""
+Estimate the SLURM wall time of a benchmark job from past results.
+
+Past runs of the same model on the same machine (and simulator version, if
+there are any) are taken from the results index. The run time of each is
+the time for network construction and presimulation plus the simulation
+time, scaled to the requested model time. Node counts without history are
+interpolated, or extrapolated from the two closest node counts, on a
+log-log scale. The estimate is multiplied by a safety margin, a fixed
+allowance for job setup and metadata collection is added, and it is
+rounded up to full minutes.
+
+Without a results index or matching history, the fallback wall time is
+printed unchanged. JUBE calls this script to fill in #TIME# of every bench
+job, see `job_walltime` in helpers/helpers.yaml.
+
+With --real-time-factor, the expected real-time factor of the simulation
+is printed instead, estimated the same way, or nothing without history.
+It is the reference of the watchdog (helpers/watchdog.py).
+
+Usage
+-----
+python walltime_estimator.py --index <results_index.sqlite> --model <name> \
+    --num-nodes 4 --model-time-sim 1000 --fallback 01:00:00
+"""
+
+import os
+import socket
+import argparse
+
+import numpy as np
+
+from results_index import ResultsIndex
+
+# construction and presimulation, taken from python level timers if
+# available, from the kernel timers otherwise
+setup_timers = [('py_time_create', 'wall_time_create'),
+                ('py_time_connect', 'wall_time_connect'),
+                ('py_time_presimulate', None)]
+simulation_timer = ('py_time_simulate', 'wall_time_sim')
+
+
+def to_walltime(seconds):
+    minutes = int(np.ceil(seconds / 60.))
+    return f'{minutes // 60:02d}:{minutes % 60:02d}:00'
+
+
+def _timer(df, names):
+    for name in names:
+        if name is not None and name in df and df[name].notna().any():
+            return df[name].fillna(0.)
+    return 0.
+
+
+def run_times(df, model_time_sim):
+    """
+    Run time of every past run, scaled to the requested model time.
+    """
+    setup = sum(_timer(df, names) for names in setup_timers)
+    simulation = _timer(df, simulation_timer) \
+        * model_time_sim / df.model_time_sim
+    return setup + simulation
+
+
+def estimate(df, num_nodes, model_time_sim):
+    """
+    Expected run time in seconds at `num_nodes`, None without history.
+    """
+    return interpolate(df.assign(value=run_times(df, model_time_sim)),
+                       num_nodes)
+
+
+def expected_rtf(df, num_nodes):
+    """
+    Expected real-time factor at `num_nodes`, None without history.
+    """
+    simulation = _timer(df, simulation_timer)
+    return interpolate(df.assign(value=simulation
+                                 / (df.model_time_sim / 1e3)), num_nodes)
+
+
+def interpolate(df, num_nodes):
+    """
+    Interpolate `df.value` of the slowest seed of every node count.
+    """
+    df = df[df.value > 0]
+    if df.empty:
+        return None
+    by_nodes = df.groupby('num_nodes').value.max()
+    nodes = np.log(by_nodes.index.values.astype(float))
+    times = np.log(by_nodes.values)
+    x = np.log(num_nodes)
+    if len(nodes) == 1:
+        return float(np.exp(times[0]))
+    if nodes[0] <= x <= nodes[-1]:
+        return float(np.exp(np.interp(x, nodes, times)))
+    # extrapolate with the slope of the two closest node counts
+    i = [0, 1] if x < nodes[0] else [-2, -1]
+    slope = (times[i[1]] - times[i[0]]) / (nodes[i[1]] - nodes[i[0]])
+    return float(np.exp(times[i[0]] + slope * (x - nodes[i[0]])))
+
+
+def history(index_path, model, machine, simulator_version,
+            threads_per_task=None, tasks_per_node=None):
+    """
+    Past results of the model on the machine, restricted to the simulator
+    version and the parallelization if there are matching runs.
+    """
+    index = ResultsIndex(index_path)
+    df = index.query(model_name=model, machine=machine)
+    index.close()
+    if 'aborted' in df:
+        # runs stopped by the watchdog are incomplete
+        df = df[df.aborted.fillna(0).astype(int) != 1]
+    for key, value in [('simulator-version', simulator_version),
+                       ('threads_per_task', threads_per_task),
+                       ('tasks_per_node', tasks_per_node)]:
+        if value is None or key not in df:
+            continue
+        matching = df[df[key].astype(str) == str(value)]
+        if not matching.empty:
+            df = matching
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--index', default='',
+                        help='results index, see results_index.py')
+    parser.add_argument('--model', required=True)
+    # same naming scheme as used for the metadata in analysis_helper.py
+    parser.add_argument('--machine', default=(
+        os.environ.get('HOSTNAME') or socket.gethostname()).split('.')[-1])
+    parser.add_argument('--simulator-version', default=None)
+    parser.add_argument('--num-nodes', type=int, required=True)
+    parser.add_argument('--threads-per-task', type=int, default=None)
+    parser.add_argument('--tasks-per-node', type=int, default=None)
+    parser.add_argument('--model-time-sim', type=float, required=True,
+                        help='model time to be simulated in ms')
+    parser.add_argument('--fallback', default='',
+                        help='wall time used without history, hh:mm:ss')
+    parser.add_argument('--margin', type=float, default=1.5,
+                        help='factor applied to the estimated run time')
+    parser.add_argument('--setup-time', type=float, default=600.,
+                        help='seconds added for job setup and metadata')
+    parser.add_argument('--real-time-factor', action='store_true',
+                        help='print the expected real-time factor instead')
+    args = parser.parse_args()
+
+    df = None
+    if args.index and os.path.exists(args.index):
+        df = history(args.index, args.model, args.machine,
+                     args.simulator_version, args.threads_per_task,
+                     args.tasks_per_node)
+    if args.real_time_factor:
+        rtf = expected_rtf(df, args.num_nodes) \
+            if df is not None and not df.empty else None
+        print('' if rtf is None else f'{rtf:.6g}')
+    else:
+        walltime = args.fallback
+        run_time = estimate(df, args.num_nodes, args.model_time_sim) \
+            if df is not None and not df.empty else None
+        if run_time is not None:
+            walltime = to_walltime(args.margin * run_time + args.setup_time)
+        print(walltime)
@@ -18,6 +18,12 @@ SPDX-License-Identifier: GPL-3.0-or-later
 
 import sys
 import os
+import io
+import html
+import base64
+import shutil
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 
 from nbformat import v4 as nbf
 import nbformat
@@ -27,17 +33,103 @@ import click
 import ast
 
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
+from analysis import plot_helper
+from analysis.analysis_helper import annex_metadata
 from analysis.plot_helper import plot, plot_comparison
 
+# rendered plots are kept here across flipbook builds; hidden directories
+# are not searched for result files
+cache_path = './.plot_cache'
 
-def display_plot(timer_hash, plot_path, attributes, page_number=1):
+
+def source_files(module):
+    """
+    Source files of a module, all modules of the package for a package.
+    """
+    if os.path.basename(module.__file__) != '__init__.py':
+        return [module.__file__]
+    files = []
+    for root, _, names in os.walk(os.path.dirname(module.__file__)):
+        files += [os.path.join(root, name) for name in names
+                  if name.endswith('.py')]
+    return sorted(files)
+
+
+def plot_code_version():
+    """
+    Hash of the plotting code, plots are re-rendered whenever it changes.
+    """
+    digest = hashlib.sha256()
+    digest.update(str(getattr(plot_helper.bp, '__version__', '')).encode())
+    for module in [plot_helper, plot_helper.bp]:
+        for path in source_files(module):
+            digest.update(os.path.relpath(
+                path, os.path.dirname(module.__file__)).encode())
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def cache_key(csv_file, scaling_type, code_version):
+    digest = hashlib.sha256()
+    with open(csv_file, 'rb') as f:
+        digest.update(f.read())
+    digest.update(scaling_type.encode())
+    digest.update(code_version.encode())
+    return digest.hexdigest()[:32]
+
+
+def render_cached(scaling_type, key, csv_file):
+    plot(scaling_type=scaling_type,
+         timer_hash=key,
+         timer_file=csv_file,
+         save_path=cache_path)
+
+
+def render_plots(csv_files, scaling_type, plot_path, processes=None):
+    """
+    Provide a plot of every csv file in `plot_path`, named after the hash
+    of the file.
+
+    Plots are taken from the render cache if the content of the csv file,
+    the scaling type and the plotting code are unchanged; only the missing
+    ones are rendered, in parallel. Cached plots that this flip book does
+    not use are removed.
+    """
+    os.makedirs(cache_path, exist_ok=True)
+    code_version = plot_code_version()
+    keys = [cache_key(csv_file, scaling_type, code_version)
+            for csv_file in csv_files]
+    missing = {key: csv_file for key, csv_file in zip(keys, csv_files)
+               if not os.path.exists(os.path.join(cache_path, key + '.png'))}
+    print(f'Rendering {len(missing)} of {len(csv_files)} plots...')
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        list(pool.map(render_cached, [scaling_type] * len(missing),
+                      missing.keys(), missing.values()))
+    for key, csv_file in zip(keys, csv_files):
+        timer_hash = csv_file.split('/')[-1].split('.')[0]
+        shutil.copyfile(os.path.join(cache_path, key + '.png'),
+                        os.path.join(plot_path, timer_hash + '.png'))
+    used = {key + '.png' for key in keys}
+    for name in os.listdir(cache_path):
+        if name not in used:
+            os.remove(os.path.join(cache_path, name))
+
+
+def display_plot(timer_hash, plot_path, attributes, page_number=1,
+                 metadata=None):
+    """
+    Display one slide. `metadata` maps the attributes to their values; if
+    it is not given, they are looked up in the annex.
+    """
+    if metadata is None:
+        file_path = os.popen(
+            f"find . -name '*{timer_hash}.csv'").read().strip()
+        metadata = annex_metadata([file_path]).get(
+            os.path.normpath(file_path), {})
     display_list = '<left><ul>\n'
-    file_path = os.popen(
-        f"find . -name '*{timer_hash}.csv'").read().strip()
     for attribute in attributes:
-        value = os.popen(
-            f'git annex metadata "{file_path}" '
-            + f'--get {attribute}').read().strip()
+        value = metadata.get(attribute, '')
         display_list += f'  <li>{attribute}: {value}</li>\n'
     display_list += '</ul></left>'
 
@@ -47,17 +139,42 @@ def display_plot(timer_hash, plot_path, attributes, page_number=1):
     display(HTML(f'<center>page {page_number}</center>'))
 
 
-def make_notebook(outPath: str, timer_hashes, attributes_to_display):
+def collect_metadata(csv_files, attributes):
+    """
+    Metadata of all result files, read in a single git-annex call.
+
+    Returns
+    -------
+    metadata : dict
+        Maps the timer hash of every file to a dictionary of the requested
+        attributes.
+    """
+    annexed = annex_metadata(csv_files)
+    metadata = {}
+    for csv_file in csv_files:
+        timer_hash = csv_file.split('/')[-1].split('.')[0]
+        fields = annexed.get(os.path.normpath(csv_file), {})
+        metadata[timer_hash] = {attribute: fields.get(attribute, '')
+                                for attribute in attributes}
+    return metadata
+
+
+def make_notebook(outPath: str, timer_hashes, attributes_to_display,
+                  metadata):
     nb = nbf.new_notebook()
     cells = []
+    # the metadata of all slides is embedded as a lookup table, so executing
+    # the notebook does not query the annex
     codes = {
         'skip': ["import sys",
                  "import os",
                  "sys.path.insert(1, os.path.join(sys.path[0], '..'))",
-                 "from flipbook.flipbook import display_plot"],
+                 "from flipbook.flipbook import display_plot",
+                 f"metadata = {metadata!r}"],
         'slide': [f"display_plot('{timer_hashes[0]}', "
                   + "'./plots', "
-                  + f"{attributes_to_display})"],
+                  + f"{attributes_to_display}, "
+                  + f"metadata=metadata['{timer_hashes[0]}'])"],
         'subslide': []
     }
 
@@ -66,7 +183,8 @@ def make_notebook(outPath: str, timer_hashes, attributes_to_display):
         codes['subslide'].append(f"display_plot('{timer_hash}', "
                                  + "'./plots', "
                                  + f"{attributes_to_display}, "
-                                 + f"{page_number})")
+                                 + f"{page_number}, "
+                                 + f"metadata=metadata['{timer_hash}'])")
         page_number += 1
     for key, code_list in codes.items():
         for code in code_list:
@@ -80,18 +198,92 @@ def make_notebook(outPath: str, timer_hashes, attributes_to_display):
         nbformat.write(nb, _)
 
 
+html_template = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>beNNch flip book</title>
+<link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/reveal.js@4.6.1/dist/reveal.css">
+<link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/reveal.js@4.6.1/dist/theme/white.css">
+<style>
+.reveal section img {{ max-height: 60vh; margin: 0; }}
+.reveal section ul {{ font-size: 0.5em; }}
+.reveal section header, .reveal section .page {{ font-size: 0.6em; }}
+</style>
+</head>
+<body>
+<div class="reveal"><div class="slides">
+{slides}
+</div></div>
+<script src="https://cdn.jsdelivr.net/npm/reveal.js@4.6.1/dist/reveal.js"></script>
+<script>Reveal.initialize({{transition: 'none', viewDistance: 2}});</script>
+</body>
+</html>
+"""
+
+
+def thumbnail(image_path, width=480):
+    """
+    Small JPEG version of a plot as data URI.
+    """
+    import PIL.Image
+    with PIL.Image.open(image_path) as image:
+        image = image.convert('RGB')
+        image.thumbnail((width, width))
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=70)
+    return 'data:image/jpeg;base64,' + base64.b64encode(
+        buffer.getvalue()).decode()
+
+
+def make_html(out_file, timer_hashes, attributes_to_display, metadata,
+              plot_path, thumbnails=False):
+    """
+    Write the flip book as a reveal.js slide deck, one slide per plot.
+
+    Full resolution images are loaded lazily by reveal.js when their slide
+    comes close; with `thumbnails`, a small embedded version is shown until
+    then.
+    """
+    slides = []
+    for page_number, timer_hash in enumerate(timer_hashes, start=1):
+        image_path = os.path.join(plot_path, timer_hash + '.png')
+        relative_path = os.path.relpath(image_path,
+                                        os.path.dirname(out_file) or '.')
+        src = f' src="{thumbnail(image_path)}"' if thumbnails else ''
+        items = ''.join(
+            f'<li>{html.escape(attribute)}: '
+            + f'{html.escape(str(metadata[timer_hash].get(attribute, "")))}'
+            + '</li>'
+            for attribute in attributes_to_display)
+        slides.append(
+            '<section>'
+            + f'<header>benchmark ID: {html.escape(timer_hash)}</header>'
+            + f'<img{src} data-src="{html.escape(relative_path)}">'
+            + f'<ul>{items}</ul>'
+            + f'<div class="page">page {page_number}</div>'
+            + '</section>')
+    with open(out_file, 'w') as f:
+        f.write(html_template.format(slides='\n'.join(slides)))
+
+
 @click.command()
-@click.option('--style', type=click.Choice(['flipbook', 'single_plot']),
-              help='Specify the style - flipbook or single_plot')
+@click.option('--style', type=click.Choice(['flipbook', 'html', 'single_plot']),
+              help='Specify the style - flipbook, html or single_plot')
 @click.option('--scaling_type', type=click.Choice(['nodes', 'threads']),
               help='Specify the scaling type - nodes or threads')
 @click.option('--attributes_to_display', type=str, default=None,
               help='Specify the attributes (metadata) to display under the plots in the flipbook')
-def generate_plots(style, scaling_type, attributes_to_display):
+@click.option('--processes', type=int, default=None,
+              help='Number of processes rendering plots that are not cached yet')
+@click.option('--thumbnails', is_flag=True, default=False,
+              help='html style: embed thumbnails that are shown until the full plots are loaded')
+def generate_plots(style, scaling_type, attributes_to_display, processes,
+                   thumbnails):
 
     if style is None:
-        style = click.prompt('Please enter the style (flipbook/single_plot)',
-                             type=click.Choice(['flipbook', 'single_plot']))
+        style = click.prompt('Please enter the style (flipbook/html/single_plot)',
+                             type=click.Choice(['flipbook', 'html', 'single_plot']))
     if scaling_type is None:
         scaling_type = click.prompt('Please enter the scaling type (nodes/threads)',
                                     type=click.Choice(['nodes', 'threads']))
@@ -100,7 +292,7 @@ def generate_plots(style, scaling_type, attributes_to_display):
     timer_hashes = []
     os.system('mkdir -p ./plots')
 
-    if style == 'flipbook':
+    if style in ['flipbook', 'html']:
 
         if attributes_to_display is None:
             attributes_to_display = click.prompt('Enter the attributes to display as a list', type=str)
@@ -117,12 +309,12 @@ def generate_plots(style, scaling_type, attributes_to_display):
         for csv_file in csv_files:
             timer_hash = csv_file.split('/')[-1].split('.')[0]
             timer_hashes.append(timer_hash)
-            plot(scaling_type=scaling_type,
-                 timer_hash=timer_hash,
-                 timer_file=csv_file,
-                 save_path='./plots'
-                 )
-        make_notebook('./', timer_hashes, list(attributes_to_display))
+        metadata = collect_metadata(csv_files, list(attributes_to_display))
+
+    if style == 'flipbook':
+        render_plots(csv_files, scaling_type, './plots', processes=processes)
+        make_notebook('./', timer_hashes, list(attributes_to_display),
+                      metadata)
         os.system("jupyter nbconvert --inplace --execute flipbook.ipynb")
         os.system("jupyter nbconvert --to slides flipbook.ipynb "
                   + "--TemplateExporter.exclude_input=True "
@@ -130,13 +322,25 @@ def generate_plots(style, scaling_type, attributes_to_display):
         os.system("rm flipbook.ipynb")
         os.system("rm -r ./plots")
 
+    elif style == 'html':
+        # the deck refers to the plots, they are kept next to it
+        plot_path = './flipbook_files'
+        os.makedirs(plot_path, exist_ok=True)
+        render_plots(csv_files, scaling_type, plot_path, processes=processes)
+        make_html('./flipbook.html', timer_hashes, list(attributes_to_display),
+                  metadata, plot_path, thumbnails=thumbnails)
+        os.system("rm -r ./plots")
+
     elif style == 'single_plot':
         # Code for generating single_plot style plots
         print('Generating single_plot style plots...')
 
-        plot_comparison(scaling_type=scaling_type, timer_files=csv_files, save_path='.')
+        versions = collect_metadata(csv_files, ['simulator-version'])
+        plot_comparison(scaling_type=scaling_type, timer_files=csv_files, save_path='.',
+                        labels=[versions[csv_file.split('/')[-1].split('.')[0]]
+                                ['simulator-version'] for csv_file in csv_files])
     else:
-        print('Invalid style specified. Please choose either flipbook or single_plot.')
+        print('Invalid style specified. Please choose either flipbook, html or single_plot.')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,141 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+"""
+Check whether a simulator installed by Builder is up to date, to avoid
+submitting a build job for it.
+
+The key of an installation is the hash of the Builder plan files used for
+it (`common`, the variant plan and its module template) together with the
+variant and suffix. After a successful build, `record` stores the key next
+to the module file, as `.<module>.plan_hash` in the same folder. `check`
+exits with 0 if the module file exists and its stored key matches the
+current plan files, and with 1 otherwise, e.g. if a plan file was edited.
+
+The plans folder is taken from `--plans`, the environment variable
+BUILDER_PLANS, or found next to the `build` executable.
+
+Usage
+-----
+python build_cache.py check|record --modules <buildermod> \
+    <simulator> <version> <variant> [<suffix>]
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+
+
+def plans_path():
+    if os.environ.get('BUILDER_PLANS'):
+        return os.environ['BUILDER_PLANS']
+    build = shutil.which('build')
+    if build is None:
+        return None
+    builder = os.path.dirname(os.path.realpath(build))
+    for path in [os.path.join(builder, 'plans'),
+                 os.path.join(builder, os.pardir, 'plans')]:
+        if os.path.isdir(path):
+            return os.path.normpath(path)
+    return None
+
+
+def plan_hash(plans, simulator, version, variant, suffix=''):
+    """
+    Hash of the plan files of an installation, None if there are none.
+    """
+    files = [os.path.join(plans, simulator, 'common'),
+             os.path.join(plans, simulator, version, variant),
+             os.path.join(plans, simulator, version, variant + '.module')]
+    files = [f for f in files if os.path.isfile(f)]
+    if not files:
+        return None
+    digest = hashlib.sha256()
+    for f in files:
+        digest.update(os.path.relpath(f, plans).encode())
+        with open(f, 'rb') as plan:
+            digest.update(plan.read())
+    digest.update(f'{variant}\0{suffix}'.encode())
+    return digest.hexdigest()
+
+
+def module_name(variant, suffix=''):
+    # naming used by `module load` in helpers/helpers.yaml
+    return f'{variant}_{suffix}' if suffix else variant
+
+
+def hash_file(modules, simulator, version, variant, suffix=''):
+    return os.path.join(modules, simulator, version,
+                        f'.{module_name(variant, suffix)}.plan_hash')
+
+
+def installed(modules, simulator, version, variant, suffix=''):
+    module = os.path.join(modules, simulator, version,
+                          module_name(variant, suffix))
+    return os.path.isfile(module) or os.path.isfile(module + '.lua')
+
+
+def check(modules, plans, simulator, version, variant, suffix=''):
+    if not modules or not plans:
+        return False
+    current = plan_hash(plans, simulator, version, variant, suffix)
+    path = hash_file(modules, simulator, version, variant, suffix)
+    if current is None or not os.path.isfile(path) or \
+            not installed(modules, simulator, version, variant, suffix):
+        return False
+    with open(path, 'r') as f:
+        return f.read().strip() == current
+
+
+def record(modules, plans, simulator, version, variant, suffix=''):
+    if not modules or not plans:
+        return
+    current = plan_hash(plans, simulator, version, variant, suffix)
+    if current is None:
+        return
+    path = hash_file(modules, simulator, version, variant, suffix)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(current + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('action', choices=['check', 'record'])
+    parser.add_argument('simulator')
+    parser.add_argument('version')
+    parser.add_argument('variant')
+    parser.add_argument('suffix', nargs='?', default='')
+    parser.add_argument('--modules', default='',
+                        help='absolute path to the Builder modules folder')
+    parser.add_argument('--plans', default=None,
+                        help='absolute path to the Builder plans folder')
+    args = parser.parse_args()
+
+    plans = args.plans or plans_path()
+    install = (args.simulator, args.version, args.variant, args.suffix)
+    if args.action == 'record':
+        record(args.modules, plans, *install)
+    else:
+        up_to_date = check(args.modules, plans, *install)
+        print(f"{'/'.join(install[:2] + (module_name(*install[2:]),))}: "
+              + ('up to date, skipping build' if up_to_date
+                 else 'build required'), file=sys.stderr)
+        sys.exit(0 if up_to_date else 1)
@@ -16,37 +16,73 @@ this program. If not, see <https://www.gnu.org/licenses/>.
 SPDX-License-Identifier: GPL-3.0-or-later
 """
 
-import glob
-import os
-import sys
+"""
+This script writes out measures taken with internal instrumentation of
+the code. MPI processes write to private logfiles. These files are
+scanned for the timer metrics in a pool of worker processes and streamed
+into running accumulators. The mean of the timer metrics and the sum of
+the memory and counter metrics are writen into a single text file,
+followed by the distribution of every timer across ranks (maximum,
+minimum, standard deviation, percentiles and the imbalance ratio
+max/mean). This single text file can later be read by eg JUBE.
+Optionally, the unreduced per-rank values are kept in a NumPy file next
+to it. If the ranks ran under helpers/perf_stat.sh, their hardware
+counters are summed across ranks and written together with derived
+ratios such as instructions per cycle and cache-miss rates. From the
+RAPL snapshots of helpers/rapl.py, the energy consumed by the packages and
+DRAM of all nodes is written, NaN where RAPL is not available. Runs
+stopped by helpers/watchdog.py are marked with `aborted 1` and the reason.
 
-import numpy as np
+Models that simulate in chunks log a timer once per chunk. The text file
+keeps the last value, as before, while the values of all chunks are
+reduced across ranks chunk by chunk and written to timer_chunks.npy, a
+structured array with one row per chunk: its number, the model time at
+its end in ms and the mean and maximum across ranks of every timer.
 
-log_path = sys.argv[1]
+Usage
+-----
+python collect_timer_data.py <log_path> [--processes N] [--rank-archive]
+    [--perf-path <perf_dir>] [--rapl-path <rapl_dir> --model-time-sim T]
+    [--abort-file <file>] [--cumulative-chunks]
 
-"""
-This function writes out measures taken with internal instrumentation of
-the code. MPI processes write to private logfiles. These files are
-scanned for the timer metrics. Their mean
-is taken and writen into a single text file. This single text file can
-later be read by eg JUBE.
-
-Parameters
-----------
-STDOUT_PATH : string
-    Place to store extracted timer data to
-data_dir : string
-    Directory of where simulation data is stored
-label : string
-    Unique identifier of a given simulation
+log_path : string
+    Directory in which the simulation wrote its logfiles
+processes : int
+    Number of worker processes used for parsing the logfiles, defaults to
+    the number of CPUs available to this process
+rank-archive : flag
+    Additionally write timer_data.npy, a structured array with one row per
+    rank and one field per metric (plus the name of the logfile). It can be
+    memory-mapped with np.load('timer_data.npy', mmap_mode='r').
+perf-path : string
+    Directory with the perf_<rank>.csv files of helpers/perf_stat.sh,
+    ignored if it does not exist
+rapl-path : string
+    Directory with the rapl_<host>_{start,end}.json snapshots of
+    helpers/rapl.py
+model-time-sim : float
+    Simulated model time in ms, for the energy per model second
+abort-file : string
+    File in which helpers/watchdog.py states why it aborted the run
+cumulative-chunks : flag
+    The timers logged after a chunk include all previous chunks; the
+    values of the chunks are obtained as differences
+
+The model time at the end of every chunk is read from the
+`chunk_model_time` entries of the logfiles if present, and otherwise
+--model-time-sim is assumed to be divided into chunks of equal length.
 """
 
-all_logfiles = glob.glob(
-    os.path.join(
-        log_path,
-        '*logfile*'
-    )
-)
+import argparse
+import glob
+import json
+import os
+import warnings
+from multiprocessing import Pool
+
+import numpy as np
+
+import rapl
 
 metrics = ['time_collocate_spike_data',
            'time_communicate_spike_data',
@@ -78,42 +114,444 @@ metrics_sum = ['base_memory',
                'num_connections',
                'local_spike_counter']
 
-d = {key: list() for key in metrics}
-d_sum = {key: list() for key in metrics_sum}
+all_metrics = metrics + metrics_sum
+metric_index = {key: i for i, key in enumerate(all_metrics)}
+
+# hardware counters of perf stat, written as perf_<counter> summed across
+# ranks
+perf_counters = ['cycles',
+                 'instructions',
+                 'LLC-loads',
+                 'LLC-load-misses',
+                 'branches',
+                 'branch-misses',
+                 'stalled-cycles-frontend',
+                 'stalled-cycles-backend']
+perf_index = {key: i for i, key in enumerate(perf_counters)}
+
+# derived from the sums as numerator / denominator, the instructions per
+# cycle also with their minimum and maximum across ranks
+perf_ratios = {'ipc': ('instructions', 'cycles'),
+               'llc_miss_rate': ('LLC-load-misses', 'LLC-loads'),
+               'branch_miss_rate': ('branch-misses', 'branches'),
+               'frontend_stall_fraction': ('stalled-cycles-frontend', 'cycles'),
+               'backend_stall_fraction': ('stalled-cycles-backend', 'cycles')}
+
+# energy in J summed across nodes, the average power in W of all nodes and
+# the energy per second of model time; the snapshots enclose the whole
+# simulation script, so all of them include network construction and
+# energy_per_model_second is not the energy per simulated second
+energy_metrics = ['energy_package',
+                  'energy_dram',
+                  'energy_total',
+                  'power_average',
+                  'energy_per_model_second']
+
+# entries kept for every chunk of a chunked simulation, the last one is the
+# simulated model time at the end of the chunk in ms
+chunk_keys = metrics + ['chunk_model_time']
+chunk_index = {key: i for i, key in enumerate(chunk_keys)}
+
+# distribution of the timer metrics across ranks, written as <metric>_<stat>
+percentiles = [50, 95, 99]
+rank_statistics = ['max', 'min', 'std'] + [f'p{q}' for q in percentiles] \
+    + ['imbalance']
 
-for logfile in all_logfiles:
+
+def parse_logfile(logfile):
+    """
+    Read the metrics of a single logfile.
+
+    Parameters
+    ----------
+    logfile : string
+        Path to the logfile of one MPI process
+
+    Returns
+    -------
+    values : np.ndarray
+        One entry per metric in `all_metrics`, NaN where the metric is not
+        contained in the logfile; the last value of repeated entries
+    chunks : np.ndarray or None
+        One row per chunk in the order of the logfile and one column per
+        entry of `chunk_keys`, None if no entry is repeated
+    """
+    values = np.full(len(all_metrics), np.nan)
+    series = {}
     with open(logfile, 'r') as fn:
-        log = {}
         for line in fn:
             key, value, *_ = line.split(' ')
-            if key in metrics + metrics_sum:
-                log[key] = float(value)
-
-        for m in d:
-            try:
-                d[m].append(log[m])
-            except KeyError:
-                pass
-        for m in d_sum:
-            try:
-                d_sum[m].append(log[m])
-            except KeyError:
-                pass
-
-for m in d:
-    if d[m]:
-        d[m] = np.mean(d[m])
-    else:
-        d[m] = np.nan
-
-for m in d_sum:
-    if d_sum[m]:
-        d_sum[m] = np.sum(d_sum[m])
-    else:
-        d_sum[m] = np.nan
-
-with open('timer_data.txt', "w") as outF:
-    for m in d:
-        outF.write(m + ' ' + str(d[m]) + '\n')
-    for m in d_sum:
-        outF.write(m + ' ' + str(d_sum[m]) + '\n')
+            i = metric_index.get(key)
+            if i is not None:
+                values[i] = float(value)
+            if key in chunk_index:
+                series.setdefault(key, []).append(float(value))
+    num_chunks = max([len(v) for v in series.values()] + [0])
+    if num_chunks < 2:
+        return values, None
+    chunks = np.full((num_chunks, len(chunk_keys)), np.nan)
+    for key, v in series.items():
+        chunks[:len(v), chunk_index[key]] = v
+    return values, chunks
+
+
+def perf_name(counter):
+    return 'perf_' + counter.lower().replace('-', '_')
+
+
+def parse_perf_file(perf_file):
+    """
+    Read the counters of one rank from the csv output of `perf stat -x,`.
+
+    Returns
+    -------
+    values : np.ndarray
+        One entry per counter in `perf_counters`, NaN where the counter is
+        missing or was not supported
+    """
+    values = np.full(len(perf_counters), np.nan)
+    with open(perf_file, 'r') as fn:
+        for line in fn:
+            fields = line.strip().split(',')
+            if len(fields) < 3 or line.startswith('#'):
+                continue
+            # events may carry modifiers, e.g. cycles:u
+            i = perf_index.get(fields[2].split(':')[0])
+            if i is not None and not fields[0].startswith('<'):
+                values[i] = float(fields[0])
+    return values
+
+
+class Accumulator(object):
+    """
+    Running count, sum, minimum and maximum of every metric.
+
+    The accumulators are preallocated arrays indexed like `all_metrics`, so
+    the memory footprint does not grow with the number of logfiles.
+    """
+
+    def __init__(self, num_metrics):
+        self.count = np.zeros(num_metrics, dtype=np.int64)
+        self.sum = np.zeros(num_metrics)
+        self.min = np.full(num_metrics, np.inf)
+        self.max = np.full(num_metrics, -np.inf)
+
+    def add(self, values):
+        present = ~np.isnan(values)
+        self.count += present
+        self.sum += np.where(present, values, 0.)
+        np.fmin(self.min, values, out=self.min)
+        np.fmax(self.max, values, out=self.max)
+
+    def mean(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 0, self.sum / self.count, np.nan)
+
+    def total(self):
+        return np.where(self.count > 0, self.sum, np.nan)
+
+
+class ChunkAccumulator(object):
+    """
+    Running count, sum and maximum of every entry of `chunk_keys`, per
+    chunk.
+
+    Rows are added as ranks with more chunks than seen so far arrive.
+    """
+
+    def __init__(self, cumulative=False):
+        self.cumulative = cumulative
+        self.count = np.zeros((0, len(chunk_keys)), dtype=np.int64)
+        self.sum = np.zeros((0, len(chunk_keys)))
+        self.max = np.full((0, len(chunk_keys)), -np.inf)
+
+    def add(self, chunks):
+        if self.cumulative:
+            chunks = chunks.copy()
+            chunks[1:, :len(metrics)] = np.diff(chunks[:, :len(metrics)],
+                                                axis=0)
+        grow = len(chunks) - len(self.sum)
+        if grow > 0:
+            self.count = np.pad(self.count, ((0, grow), (0, 0)))
+            self.sum = np.pad(self.sum, ((0, grow), (0, 0)))
+            self.max = np.pad(self.max, ((0, grow), (0, 0)),
+                              constant_values=-np.inf)
+        k = len(chunks)
+        present = ~np.isnan(chunks)
+        self.count[:k] += present
+        self.sum[:k] += np.where(present, chunks, 0.)
+        np.fmax(self.max[:k], chunks, out=self.max[:k])
+
+    def __len__(self):
+        return len(self.sum)
+
+    def mean(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 0, self.sum / self.count, np.nan)
+
+    def maximum(self):
+        return np.where(self.count > 0, self.max, np.nan)
+
+
+def collect(logfiles, processes=None, cumulative_chunks=False):
+    """
+    Parse all logfiles in parallel and reduce them on the fly.
+
+    Parameters
+    ----------
+    logfiles : list
+        Paths to the logfiles of all MPI processes
+    processes : int
+        Number of worker processes, None uses all available CPUs
+    cumulative_chunks : bool
+        Timers of a chunk include all previous chunks
+
+    Returns
+    -------
+    acc : Accumulator
+        Reduced metrics of all logfiles
+    ranks : np.ndarray
+        Per-rank values with one row per logfile (in the order of
+        `logfiles`) and one column per metric in `all_metrics`
+    chunks : ChunkAccumulator
+        Timers of every chunk reduced across ranks, empty if the
+        simulation was not run in chunks
+    """
+    acc = Accumulator(len(all_metrics))
+    ranks = np.full((len(logfiles), len(all_metrics)), np.nan)
+    chunks = ChunkAccumulator(cumulative=cumulative_chunks)
+    if not logfiles:
+        return acc, ranks, chunks
+    # many small tasks per worker keep the pool busy without sending
+    # one message per logfile
+    chunksize = max(1, len(logfiles) // (4 * (processes or os.cpu_count())))
+    with Pool(processes=processes) as pool:
+        for i, (values, rank_chunks) in enumerate(
+                pool.imap(parse_logfile, logfiles, chunksize=chunksize)):
+            ranks[i] = values
+            acc.add(values)
+            if rank_chunks is not None:
+                chunks.add(rank_chunks)
+    return acc, ranks, chunks
+
+
+def collect_perf(perf_files, processes=None):
+    """
+    Parse the perf stat output of all ranks in parallel.
+
+    Returns
+    -------
+    perf : np.ndarray
+        One row per file and one column per counter in `perf_counters`
+    """
+    perf = np.full((len(perf_files), len(perf_counters)), np.nan)
+    if not perf_files:
+        return perf
+    chunksize = max(1, len(perf_files) // (4 * (processes or os.cpu_count())))
+    with Pool(processes=processes) as pool:
+        for i, values in enumerate(pool.imap(parse_perf_file, perf_files,
+                                             chunksize=chunksize)):
+            perf[i] = values
+    return perf
+
+
+def perf_summary(perf):
+    """
+    Summed counters and derived ratios, keyed by their name in the output.
+    """
+    with warnings.catch_warnings(), \
+            np.errstate(invalid='ignore', divide='ignore'):
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        present = (~np.isnan(perf)).any(axis=0)
+        total = np.where(present, np.nansum(perf, axis=0), np.nan)
+        summary = {perf_name(c): total[perf_index[c]] for c in perf_counters}
+        for name, (numerator, denominator) in perf_ratios.items():
+            summary[f'perf_{name}'] = total[perf_index[numerator]] \
+                / total[perf_index[denominator]]
+        ipc = perf[:, perf_index['instructions']] \
+            / perf[:, perf_index['cycles']]
+        summary['perf_ipc_min'] = np.nanmin(ipc) if len(ipc) else np.nan
+        summary['perf_ipc_max'] = np.nanmax(ipc) if len(ipc) else np.nan
+    return summary
+
+
+def collect_energy(rapl_path, model_time_sim=None):
+    """
+    Reduce the RAPL snapshots of all nodes.
+
+    Returns
+    -------
+    summary : dict
+        Maps every entry of `energy_metrics` to its value, NaN if no node
+        provided the corresponding counters
+    """
+    package, dram, durations = [], [], []
+    for start_file in sorted(glob.glob(os.path.join(rapl_path,
+                                                    'rapl_*_start.json'))):
+        end_file = start_file[:-len('start.json')] + 'end.json'
+        if not os.path.exists(end_file):
+            continue
+        with open(start_file, 'r') as f:
+            start = json.load(f)
+        with open(end_file, 'r') as f:
+            end = json.load(f)
+        # core and uncore are part of the package energy
+        for name, joules in rapl.energy(start, end).values():
+            if name.startswith('package'):
+                package.append(joules)
+            elif name == 'dram':
+                dram.append(joules)
+        durations.append(end['time'] - start['time'])
+
+    summary = dict.fromkeys(energy_metrics, np.nan)
+    if package:
+        summary['energy_package'] = sum(package)
+    if dram:
+        summary['energy_dram'] = sum(dram)
+    if package or dram:
+        summary['energy_total'] = sum(package) + sum(dram)
+        summary['power_average'] = summary['energy_total'] \
+            / np.mean(durations)
+        if model_time_sim:
+            summary['energy_per_model_second'] = summary['energy_total'] \
+                / (model_time_sim / 1e3)
+    return summary
+
+
+def rank_distribution(acc, ranks):
+    """
+    Distribution of the timer metrics across ranks.
+
+    Returns
+    -------
+    stats : dict
+        Maps every entry of `rank_statistics` to an array indexed like
+        `all_metrics`
+    """
+    mean = acc.mean()
+    stats = {
+        'max': np.where(acc.count > 0, acc.max, np.nan),
+        'min': np.where(acc.count > 0, acc.min, np.nan),
+    }
+    with warnings.catch_warnings(), \
+            np.errstate(invalid='ignore', divide='ignore'):
+        # metrics missing in all logfiles yield NaN without further notice
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        stats['std'] = np.nanstd(ranks, axis=0)
+        if len(ranks):
+            pct = np.nanpercentile(ranks, percentiles, axis=0)
+        else:
+            pct = np.full((len(percentiles), len(all_metrics)), np.nan)
+        stats['imbalance'] = stats['max'] / mean
+    for q, values in zip(percentiles, pct):
+        stats[f'p{q}'] = values
+    return stats
+
+
+def write_timer_data(acc, ranks, outfile='timer_data.txt', perf=None,
+                     energy=None, abort_reason=None):
+    mean = acc.mean()
+    total = acc.total()
+    stats = rank_distribution(acc, ranks)
+    with open(outfile, "w") as outF:
+        for m in metrics:
+            outF.write(m + ' ' + str(mean[metric_index[m]]) + '\n')
+        for m in metrics_sum:
+            outF.write(m + ' ' + str(total[metric_index[m]]) + '\n')
+        # written after the means so that patterns matching a metric name
+        # find the mean first
+        for m in metrics:
+            for stat in rank_statistics:
+                outF.write(f'{m}_{stat} {stats[stat][metric_index[m]]}\n')
+        if perf is not None:
+            for name, value in perf_summary(perf).items():
+                outF.write(f'{name} {value}\n')
+        if energy is not None:
+            for name, value in energy.items():
+                outF.write(f'{name} {value}\n')
+        outF.write(f'aborted {int(abort_reason is not None)}\n')
+        if abort_reason is not None:
+            outF.write(f'abort_reason {abort_reason}\n')
+
+
+def write_rank_archive(logfiles, ranks, outfile='timer_data.npy'):
+    name_length = max([len(os.path.basename(f)) for f in logfiles] + [1])
+    dtype = [('logfile', f'U{name_length}')] \
+        + [(m, np.float64) for m in all_metrics]
+    archive = np.empty(len(logfiles), dtype=dtype)
+    archive['logfile'] = [os.path.basename(f) for f in logfiles]
+    for m in all_metrics:
+        archive[m] = ranks[:, metric_index[m]]
+    np.save(outfile, archive)
+
+
+def write_chunk_archive(chunks, outfile='timer_chunks.npy',
+                        model_time_sim=None):
+    mean, maximum = chunks.mean(), chunks.maximum()
+    num_chunks = len(chunks)
+    model_time = mean[:, chunk_index['chunk_model_time']]
+    if np.isnan(model_time).all() and model_time_sim:
+        model_time = model_time_sim * np.arange(1, num_chunks + 1) \
+            / num_chunks
+    timers = [m for m in metrics
+              if not np.isnan(mean[:, chunk_index[m]]).all()]
+    dtype = [('chunk', np.int64), ('model_time', np.float64)] \
+        + [(name, np.float64) for m in timers for name in (m, m + '_max')]
+    archive = np.empty(num_chunks, dtype=dtype)
+    archive['chunk'] = np.arange(num_chunks)
+    archive['model_time'] = model_time
+    for m in timers:
+        archive[m] = mean[:, chunk_index[m]]
+        archive[m + '_max'] = maximum[:, chunk_index[m]]
+    np.save(outfile, archive)
+
+
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('log_path')
+    parser.add_argument('--processes', type=int, default=available_cpus())
+    parser.add_argument('--rank-archive', action='store_true')
+    parser.add_argument('--perf-path', default=None)
+    parser.add_argument('--rapl-path', default=None)
+    parser.add_argument('--model-time-sim', type=float, default=None)
+    parser.add_argument('--abort-file', default=None)
+    parser.add_argument('--cumulative-chunks', action='store_true')
+    args = parser.parse_args()
+
+    all_logfiles = glob.glob(
+        os.path.join(
+            args.log_path,
+            '*logfile*'
+        )
+    )
+    all_logfiles.sort()
+    acc, ranks, chunks = collect(all_logfiles, processes=args.processes,
+                                 cumulative_chunks=args.cumulative_chunks)
+    perf = None
+    if args.perf_path and os.path.isdir(args.perf_path):
+        perf_files = sorted(glob.glob(os.path.join(args.perf_path,
+                                                   'perf_*.csv')))
+        perf = collect_perf(perf_files, processes=args.processes)
+    energy = collect_energy(args.rapl_path, args.model_time_sim) \
+        if args.rapl_path else None
+    abort_reason = None
+    if args.abort_file and os.path.exists(args.abort_file):
+        with open(args.abort_file, 'r') as f:
+            abort_reason = ' '.join(f.read().split()) or 'unknown'
+    write_timer_data(acc, ranks, perf=perf, energy=energy,
+                     abort_reason=abort_reason)
+    if args.rank_archive:
+        write_rank_archive(all_logfiles, ranks)
+    if len(chunks):
+        write_chunk_archive(chunks, model_time_sim=args.model_time_sim)
+
+
+if __name__ == '__main__':
+    main()
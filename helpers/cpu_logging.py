@@ -20,10 +20,23 @@ import os
 import sys
 import json
 
+from metadata_store import MetadataStore
+
 save_path = sys.argv[1]
 
+# lscpu only depends on the node, reuse its output from the metadata store
+# if run_benchmark configured one
+store = MetadataStore.from_environment()
+digest = store.lookup('lscpu') if store else None
+if digest:
+    lscpu = store.get(digest).decode()
+else:
+    lscpu = os.popen('lscpu').read()
+    if store:
+        store.register('lscpu', store.put(lscpu.encode()))
+
 cpu_info = [element.strip().replace(' ', '').replace('(', '').replace(')', '')
-            for element in os.popen('lscpu').readlines()]
+            for element in lscpu.splitlines()]
 
 cpu_info_dict = {}
 for element in cpu_info:
@@ -18,15 +18,18 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import os
-import sys
 import time
+import json
+import argparse
 import logging
 import logging.config
+from concurrent.futures import ThreadPoolExecutor
 from subprocess import Popen, PIPE, DEVNULL, CalledProcessError, TimeoutExpired
 import shlex
 
+from metadata_store import MetadataStore, static_recordables
+
 
-save_path = sys.argv[1]
 log = logging.getLogger()
 
 try:
@@ -66,76 +69,177 @@ recordables = {
 
 
 class Recorder(object):
-    def __init__(self, outdir="about", timeout=3, errors_fatal=False):
+    def __init__(self, outdir="about", timeout=3, errors_fatal=False,
+                 store=None):
         self.errors_fatal = errors_fatal
+        self.store = store
         self.timeout = timeout
         self.logtimethres = 10  # seconds
         self.outdir = outdir or '.'
+        self.summary_name = 'recorder-summary.json'
         if not os.path.isdir(outdir):
             os.mkdir(outdir)
             log.warning("created output directory %s", outdir)
 
     def record(self, recordables):
-        for name, command in recordables.items():
-            log.info("recording %s...", name)
-            outname = os.path.join(self.outdir, name) + ".out"
-            errname = os.path.join(self.outdir, name) + ".err"
-
-            parameters = {
-                'outdir': self.outdir,
-                'name': name,
-                'command': command,
-            }
-            try:
-                starttime = time.time()
-                stoptime = None
-                iotime = None
-                with Popen(shlex.split(command.format(**parameters)),
-                           stdout=PIPE, stderr=PIPE, stdin=DEVNULL) as infile:
-                    try:
-                        (stdout_data, stderr_data) = infile.communicate(
-                            timeout=self.timeout)
-                    except TimeoutExpired:
-                        log.warning(
-                            "%s: process did not finish in time! Output will be"
-                            "incomplete!", name)
-                        infile.kill()
-                        outs, errs = infile.communicate()
-                        log.error("Final words on stdout:\n%s", outs)
-                        log.error("Final words on stderr:\n%s", errs)
-                    stoptime = time.time()
-                    if infile.returncode != 0:
-                        log.warning("%s: returned %s (non-zero)!",
-                                    name, infile.returncode)
+        """
+        Run all recordables one after another.
+        """
+        summary = [self.record_one(name, command)
+                   for name, command in recordables.items()]
+        self.write_summary(summary)
+        return summary
+
+    def record_concurrent(self, recordables, max_workers=8, budget=None):
+        """
+        Run the recordables in a pool of at most `max_workers` threads.
+
+        If a `budget` (in seconds) is given, no recordable is started once
+        it is used up and the timeout of the running ones is shortened so
+        that the whole recording finishes within the budget.
+        """
+        deadline = time.time() + budget if budget else None
+
+        def run(name, command):
+            timeout = self.timeout
+            if deadline:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    log.warning("%s: skipped, time budget exhausted", name)
+                    return {'name': name, 'command': command,
+                            'status': 'skipped'}
+                timeout = min(timeout, remaining)
+            return self.record_one(name, command, timeout=timeout)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(run, name, command)
+                       for name, command in recordables.items()]
+            summary = [future.result() for future in futures]
+        self.write_summary(summary)
+        return summary
+
+    def record_one(self, name, command, timeout=None):
+        """
+        Record the output of a single command.
+
+        Returns
+        -------
+        result : dict
+            Name, command, status, return code and timings (in seconds) of
+            the execution and of writing the output.
+        """
+        log.info("recording %s...", name)
+        outname = os.path.join(self.outdir, name) + ".out"
+        errname = os.path.join(self.outdir, name) + ".err"
+        refname = os.path.join(self.outdir, name) + ".ref"
+        result = {'name': name, 'command': command, 'status': 'ok',
+                  'returncode': None, 'execution_time': None,
+                  'io_time': None}
+
+        cacheable = self.store is not None and name in static_recordables
+        if cacheable:
+            digest = self.store.lookup(name)
+            if digest:
+                with open(refname, 'w') as reffile:
+                    reffile.write(digest)
+                result['status'] = 'cached'
+                return result
+
+        parameters = {
+            'outdir': self.outdir,
+            'name': name,
+            'command': command,
+        }
+        starttime = time.time()
+        stoptime = None
+        iotime = None
+        try:
+            with Popen(shlex.split(command.format(**parameters)),
+                       stdout=PIPE, stderr=PIPE, stdin=DEVNULL) as infile:
+                try:
+                    (stdout_data, stderr_data) = infile.communicate(
+                        timeout=timeout or self.timeout)
+                except TimeoutExpired:
+                    log.warning(
+                        "%s: process did not finish in time! Output will be"
+                        "incomplete!", name)
+                    result['status'] = 'timeout'
+                    infile.kill()
+                    stdout_data, stderr_data = infile.communicate()
+                    log.error("Final words on stdout:\n%s", stdout_data)
+                    log.error("Final words on stderr:\n%s", stderr_data)
+                stoptime = time.time()
+                result['returncode'] = infile.returncode
+                if infile.returncode != 0:
+                    log.warning("%s: returned %s (non-zero)!",
+                                name, infile.returncode)
+                    if result['status'] == 'ok':
+                        result['status'] = 'failed'
+                if cacheable and result['status'] == 'ok':
+                    digest = self.store.put(stdout_data)
+                    self.store.register(name, digest)
+                    with open(refname, 'w') as reffile:
+                        reffile.write(digest)
+                else:
                     with open(outname, 'wb') as outfile:
                         outfile.write(stdout_data)
-                    if stderr_data:
-                        with open(errname, 'wb') as errfile:
-                            log.warning("ERRORS recorded for %s", name)
-                            errfile.write(stderr_data)
-                            if self.errors_fatal:
-                                log.fatal("ERRORS are configured to be fatal.")
-                                raise ValueError(
-                                    "Process wrote errors to STDERR!")
-                    iotime = time.time()
-            except CalledProcessError as e:
-                log.error("%s: called process failed! retrun code: %d",
-                          name, e.return_code)
-            except FileNotFoundError as e:
-                log.error("%s: %s", name, e)
-            finally:
-                if (stoptime and starttime and stoptime - starttime
-                        > self.logtimethres):
+                if stderr_data:
+                    with open(errname, 'wb') as errfile:
+                        log.warning("ERRORS recorded for %s", name)
+                        errfile.write(stderr_data)
+                        if self.errors_fatal:
+                            log.fatal("ERRORS are configured to be fatal.")
+                            raise ValueError(
+                                "Process wrote errors to STDERR!")
+                iotime = time.time()
+        except CalledProcessError as e:
+            log.error("%s: called process failed! retrun code: %d",
+                      name, e.return_code)
+            result['status'] = 'failed'
+        except FileNotFoundError as e:
+            log.error("%s: %s", name, e)
+            result['status'] = 'not-found'
+        finally:
+            if stoptime:
+                result['execution_time'] = stoptime - starttime
+                if stoptime - starttime > self.logtimethres:
                     log.info("%s execution took %s seconds",
                              name, stoptime - starttime)
-                if (iotime and stoptime and iotime - stoptime > self.logtimethres):
+            if iotime and stoptime:
+                result['io_time'] = iotime - stoptime
+                if iotime - stoptime > self.logtimethres:
                     log.info("%s io took %s seconds",
-                             name, stoptime - starttime)
+                             name, iotime - stoptime)
+        return result
+
+    def write_summary(self, summary):
+        with open(os.path.join(self.outdir, self.summary_name), 'w') as f:
+            json.dump(summary, f, indent=1)
 
 
 def main():
-    recorder = Recorder(outdir=save_path)
-    recorder.record(recordables)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('save_path')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='number of recordables run at the same time, '
+                             '1 records them one after another')
+    parser.add_argument('--budget', type=float, default=None,
+                        help='total time in seconds for concurrent recording')
+    parser.add_argument('--store', default=None,
+                        help='content-addressed store for static node '
+                             'metadata, see metadata_store.py')
+    args = parser.parse_args()
+
+    if args.store:
+        store = MetadataStore(args.store)
+    else:
+        store = MetadataStore.from_environment()
+    recorder = Recorder(outdir=args.save_path, store=store)
+    if args.concurrency > 1:
+        recorder.record_concurrent(recordables, max_workers=args.concurrency,
+                                   budget=args.budget)
+    else:
+        recorder.record(recordables)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# encoding: utf8
+
+# beNNch - Unified execution, collection, analysis and
+# comparison of neural network simulation benchmarks.
+# Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <https://www.gnu.org/licenses/>.
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Content-addressed store for node metadata that does not change between
+benchmark jobs (hardware inventory, cpu topology, system configuration).
+
+Outputs are stored once under their SHA-256 digest in `<store>/objects`.
+For every node, `<store>/hosts/<fingerprint>.json` maps the names of the
+recordables to the digests of their outputs. The fingerprint combines the
+hostname with the kernel release and the BIOS/board identification, so a
+kernel or firmware update invalidates the cached entries of a node.
+
+The archive of a run only contains `<name>.ref` files holding the digest.
+They are turned back into `<name>.out` files with
+
+    python metadata_store.py resolve <store> <directory>
+
+When the archives of the runs are added to the results repository,
+analysis/results_archive.py keeps the references and copies every object
+once into `metadata_objects` of the results repository, in the same
+layout as `<store>/objects`.
+"""
+
+import os
+import sys
+import json
+import socket
+import hashlib
+import tempfile
+import threading
+
+# recordables whose output only depends on the node, not on the job;
+# /proc/cpuinfo is not among them, it holds the current clock of every core
+static_recordables = [
+    'lshw',
+    'dmidecode',
+    'lspci',
+    'hwloc-info',
+    'hwloc-ls',
+    'getconf',
+    'lscpu',
+]
+
+dmi_files = ['bios_vendor', 'bios_version', 'bios_date',
+             'board_name', 'product_name']
+
+# environment variable through which run_benchmark passes the store location
+store_env = 'BENNCH_METADATA_STORE'
+
+
+def fingerprint():
+    """
+    Identify the node and the state of its kernel and firmware.
+
+    Returns
+    -------
+    digest : string
+        SHA-256 hex digest of hostname, kernel release and DMI information
+    """
+    components = [socket.getfqdn(), os.uname().release]
+    for name in dmi_files:
+        try:
+            with open(os.path.join('/sys/class/dmi/id', name), 'r') as f:
+                components.append(f.read().strip())
+        except OSError:
+            components.append('')
+    return hashlib.sha256('\n'.join(components).encode()).hexdigest()
+
+
+def object_path(objects_dir, digest):
+    """
+    Path of the object with SHA-256 hex digest `digest` in `objects_dir`.
+    """
+    return os.path.join(objects_dir, digest[:2], digest[2:])
+
+
+def _atomic_write(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class MetadataStore(object):
+    def __init__(self, path):
+        self.path = path
+        self.fingerprint = fingerprint()
+        # recordables may be registered from several recorder threads
+        self._lock = threading.Lock()
+        for subdir in ['objects', 'hosts']:
+            os.makedirs(os.path.join(path, subdir), exist_ok=True)
+
+    @classmethod
+    def from_environment(cls):
+        path = os.environ.get(store_env)
+        return cls(path) if path else None
+
+    def object_path(self, digest):
+        return object_path(os.path.join(self.path, 'objects'), digest)
+
+    def _host_path(self):
+        return os.path.join(self.path, 'hosts', self.fingerprint + '.json')
+
+    def put(self, data):
+        """
+        Store `data` (bytes) unless it is already present, return its digest.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _atomic_write(path, data)
+        return digest
+
+    def get(self, digest):
+        with open(self.object_path(digest), 'rb') as f:
+            return f.read()
+
+    def entries(self):
+        try:
+            with open(self._host_path(), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def lookup(self, name):
+        """
+        Digest of the cached output of recordable `name` on this node, None
+        if there is no valid entry.
+        """
+        digest = self.entries().get(name)
+        if digest and os.path.exists(self.object_path(digest)):
+            return digest
+        return None
+
+    def register(self, name, digest):
+        with self._lock:
+            entries = self.entries()
+            entries[name] = digest
+            _atomic_write(self._host_path(),
+                          json.dumps(entries, indent=1).encode())
+
+    def resolve(self, directory):
+        """
+        Replace all `<name>.ref` files in `directory` by `<name>.out` files
+        with the referenced content.
+        """
+        for filename in os.listdir(directory):
+            if not filename.endswith('.ref'):
+                continue
+            ref_path = os.path.join(directory, filename)
+            with open(ref_path, 'r') as f:
+                digest = f.read().strip()
+            out_path = ref_path[:-len('.ref')] + '.out'
+            with open(out_path, 'wb') as f:
+                f.write(self.get(digest))
+            os.remove(ref_path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] != 'resolve':
+        sys.exit(f'usage: {sys.argv[0]} resolve <store> <directory>')
+    MetadataStore(sys.argv[2]).resolve(sys.argv[3])
@@ -0,0 +1,186 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+"""
+Run the bench jobs of a JUBE benchmark packed into few SLURM allocations.
+
+With `submit_mode: packed` (see helpers/helpers.yaml), the bench step does
+not submit its job.slurm but only records the id of the build job it
+depends on. This script collects these work packages and groups the ones
+with the same partition, account, number of nodes and tasks per node, as
+they can share an allocation. Every group becomes a single job that runs
+the job.slurm of each work package after another in its work directory,
+so every run still writes its own timer_data.txt, cpu.json, job.json and
+metadata archive. The queue wait is paid once per group.
+
+Usage
+-----
+python pack_jobs.py <jube_outpath>/<jube_id> [--max-time <time>] [--dry-run]
+
+Wall times, of --max-time and of the job scripts, are given in the SLURM
+formats minutes, minutes:seconds, hours:minutes:seconds,
+days-hours[:minutes[:seconds]].
+"""
+
+import argparse
+import glob
+import os
+import re
+import subprocess
+
+dependency_file = 'packed_dependency'
+sbatch_pattern = re.compile(r'^#SBATCH\s+(-{1,2}[\w-]+)[=\s](.*)$')
+
+
+def read_header(job_file):
+    header = {}
+    with open(job_file, 'r') as f:
+        for line in f:
+            match = sbatch_pattern.match(line.strip())
+            if match:
+                header[match.group(1)] = match.group(2).strip()
+    return header
+
+
+def to_seconds(walltime):
+    """
+    Seconds of a wall time in one of the formats of `sbatch --time`.
+    """
+    days, _, clock = walltime.strip().rpartition('-')
+    fields = [int(x) for x in clock.split(':')]
+    if days:
+        # days-hours[:minutes[:seconds]]
+        fields += [0] * (3 - len(fields))
+    elif len(fields) == 1:
+        # minutes
+        fields = [0, fields[0], 0]
+    else:
+        # [hours:]minutes:seconds
+        fields = [0] * (3 - len(fields)) + fields
+    if len(fields) != 3:
+        raise ValueError(f'invalid wall time {walltime!r}')
+    hours, minutes, seconds = fields
+    return 86400 * int(days or 0) + 3600 * hours + 60 * minutes + seconds
+
+
+def to_walltime(seconds):
+    return f'{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}'
+
+
+def packed_work_packages(run_path):
+    """
+    Work directories of all bench work packages waiting to be packed.
+    """
+    work_dirs = []
+    for path in sorted(glob.glob(os.path.join(
+            run_path, '*_bench', 'work', dependency_file))):
+        work_dir = os.path.dirname(path)
+        if os.path.exists(os.path.join(work_dir, 'ready')) or \
+                os.path.exists(os.path.join(work_dir, 'packed')):
+            continue
+        work_dirs.append(work_dir)
+    return work_dirs
+
+
+def group(work_dirs, max_time=None):
+    """
+    Group work packages that can run in the same allocation, splitting
+    groups whose summed wall time would exceed `max_time` (seconds).
+    """
+    groups = {}
+    for work_dir in work_dirs:
+        header = read_header(os.path.join(work_dir, 'job.slurm'))
+        key = (header.get('--partition'), header.get('--account'),
+               header.get('--nodes'), header.get('--ntasks-per-node'))
+        groups.setdefault(key, []).append((work_dir, header))
+
+    packs = []
+    for key, members in groups.items():
+        pack, total = [], 0
+        for work_dir, header in members:
+            seconds = to_seconds(header['--time'])
+            if pack and max_time and total + seconds > max_time:
+                packs.append((key, pack, total))
+                pack, total = [], 0
+            pack.append(work_dir)
+            total += seconds
+        packs.append((key, pack, total))
+    return packs
+
+
+def write_pack(run_path, number, key, work_dirs, seconds):
+    partition, account, nodes, tasks_per_node = key
+    job_file = os.path.join(run_path, f'packed_{number}.slurm')
+    lines = ['#!/bin/bash',
+             f'#SBATCH --partition={partition}',
+             f'#SBATCH --job-name=packed_{number}',
+             f'#SBATCH -o {run_path}/packed_{number}.out',
+             f'#SBATCH -e {run_path}/packed_{number}.err',
+             f'#SBATCH --nodes={nodes}',
+             f'#SBATCH --ntasks-per-node={tasks_per_node}',
+             f'#SBATCH --time={to_walltime(seconds)}',
+             '#SBATCH --exclusive',
+             f'#SBATCH --account={account}']
+    for work_dir in work_dirs:
+        # same output files as for a job of its own
+        lines += [f'cd {work_dir}',
+                  'bash job.slurm > stdout 2> stderr']
+    with open(job_file, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return job_file
+
+
+def dependencies(work_dirs):
+    job_ids = set()
+    for work_dir in work_dirs:
+        with open(os.path.join(work_dir, dependency_file), 'r') as f:
+            job_id = f.read().strip()
+        if job_id:
+            job_ids.add(job_id)
+    return sorted(job_ids)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('run_path',
+                        help='directory of the JUBE run, <outpath>/<id>')
+    parser.add_argument('--max-time', default=None,
+                        help='upper limit of the wall time of a packed job, '
+                             'in a format of sbatch --time')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='only write the packed job files')
+    args = parser.parse_args()
+
+    run_path = os.path.abspath(args.run_path)
+    max_time = to_seconds(args.max_time) if args.max_time else None
+    work_dirs = packed_work_packages(run_path)
+    packs = group(work_dirs, max_time)
+    print(f'Packing {len(work_dirs)} work packages into {len(packs)} jobs.')
+    for number, (key, pack, seconds) in enumerate(packs):
+        job_file = write_pack(run_path, number, key, pack, seconds)
+        command = ['sbatch', '--parsable']
+        job_ids = dependencies(pack)
+        if job_ids:
+            command.append('--dependency=afterok:' + ':'.join(job_ids))
+        command.append(job_file)
+        print(' '.join(command))
+        if args.dry_run:
+            continue
+        subprocess.run(command, check=True)
+        for work_dir in pack:
+            open(os.path.join(work_dir, 'packed'), 'w').close()
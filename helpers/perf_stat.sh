@@ -0,0 +1,36 @@
+#!/bin/bash
+
+# beNNch - Unified execution, collection, analysis and
+# comparison of neural network simulation benchmarks.
+# Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. See the GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <https://www.gnu.org/licenses/>.
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# Run one MPI rank under `perf stat`, writing its hardware counters to
+# <output_dir>/perf_<rank>.csv, which collect_timer_data.py aggregates.
+# Without perf, the command runs unchanged.
+#
+# Usage: perf_stat.sh <output_dir> <event,event,...> <command> [args...]
+
+output_dir=$1
+events=$2
+shift 2
+
+if ! command -v perf > /dev/null
+then
+   exec "$@"
+fi
+
+mkdir -p "$output_dir"
+rank=${SLURM_PROCID:-${PMI_RANK:-${OMPI_COMM_WORLD_RANK:-0}}}
+exec perf stat -x, -e "$events" -o "$output_dir/perf_${rank}.csv" -- "$@"
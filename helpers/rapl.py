@@ -0,0 +1,92 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+"""
+Snapshot of the RAPL energy counters of a node.
+
+Run once per node before and once after the simulation (see
+`record_energy` in helpers/helpers.yaml). Every snapshot is written to
+<output_dir>/rapl_<hostname>_<label>.json and holds, for every zone of
+/sys/class/powercap/intel-rapl (packages and their DRAM, core and uncore
+subzones), its name, the counter in microjoules and the counter range
+after which it wraps around. collect_timer_data.py computes the energy of
+every node from the `start` and `end` snapshots.
+
+Zones whose counters cannot be read, e.g. because reading them requires
+root permissions, are left out, as are nodes without RAPL.
+
+Usage
+-----
+python rapl.py <output_dir> start|end
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import socket
+
+powercap_path = '/sys/class/powercap'
+
+
+def read(path):
+    with open(path, 'r') as f:
+        return f.read().strip()
+
+
+def snapshot():
+    zones = {}
+    for zone in sorted(glob.glob(os.path.join(powercap_path,
+                                              'intel-rapl:*'))):
+        try:
+            zones[os.path.basename(zone)] = {
+                'name': read(os.path.join(zone, 'name')),
+                'energy_uj': int(read(os.path.join(zone, 'energy_uj'))),
+                'max_energy_range_uj': int(read(os.path.join(
+                    zone, 'max_energy_range_uj'))),
+            }
+        except (OSError, ValueError):
+            continue
+    return {'host': socket.gethostname(), 'time': time.time(), 'zones': zones}
+
+
+def energy(start, end):
+    """
+    Energy in J consumed by every zone between two snapshots, taking one
+    wrap-around of the counters into account.
+    """
+    consumed = {}
+    for zone, before in start['zones'].items():
+        after = end['zones'].get(zone)
+        if after is None:
+            continue
+        delta = after['energy_uj'] - before['energy_uj']
+        if delta < 0:
+            delta += before['max_energy_range_uj']
+        consumed[zone] = (before['name'], delta * 1e-6)
+    return consumed
+
+
+if __name__ == '__main__':
+    output_dir, label = sys.argv[1], sys.argv[2]
+    os.makedirs(output_dir, exist_ok=True)
+    data = snapshot()
+    with open(os.path.join(output_dir,
+                           f"rapl_{data['host']}_{label}.json"), 'w') as f:
+        json.dump(data, f)
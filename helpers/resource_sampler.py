@@ -0,0 +1,243 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+"""
+Sample the resource usage of a node during a benchmark run.
+
+One sampler runs per node alongside the simulation (see `sampler_interval`
+in helpers/helpers.yaml) until it receives SIGTERM or SIGINT. Every
+`interval` seconds it records
+
+- time: seconds since the start of the sampler
+- mem_used: used memory of the node (MemTotal - MemAvailable) in bytes
+- rss: summed resident set size of the processes of the user in bytes
+- ctxt: context switches per second
+- net_rx, net_tx: bytes per second over all network interfaces but lo
+- ib_rx, ib_tx: bytes per second over all InfiniBand ports
+- cpu<i>: utilization of core i between 0 and 1
+
+Samples are written to a ring buffer of float32 rows, memory-mapped from
+`<hostname>.bin` in the output directory, so the newest `capacity` samples
+are kept at a fixed file size; a buffer that is not full is truncated at
+the end. Given the wall time of the job, the buffer holds just the samples
+that fit into it. `<hostname>.json` describes the columns, the start time
+and the number of samples written; `read` returns the samples in
+chronological order. The output directory is added to the metadata archive
+of the job.
+
+Usage
+-----
+python resource_sampler.py <output_dir> --interval 1.0 [--walltime hh:mm:ss]
+"""
+
+import os
+import math
+import json
+import time
+import glob
+import socket
+import signal
+import argparse
+
+import numpy as np
+
+page_size = os.sysconf('SC_PAGE_SIZE')
+
+
+def read_int(path):
+    try:
+        with open(path, 'r') as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+
+def memory_used():
+    values = {}
+    with open('/proc/meminfo', 'r') as f:
+        for line in f:
+            key, value = line.split(':', 1)
+            values[key] = int(value.split()[0]) * 1024
+    return values['MemTotal'] - values.get('MemAvailable', values['MemFree'])
+
+
+def user_rss(uid):
+    rss = 0
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            if os.stat(f'/proc/{pid}').st_uid != uid:
+                continue
+            with open(f'/proc/{pid}/statm', 'r') as f:
+                rss += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            # process ended in between
+            continue
+    return rss
+
+
+def cpu_times():
+    """
+    Busy and total jiffies of every core, and the context switches.
+    """
+    busy, total, ctxt = [], [], 0
+    with open('/proc/stat', 'r') as f:
+        for line in f:
+            fields = line.split()
+            if fields[0].startswith('cpu') and fields[0] != 'cpu':
+                values = [int(x) for x in fields[1:]]
+                # idle and iowait
+                idle = values[3] + (values[4] if len(values) > 4 else 0)
+                busy.append(sum(values) - idle)
+                total.append(sum(values))
+            elif fields[0] == 'ctxt':
+                ctxt = int(fields[1])
+    return np.array(busy), np.array(total), ctxt
+
+
+def network_bytes():
+    rx = tx = 0
+    for interface in glob.glob('/sys/class/net/*'):
+        if os.path.basename(interface) == 'lo':
+            continue
+        rx += read_int(os.path.join(interface, 'statistics', 'rx_bytes'))
+        tx += read_int(os.path.join(interface, 'statistics', 'tx_bytes'))
+    return rx, tx
+
+
+def infiniband_bytes():
+    rx = tx = 0
+    for counters in glob.glob('/sys/class/infiniband/*/ports/*/counters'):
+        # port data counters count in units of 4 bytes
+        rx += 4 * read_int(os.path.join(counters, 'port_rcv_data'))
+        tx += 4 * read_int(os.path.join(counters, 'port_xmit_data'))
+    return rx, tx
+
+
+class Sampler(object):
+    def __init__(self, outdir, interval=1., capacity=100000):
+        self.interval = interval
+        self.capacity = capacity
+        self.uid = os.getuid()
+        self.start = time.time()
+        self.host = socket.gethostname()
+        self.num_cores = len(cpu_times()[0])
+        self.columns = ['time', 'mem_used', 'rss', 'ctxt', 'net_rx', 'net_tx',
+                        'ib_rx', 'ib_tx'] + [f'cpu{i}'
+                                             for i in range(self.num_cores)]
+        os.makedirs(outdir, exist_ok=True)
+        self.data_file = os.path.join(outdir, f'{self.host}.bin')
+        self.descriptor_file = os.path.join(outdir, f'{self.host}.json')
+        self.buffer = np.memmap(self.data_file, dtype=np.float32, mode='w+',
+                                shape=(capacity, len(self.columns)))
+        self.count = 0
+        self.previous = self.counters()
+
+    def counters(self):
+        busy, total, ctxt = cpu_times()
+        return (time.monotonic(), busy, total, ctxt, network_bytes(),
+                infiniband_bytes())
+
+    def sample(self):
+        current = self.counters()
+        t, busy, total, ctxt, net, ib = current
+        t0, busy0, total0, ctxt0, net0, ib0 = self.previous
+        self.previous = current
+        dt = max(t - t0, 1e-9)
+        cpu = (busy - busy0) / np.maximum(total - total0, 1)
+        row = [time.time() - self.start, memory_used(), user_rss(self.uid),
+               (ctxt - ctxt0) / dt,
+               (net[0] - net0[0]) / dt, (net[1] - net0[1]) / dt,
+               (ib[0] - ib0[0]) / dt, (ib[1] - ib0[1]) / dt]
+        self.buffer[self.count % self.capacity] = row + list(cpu)
+        self.count += 1
+
+    def write_descriptor(self):
+        with open(self.descriptor_file, 'w') as f:
+            json.dump({'host': self.host,
+                       'start': self.start,
+                       'interval': self.interval,
+                       'capacity': self.capacity,
+                       'count': self.count,
+                       'dtype': 'float32',
+                       'columns': self.columns}, f)
+
+    def run(self):
+        stop = []
+        for signum in [signal.SIGTERM, signal.SIGINT]:
+            signal.signal(signum, lambda *_: stop.append(True))
+        next_time = time.monotonic()
+        while not stop:
+            next_time += self.interval
+            time.sleep(max(0., next_time - time.monotonic()))
+            self.sample()
+            if self.count % 10 == 0:
+                self.write_descriptor()
+        self.sample()
+        self.buffer.flush()
+        if self.count < self.capacity:
+            # drop the unused part of the buffer
+            del self.buffer
+            os.truncate(self.data_file, self.count * len(self.columns) * 4)
+            self.capacity = self.count
+        self.write_descriptor()
+
+
+def samples_per_walltime(walltime, interval):
+    hours, minutes, seconds = (int(x) for x in walltime.split(':'))
+    return math.ceil((3600 * hours + 60 * minutes + seconds) / interval) + 1
+
+
+def read(descriptor_file):
+    """
+    Samples of one node in chronological order as a structured array.
+    """
+    with open(descriptor_file, 'r') as f:
+        descriptor = json.load(f)
+    buffer = np.memmap(os.path.splitext(descriptor_file)[0] + '.bin',
+                       dtype=descriptor['dtype'], mode='r',
+                       shape=(descriptor['capacity'],
+                              len(descriptor['columns'])))
+    count, capacity = descriptor['count'], descriptor['capacity']
+    if count <= capacity:
+        rows = np.array(buffer[:count])
+    else:
+        head = count % capacity
+        rows = np.concatenate([buffer[head:], buffer[:head]])
+    return np.rec.fromarrays(rows.T, names=descriptor['columns'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('outdir')
+    parser.add_argument('--interval', type=float, default=1.,
+                        help='seconds between two samples')
+    parser.add_argument('--capacity', type=int, default=100000,
+                        help='maximum number of samples kept in the ring '
+                             'buffer')
+    parser.add_argument('--walltime', default=None,
+                        help='wall time of the job as hh:mm:ss, limits the '
+                             'buffer to the samples taken within it')
+    args = parser.parse_args()
+
+    capacity = args.capacity
+    if args.walltime:
+        capacity = min(capacity,
+                       samples_per_walltime(args.walltime, args.interval))
+    Sampler(args.outdir, args.interval, capacity).run()
@@ -0,0 +1,186 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+"""
+Abort benchmark runs that are far slower than expected.
+
+The watchdog runs in the job script next to the srun of the simulation
+(see `watchdog_multiple` in helpers/helpers.yaml). It follows the progress
+of the simulation through a heartbeat file, whose path is passed to the
+model in the environment variable BENNCH_HEARTBEAT. The model appends one
+line per simulated chunk, either
+
+    <simulated model time in ms>
+
+or
+
+    <unix time in s> <simulated model time in ms>
+
+where the first form takes the time at which the watchdog first sees the
+line as wall-clock time, accurate to the polling interval. From the first
+and the latest line, the real-time factor of the simulation is projected.
+Once `min_progress` of the model time has been simulated, a projection
+exceeding `multiple` times the expected real-time factor aborts the run.
+So does a heartbeat that stalls for longer than `stall_timeout` seconds.
+
+To abort, the reason is written to the abort file and the srun process is
+terminated. collect_timer_data.py then marks the partial timer data as
+aborted.
+
+Usage
+-----
+python watchdog.py <srun_pid> --heartbeat <file> --abort-file <file> \
+    --expected-rtf 2.5 --multiple 3 --model-time-sim 1000
+"""
+
+import os
+import sys
+import time
+import signal
+import argparse
+
+heartbeat_env = 'BENNCH_HEARTBEAT'
+
+
+def read_heartbeat(path, seen_at=None):
+    """
+    Wall-clock and model time of every heartbeat written so far.
+
+    Parameters
+    ----------
+    seen_at : list, optional
+        Wall-clock time at which every line was first read, extended with
+        the current time for new lines. It stands in for the wall-clock time
+        of lines that only hold the model time; without it, these lines are
+        skipped.
+    """
+    entries = []
+    try:
+        with open(path, 'r') as f:
+            # the last line may still be written
+            lines = [line for line in f if line.endswith('\n')]
+    except OSError:
+        return entries
+    if seen_at is not None:
+        now = time.time()
+        seen_at.extend([now] * (len(lines) - len(seen_at)))
+    for i, line in enumerate(lines):
+        fields = line.split()
+        try:
+            if len(fields) == 1 and seen_at is not None:
+                entries.append((seen_at[i], float(fields[0])))
+            elif len(fields) >= 2:
+                entries.append((float(fields[0]), float(fields[1])))
+        except ValueError:
+            # not a heartbeat
+            continue
+    return entries
+
+
+def projected_rtf(entries):
+    (wall_first, model_first), (wall_last, model_last) = entries[0], \
+        entries[-1]
+    if model_last <= model_first:
+        return None
+    return (wall_last - wall_first) / ((model_last - model_first) / 1e3)
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def abort(pid, abort_file, reason, grace=30.):
+    with open(abort_file, 'w') as f:
+        f.write(reason + '\n')
+    print(f'watchdog: {reason}, aborting', flush=True)
+    os.kill(pid, signal.SIGTERM)
+    deadline = time.time() + grace
+    while alive(pid) and time.time() < deadline:
+        time.sleep(1.)
+    if alive(pid):
+        os.kill(pid, signal.SIGKILL)
+
+
+def watch(pid, heartbeat, abort_file, expected_rtf, multiple, model_time_sim,
+          interval=10., min_progress=0.05, stall_timeout=0.):
+    """
+    Poll the heartbeat until the process ends or is aborted.
+
+    Returns
+    -------
+    reason : str or None
+        Why the run was aborted, None if it was not
+    """
+    last_change = time.time()
+    last_count = 0
+    seen_at = []
+    while alive(pid):
+        time.sleep(interval)
+        entries = read_heartbeat(heartbeat, seen_at)
+        if len(entries) != last_count:
+            last_change = time.time()
+            last_count = len(entries)
+        reason = None
+        if stall_timeout and entries and \
+                time.time() - last_change > stall_timeout:
+            reason = (f'no heartbeat for {time.time() - last_change:.0f} s '
+                      f'at {entries[-1][1]} of {model_time_sim} ms')
+        elif len(entries) >= 2 and \
+                entries[-1][1] >= min_progress * model_time_sim:
+            rtf = projected_rtf(entries)
+            if rtf is not None and rtf > multiple * expected_rtf:
+                reason = (f'projected real-time factor {rtf:.3g} exceeds '
+                          f'{multiple:g} x expected {expected_rtf:.3g} '
+                          f'at {entries[-1][1]} of {model_time_sim} ms')
+        if reason is not None and alive(pid):
+            abort(pid, abort_file, reason)
+            return reason
+    return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pid', type=int, help='process id of the srun')
+    parser.add_argument('--heartbeat', default=os.environ.get(heartbeat_env))
+    parser.add_argument('--abort-file', default='aborted')
+    parser.add_argument('--expected-rtf', type=float, required=True,
+                        help='real-time factor of past runs')
+    parser.add_argument('--multiple', type=float, default=3.,
+                        help='abort above this multiple of the expected '
+                             'real-time factor')
+    parser.add_argument('--model-time-sim', type=float, required=True,
+                        help='model time to be simulated in ms')
+    parser.add_argument('--interval', type=float, default=10.,
+                        help='seconds between two checks')
+    parser.add_argument('--min-progress', type=float, default=0.05,
+                        help='fraction of the model time simulated before '
+                             'the first projection')
+    parser.add_argument('--stall-timeout', type=float, default=0.,
+                        help='abort after this many seconds without '
+                             'heartbeat, 0 disables')
+    args = parser.parse_args()
+
+    # terminated by the job script once the simulation is done
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    watch(args.pid, args.heartbeat, args.abort_file, args.expected_rtf,
+          args.multiple, args.model_time_sim, interval=args.interval,
+          min_progress=args.min_progress, stall_timeout=args.stall_timeout)
@@ -0,0 +1,387 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+"""
+Benchmark of beNNch's own post-processing pipeline on synthetic data.
+
+Every stage is run on generated inputs of increasing size in a temporary
+directory, without SLURM, JUBE or a simulator:
+
+- collect: collect_timer_data.py on rank logfiles (size = ranks)
+- recorder_sequential, recorder_concurrent: metadata_archive.Recorder on
+  commands of 50 ms each (size = recordables)
+- prepare_result: analysis_helper.prepare_result on fake JUBE work
+  directories with job.json, cpu.json and metadata archives (size = runs)
+- annex_add, annex_metadata_batch, annex_metadata: the git-annex helpers of
+  analysis_helper on a throwaway repository (size = result files)
+- results_index_add, results_index_query: results_index.ResultsIndex
+  (size = result files)
+- plot: plot_helper.plot (size = plots)
+- flipbook_cold, flipbook_warm: flipbook.render_plots with an empty and a
+  filled render cache (size = plots)
+
+Stages whose dependencies are missing (git-annex, bennchplot, the flipbook
+requirements) are reported as skipped. The timings are written to a json
+report together with the commit of the repository, so they can be
+compared across commits.
+
+Usage
+-----
+python pipeline_benchmark.py [--stages collect plot ...] [--ranks 1 1000] \
+    [--output pipeline_benchmark.json]
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import socket
+import logging
+import tarfile
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import yaml
+
+repo_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+for path in ['helpers', 'analysis', '']:
+    sys.path.insert(1, os.path.join(repo_path, path))
+
+import collect_timer_data  # noqa: E402
+
+stages = ['collect', 'recorder', 'prepare_result', 'annex', 'results_index',
+          'plot', 'flipbook']
+
+
+@contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.makedirs(path, exist_ok=True)
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def timed(function, *args, **kwargs):
+    starttime = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - starttime
+
+
+def result_columns():
+    """
+    Columns of the JUBE result table of the benchmark template.
+    """
+    with open(os.path.join(repo_path, 'benchmarks', 'template.yaml')) as f:
+        template = yaml.safe_load(f)
+    return template['result']['table']['column']
+
+
+def write_logfiles(path, num_ranks, rng):
+    os.makedirs(path, exist_ok=True)
+    names = collect_timer_data.all_metrics
+    for rank in range(num_ranks):
+        values = rng.gamma(2., 1., len(names))
+        with open(os.path.join(path, f'logfile_{rank}'), 'w') as f:
+            f.writelines(f'{name} {value}\n'
+                         for name, value in zip(names, values))
+
+
+def write_result_csv(path, rng, node_counts=(1, 2, 4, 8), seeds=3):
+    """
+    Result table of a strong-scaling experiment with plausible timers.
+    """
+    rows = []
+    for num_nodes in node_counts:
+        for seed in range(seeds):
+            row = {column: rng.gamma(2., 1.) for column in result_columns()}
+            phases = {phase: rng.uniform(5., 10.) / num_nodes for phase in
+                      ['update', 'collocate', 'communicate', 'deliver']}
+            row.update({
+                'rng_seed': seed, 'num_nodes': num_nodes,
+                'threads_per_task': 4, 'tasks_per_node': 2,
+                'model_time_sim': 1000.,
+                'wall_time_create': 20. / num_nodes,
+                'wall_time_connect': 30. / num_nodes,
+                'wall_time_sim': sum(phases.values()) * 1.05,
+                'aborted': 0, 'abort_reason': '',
+            })
+            row.update({f'wall_time_phase_{phase}': value
+                        for phase, value in phases.items()})
+            rows.append(row)
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+def write_work_directories(base_path, num_runs, rng, files_per_archive=20):
+    """
+    Work directories of a JUBE bench step as left behind by run_benchmark.
+    """
+    for run in range(num_runs):
+        work = os.path.join(base_path, f'{run:06d}_bench', 'work')
+        os.makedirs(work, exist_ok=True)
+        with open(os.path.join(work, 'job.json'), 'w') as f:
+            json.dump({'num_nodes': '1', 'tasks_per_node': '2',
+                       'threads_per_task': '4', 'model_name': 'synthetic'}, f)
+        with open(os.path.join(work, 'cpu.json'), 'w') as f:
+            json.dump({'Architecture': 'x86_64', 'CPUs': '128'}, f)
+        metadata_uuid = str(uuid.uuid4())
+        metadata = os.path.join(work, metadata_uuid)
+        os.makedirs(metadata)
+        for i in range(files_per_archive):
+            with open(os.path.join(metadata, f'recordable_{i}.out'), 'w') as f:
+                f.write(rng.bytes(2048).hex())
+        with tarfile.open(metadata + '.tgz', 'w:gz') as tar:
+            tar.add(metadata, arcname=metadata_uuid)
+        shutil.rmtree(metadata)
+
+
+def bench_collect(workdir, size, rng, processes):
+    log_path = os.path.join(workdir, f'logs_{size}')
+    write_logfiles(log_path, size, rng)
+    logfiles = sorted(os.path.join(log_path, name)
+                      for name in os.listdir(log_path))
+
+    def run():
+        acc, ranks, _ = collect_timer_data.collect(logfiles, processes=processes)
+        collect_timer_data.write_timer_data(
+            acc, ranks, outfile=os.path.join(workdir, 'timer_data.txt'))
+    return {'collect': timed(run)}
+
+
+def bench_recorder(workdir, size, rng, processes):
+    from metadata_archive import Recorder
+    logging.getLogger().setLevel(logging.WARNING)
+    recordables = {f'recordable_{i}': 'sleep 0.05' for i in range(size)}
+    timings = {}
+    for name, method, kwargs in [
+            ('recorder_sequential', 'record', {}),
+            ('recorder_concurrent', 'record_concurrent', {'max_workers': 8})]:
+        recorder = Recorder(outdir=os.path.join(workdir, f'{name}_{size}'))
+        timings[name] = timed(getattr(recorder, method), recordables, **kwargs)
+    return timings
+
+
+def bench_prepare_result(workdir, size, rng, processes):
+    from analysis_helper import prepare_result
+    base_path = os.path.join(workdir, f'jube_{size}', '000000')
+    write_work_directories(base_path, size, rng)
+    uuidgen_hash = str(uuid.uuid4())
+    write_result_csv(os.path.join(base_path, uuidgen_hash + '.csv'), rng,
+                     node_counts=range(1, size + 1), seeds=1)
+    with working_directory(os.path.join(workdir, f'results_{size}')):
+        return {'prepare_result': timed(prepare_result, uuidgen_hash,
+                                        base_path)}
+
+
+def bench_annex(workdir, size, rng, processes):
+    if shutil.which('git-annex') is None:
+        raise SkipStage('git-annex not installed')
+    from analysis_helper import (git_annex_add, git_annex_metadata_batch,
+                                 annex_metadata)
+    repository = os.path.join(workdir, f'annex_{size}')
+    with working_directory(repository):
+        for command in [['git', 'init', '-q'],
+                        ['git', 'annex', 'init', '-q', 'pipeline-benchmark']]:
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        paths = []
+        for i in range(size):
+            paths.append(f'./{uuid.uuid4()}.csv')
+            write_result_csv(paths[-1], rng, seeds=1)
+        fields = {path: {'machine': 'synthetic', 'user': 'benchmark',
+                         'model_name': 'synthetic',
+                         'simulator-version': f'3.{i % 4}'}
+                  for i, path in enumerate(paths)}
+        return {
+            'annex_add': timed(git_annex_add, paths),
+            'annex_metadata_batch': timed(git_annex_metadata_batch, fields),
+            'annex_metadata': timed(annex_metadata),
+        }
+
+
+def bench_results_index(workdir, size, rng, processes):
+    from results_index import ResultsIndex
+    path = os.path.join(workdir, f'results_index_{size}')
+    os.makedirs(path, exist_ok=True)
+    csv_files = []
+    for i in range(size):
+        csv_files.append(os.path.join(path, f'{uuid.uuid4()}.csv'))
+        write_result_csv(csv_files[-1], rng, seeds=1)
+    index = ResultsIndex(os.path.join(path, 'results_index.sqlite'))
+
+    def add():
+        for i, csv_file in enumerate(csv_files):
+            index.add(csv_file, {'machine': 'synthetic',
+                                 'simulator-version': f'3.{i % 4}'})
+    timings = {'results_index_add': timed(add),
+               'results_index_query': timed(index.query,
+                                            **{'simulator-version': '3.1'})}
+    index.close()
+    return timings
+
+
+def synthetic_results(workdir, size, rng):
+    path = os.path.join(workdir, f'plots_{size}')
+    os.makedirs(path, exist_ok=True)
+    csv_files = []
+    for i in range(size):
+        csv_files.append(os.path.join(path, f'{uuid.uuid4()}.csv'))
+        write_result_csv(csv_files[-1], rng)
+    return path, csv_files
+
+
+def bench_plot(workdir, size, rng, processes):
+    try:
+        from plot_helper import plot
+    except ImportError as e:
+        raise SkipStage(str(e))
+    path, csv_files = synthetic_results(workdir, size, rng)
+
+    def run():
+        for csv_file in csv_files:
+            plot('nodes', os.path.basename(csv_file)[:-4], csv_file, path)
+    return {'plot': timed(run)}
+
+
+def bench_flipbook(workdir, size, rng, processes):
+    try:
+        from flipbook.flipbook import render_plots
+    except ImportError as e:
+        raise SkipStage(str(e))
+    path, csv_files = synthetic_results(workdir, size, rng)
+    plot_path = os.path.join(path, 'flip_plots')
+    os.makedirs(plot_path, exist_ok=True)
+    with working_directory(path):
+        # the render cache lives in the working directory
+        return {
+            'flipbook_cold': timed(render_plots, csv_files, 'nodes',
+                                   plot_path, processes),
+            'flipbook_warm': timed(render_plots, csv_files, 'nodes',
+                                   plot_path, processes),
+        }
+
+
+class SkipStage(Exception):
+    pass
+
+
+benchmarks = {
+    'collect': (bench_collect, 'ranks'),
+    'recorder': (bench_recorder, 'recordables'),
+    'prepare_result': (bench_prepare_result, 'runs'),
+    'annex': (bench_annex, 'result_files'),
+    'results_index': (bench_results_index, 'result_files'),
+    'plot': (bench_plot, 'plots'),
+    'flipbook': (bench_flipbook, 'plots'),
+}
+
+
+def environment():
+    commit = subprocess.run(['git', '-C', repo_path, 'rev-parse', 'HEAD'],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            text=True).stdout.strip()
+    return {
+        'commit': commit or None,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'host': socket.gethostname(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'cpus': os.cpu_count(),
+    }
+
+
+def run(selected, sizes, workdir, processes, seed=12345):
+    rng = np.random.default_rng(seed)
+    measurements = []
+    for stage in selected:
+        function, unit = benchmarks[stage]
+        for size in sizes[unit]:
+            entry = {'stage': stage, 'size': size, 'unit': unit}
+            try:
+                timings = function(workdir, size, rng, processes)
+            except SkipStage as e:
+                measurements.append({**entry, 'status': 'skipped',
+                                     'reason': str(e)})
+                print(f'{stage} ({size} {unit}): skipped, {e}')
+                break
+            except Exception as e:
+                measurements.append({**entry, 'status': 'failed',
+                                     'reason': repr(e)})
+                print(f'{stage} ({size} {unit}): failed, {e!r}')
+                continue
+            for name, seconds in timings.items():
+                measurements.append({**entry, 'stage': name, 'status': 'ok',
+                                     'seconds': seconds})
+                print(f'{name} ({size} {unit}): {seconds:.3f} s')
+    return measurements
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time the post-processing pipeline on synthetic data.')
+    parser.add_argument('--stages', nargs='+', choices=stages, default=stages)
+    parser.add_argument('--ranks', type=int, nargs='+',
+                        default=[1, 100, 1000, 10000],
+                        help='numbers of rank logfiles for collect')
+    parser.add_argument('--recordables', type=int, nargs='+', default=[8, 32])
+    parser.add_argument('--runs', type=int, nargs='+', default=[4, 16, 64],
+                        help='numbers of work directories for prepare_result')
+    parser.add_argument('--result-files', type=int, nargs='+',
+                        default=[10, 100, 1000],
+                        help='numbers of result csv files for git-annex and '
+                             'the results index')
+    parser.add_argument('--plots', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--workdir', default=None,
+                        help='directory for the synthetic data, a temporary '
+                             'one by default')
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the synthetic data')
+    parser.add_argument('--output', default='pipeline_benchmark.json')
+    args = parser.parse_args()
+
+    sizes = {'ranks': args.ranks, 'recordables': args.recordables,
+             'runs': args.runs, 'result_files': args.result_files,
+             'plots': args.plots}
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(
+        prefix='bennch_pipeline_'))
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        measurements = run(args.stages, sizes, workdir, args.processes)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {'environment': environment(), 'sizes': sizes,
+              'measurements': measurements}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f'Report written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
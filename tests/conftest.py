@@ -0,0 +1,29 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+"""
+The helpers and analysis scripts import each other as top-level modules, as
+they do when run from their directories.
+"""
+
+import os
+import sys
+
+repo_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+for path in ['helpers', 'analysis']:
+    sys.path.insert(1, os.path.join(repo_path, path))
@@ -0,0 +1,98 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+from analysis_helper import annex_metadata, git_annex_metadata_batch
+
+# answers `git annex metadata --batch --json` line by line like git-annex,
+# logging the requests; files named fail* fail, garbled* get no json
+stub_git = f"""#!{sys.executable}
+import json
+import os
+import sys
+
+with open(os.environ['STUB_GIT_LOG'], 'a') as log:
+    log.write(json.dumps(sys.argv[1:]) + '\\n')
+    if sys.argv[1:] == ['annex', 'metadata', '--batch', '--json']:
+        for line in sys.stdin:
+            log.write(line)
+            log.flush()
+            request = json.loads(line)
+            if request['file'].startswith('garbled'):
+                print('git-annex: garbled', flush=True)
+                continue
+            print(json.dumps({{
+                'file': request['file'],
+                'fields': request['fields'],
+                'success': not request['file'].startswith('fail')}}),
+                flush=True)
+    else:
+        for file, fields in json.loads(os.environ['STUB_GIT_METADATA']):
+            print(json.dumps({{'file': file, 'fields': fields,
+                               'success': True}}))
+"""
+
+
+@pytest.fixture
+def git_log(tmp_path, monkeypatch):
+    bin_path = tmp_path / 'bin'
+    bin_path.mkdir()
+    (bin_path / 'git').write_text(stub_git)
+    os.chmod(bin_path / 'git', 0o755)
+    monkeypatch.setenv('PATH', f"{bin_path}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv('STUB_GIT_LOG', str(tmp_path / 'git.log'))
+    return tmp_path / 'git.log'
+
+
+def test_metadata_batch(git_log):
+    failed = git_annex_metadata_batch({
+        'a.csv': {'machine': 'jureca', 'num_nodes': 2},
+        'fail.csv': {'machine': 'jureca'},
+        'garbled.csv': {'machine': 'jureca'},
+        'b.csv': {'user': 'me'},
+    })
+    assert failed == ['fail.csv', 'garbled.csv']
+    lines = git_log.read_text().splitlines()
+    # a single git-annex session for all files
+    assert json.loads(lines[0]) == ['annex', 'metadata', '--batch', '--json']
+    assert [json.loads(line) for line in lines[1:]] == [
+        {'file': 'a.csv', 'fields': {'machine': ['jureca'],
+                                     'num_nodes': ['2']}},
+        {'file': 'fail.csv', 'fields': {'machine': ['jureca']}},
+        {'file': 'garbled.csv', 'fields': {'machine': ['jureca']}},
+        {'file': 'b.csv', 'fields': {'user': ['me']}},
+    ]
+
+
+def test_annex_metadata(git_log, monkeypatch):
+    monkeypatch.setenv('STUB_GIT_METADATA', json.dumps([
+        ['a.csv', {'machine': ['jureca'], 'tags': ['x', 'y'],
+                   'machine-lastchanged': ['2021-01-01@00-00-00']}],
+        ['b.zip', {}],
+    ]))
+    assert annex_metadata(['a.csv', 'b.zip']) == {
+        'a.csv': {'machine': 'jureca', 'tags': 'x,y'},
+        'b.zip': {},
+    }
+    assert json.loads(git_log.read_text()) == [
+        'annex', 'metadata', '--json', 'a.csv', 'b.zip']
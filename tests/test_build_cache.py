@@ -0,0 +1,69 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import pytest
+
+from build_cache import check, plan_hash, record
+
+install = ('nest-simulator', '3.6', 'default')
+
+
+@pytest.fixture
+def plans(tmp_path):
+    plans = tmp_path / 'plans'
+    (plans / 'nest-simulator' / '3.6').mkdir(parents=True)
+    (plans / 'nest-simulator' / 'common').write_text('cmake ..\n')
+    (plans / 'nest-simulator' / '3.6' / 'default').write_text('-Dwith-mpi\n')
+    return str(plans)
+
+
+@pytest.fixture
+def modules(tmp_path):
+    modules = tmp_path / 'modules'
+    (modules / 'nest-simulator' / '3.6').mkdir(parents=True)
+    (modules / 'nest-simulator' / '3.6' / 'default').write_text('#%Module\n')
+    return str(modules)
+
+
+def test_hit_after_record(plans, modules):
+    assert not check(modules, plans, *install)
+    record(modules, plans, *install)
+    assert check(modules, plans, *install)
+
+
+def test_changed_plan_invalidates(tmp_path, plans, modules):
+    record(modules, plans, *install)
+    (tmp_path / 'plans' / 'nest-simulator' / 'common').write_text(
+        'cmake -DCMAKE_BUILD_TYPE=Release ..\n')
+    assert not check(modules, plans, *install)
+
+
+def test_suffix_is_part_of_the_hash(plans):
+    assert plan_hash(plans, *install) != plan_hash(plans, *install, 'debug')
+
+
+def test_missing_module_is_rebuilt(tmp_path, plans, modules):
+    record(modules, plans, *install)
+    (tmp_path / 'modules' / 'nest-simulator' / '3.6' / 'default').unlink()
+    assert not check(modules, plans, *install)
+
+
+def test_without_plans_or_modules(plans, modules):
+    assert plan_hash(plans, 'arbor', '0.9', 'default') is None
+    assert not check('', plans, *install)
+    assert not check(modules, None, *install)
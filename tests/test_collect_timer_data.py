@@ -0,0 +1,244 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+import collect_timer_data as ctd
+
+
+def write_logfiles(directory, entries_by_rank):
+    logfiles = []
+    for rank, entries in enumerate(entries_by_rank):
+        logfile = directory / f'logfile_{rank}'
+        logfile.write_text(''.join(f'{key} {value}\n'
+                                   for key, value in entries))
+        logfiles.append(str(logfile))
+    return logfiles
+
+
+def read_timer_data(path):
+    with open(path, 'r') as f:
+        return [line.rstrip('\n').split(' ', 1) for line in f]
+
+
+def test_timer_data_keeps_baseline_format(tmp_path):
+    logfiles = write_logfiles(tmp_path, [
+        [('time_simulate', 10.), ('time_update', 4.), ('total_memory', 100)],
+        [('time_simulate', 14.), ('time_update', 2.), ('total_memory', 300),
+         ('unknown_metric', 1.)],
+    ])
+    acc, ranks, chunks = ctd.collect(logfiles, processes=1)
+    outfile = str(tmp_path / 'timer_data.txt')
+    ctd.write_timer_data(acc, ranks, outfile=outfile)
+    lines = read_timer_data(outfile)
+
+    # means of the timers, then sums of the other metrics, as the baseline
+    num_metrics = len(ctd.all_metrics)
+    assert [key for key, _ in lines[:num_metrics]] == ctd.all_metrics
+    values = dict(lines[:num_metrics])
+    assert values['time_simulate'] == str(np.mean([10., 14.]))
+    assert values['time_update'] == str(np.mean([4., 2.]))
+    assert values['total_memory'] == str(np.sum([100., 300.]))
+    assert values['time_deliver_spike_data'] == 'nan'
+    assert values['num_connections'] == 'nan'
+
+    # followed by the distribution across ranks of every timer
+    stats = lines[num_metrics:-1]
+    assert [key for key, _ in stats] == [
+        f'{m}_{stat}' for m in ctd.metrics for stat in ctd.rank_statistics]
+    stats = dict(stats)
+    assert float(stats['time_simulate_max']) == 14.
+    assert float(stats['time_simulate_min']) == 10.
+    assert float(stats['time_simulate_std']) == 2.
+    assert float(stats['time_simulate_imbalance']) == pytest.approx(14 / 12)
+    assert stats['time_deliver_spike_data_max'] == 'nan'
+    assert lines[-1] == ['aborted', '0']
+    assert len(chunks) == 0
+
+
+def test_timer_data_of_aborted_run(tmp_path):
+    logfiles = write_logfiles(tmp_path, [[('time_simulate', 1.)]])
+    acc, ranks, _ = ctd.collect(logfiles, processes=1)
+    outfile = str(tmp_path / 'timer_data.txt')
+    ctd.write_timer_data(acc, ranks, outfile=outfile,
+                         abort_reason='projected real-time factor 40')
+    assert read_timer_data(outfile)[-2:] == [
+        ['aborted', '1'], ['abort_reason', 'projected real-time factor 40']]
+
+
+def test_accumulator():
+    acc = ctd.Accumulator(3)
+    acc.add(np.array([1., np.nan, 5.]))
+    acc.add(np.array([3., np.nan, -1.]))
+    acc.add(np.array([2., np.nan, np.nan]))
+    assert list(acc.count) == [3, 0, 2]
+    assert np.allclose(acc.sum, [6., 0., 4.])
+    assert np.allclose(acc.min[[0, 2]], [1., -1.])
+    assert np.allclose(acc.max[[0, 2]], [3., 5.])
+    assert np.allclose(acc.mean(), [2., np.nan, 2.], equal_nan=True)
+    assert np.allclose(acc.total(), [6., np.nan, 4.], equal_nan=True)
+
+
+def test_rank_distribution():
+    ranks = np.full((101, len(ctd.all_metrics)), np.nan)
+    i = ctd.metric_index['time_update']
+    ranks[:, i] = np.arange(101.)
+    acc = ctd.Accumulator(len(ctd.all_metrics))
+    for values in ranks:
+        acc.add(values)
+    stats = ctd.rank_distribution(acc, ranks)
+    assert stats['max'][i] == 100.
+    assert stats['min'][i] == 0.
+    assert stats['p50'][i] == 50.
+    assert stats['p95'][i] == 95.
+    assert stats['p99'][i] == 99.
+    assert stats['imbalance'][i] == 2.
+    assert np.isnan(stats['p50'][ctd.metric_index['time_simulate']])
+
+
+def test_parse_perf_file(tmp_path):
+    perf_file = tmp_path / 'perf_0.csv'
+    perf_file.write_text(
+        '# started on Mon Jan  1 00:00:00 2024\n'
+        '\n'
+        '2000,,cycles:u,1000000,100.00,,\n'
+        '3000,,instructions:u,1000000,100.00,1.50,insn per cycle\n'
+        '40,,LLC-loads,1000000,100.00,,\n'
+        '<not counted>,,LLC-load-misses,0,0.00,,\n'
+        '<not supported>,,stalled-cycles-frontend,0,100.00,,\n')
+    values = ctd.parse_perf_file(str(perf_file))
+    expected = dict.fromkeys(ctd.perf_counters, np.nan)
+    expected.update({'cycles': 2000., 'instructions': 3000.,
+                     'LLC-loads': 40.})
+    assert np.allclose(values, list(expected.values()), equal_nan=True)
+
+
+def test_perf_summary():
+    perf = np.full((2, len(ctd.perf_counters)), np.nan)
+    perf[:, ctd.perf_index['cycles']] = [1000., 3000.]
+    perf[:, ctd.perf_index['instructions']] = [2000., 3000.]
+    summary = ctd.perf_summary(perf)
+    assert summary['perf_cycles'] == 4000.
+    assert summary['perf_instructions'] == 5000.
+    assert summary['perf_ipc'] == 1.25
+    assert summary['perf_ipc_min'] == 1.
+    assert summary['perf_ipc_max'] == 2.
+    assert np.isnan(summary['perf_llc_loads'])
+    assert np.isnan(summary['perf_llc_miss_rate'])
+
+
+def write_snapshots(directory, host, start, end, duration,
+                    max_energy_range_uj=1000000):
+    for label, energies, time in [('start', start, 0.),
+                                  ('end', end, duration)]:
+        if energies is None:
+            continue
+        zones = {zone: {'name': name, 'energy_uj': energy_uj,
+                        'max_energy_range_uj': max_energy_range_uj}
+                 for zone, (name, energy_uj) in energies.items()}
+        with open(directory / f'rapl_{host}_{label}.json', 'w') as f:
+            json.dump({'host': host, 'time': time, 'zones': zones}, f)
+
+
+def test_collect_energy(tmp_path):
+    write_snapshots(tmp_path, 'node1',
+                    {'intel-rapl:0': ('package-0', 100000),
+                     'intel-rapl:0:0': ('dram', 0)},
+                    {'intel-rapl:0': ('package-0', 300000),
+                     'intel-rapl:0:0': ('dram', 100000)}, duration=2.)
+    # the package counter wraps around during the run
+    write_snapshots(tmp_path, 'node2',
+                    {'intel-rapl:0': ('package-0', 900000)},
+                    {'intel-rapl:0': ('package-0', 200000)}, duration=4.)
+    # nodes without an end snapshot are left out
+    write_snapshots(tmp_path, 'node3',
+                    {'intel-rapl:0': ('package-0', 0)}, None, duration=1.)
+    summary = ctd.collect_energy(str(tmp_path), model_time_sim=500.)
+    assert list(summary) == ctd.energy_metrics
+    assert summary['energy_package'] == pytest.approx(0.2 + 0.3)
+    assert summary['energy_dram'] == pytest.approx(0.1)
+    assert summary['energy_total'] == pytest.approx(0.6)
+    assert summary['power_average'] == pytest.approx(0.6 / 3.)
+    assert summary['energy_per_model_second'] == pytest.approx(0.6 / 0.5)
+
+
+def test_collect_energy_without_rapl(tmp_path):
+    summary = ctd.collect_energy(str(tmp_path), model_time_sim=500.)
+    assert all(np.isnan(value) for value in summary.values())
+
+
+def chunked_logfiles(directory, model_time=True):
+    entries_by_rank = []
+    for rank, scale in enumerate([1., 3.]):
+        entries = []
+        for chunk in range(3):
+            entries += [('time_simulate', scale * (chunk + 1)),
+                        ('time_update', scale * (chunk + 1) / 2.)]
+            if model_time:
+                entries.append(('chunk_model_time', 100. * (chunk + 1)))
+        entries_by_rank.append(entries)
+    return write_logfiles(directory, entries_by_rank)
+
+
+def read_chunk_archive(logfiles, directory, cumulative,
+                       model_time_sim=None):
+    _, _, chunks = ctd.collect(logfiles, processes=1,
+                               cumulative_chunks=cumulative)
+    outfile = str(directory / 'timer_chunks.npy')
+    ctd.write_chunk_archive(chunks, outfile=outfile,
+                            model_time_sim=model_time_sim)
+    return np.load(outfile)
+
+
+def test_chunk_archive(tmp_path):
+    archive = read_chunk_archive(chunked_logfiles(tmp_path), tmp_path,
+                                 cumulative=False)
+    assert archive.dtype.names == (
+        'chunk', 'model_time', 'time_update', 'time_update_max',
+        'time_simulate', 'time_simulate_max')
+    assert list(archive['chunk']) == [0, 1, 2]
+    assert np.allclose(archive['model_time'], [100., 200., 300.])
+    assert np.allclose(archive['time_simulate'], [2., 4., 6.])
+    assert np.allclose(archive['time_simulate_max'], [3., 6., 9.])
+    assert np.allclose(archive['time_update'], [1., 2., 3.])
+
+
+def test_cumulative_chunk_archive(tmp_path):
+    archive = read_chunk_archive(chunked_logfiles(tmp_path), tmp_path,
+                                 cumulative=True)
+    # differences between consecutive chunks
+    assert np.allclose(archive['time_simulate'], [2., 2., 2.])
+    assert np.allclose(archive['time_simulate_max'], [3., 3., 3.])
+    assert np.allclose(archive['time_update'], [1., 1., 1.])
+    # the model time is not a timer
+    assert np.allclose(archive['model_time'], [100., 200., 300.])
+
+
+def test_chunk_model_time_from_model_time_sim(tmp_path):
+    archive = read_chunk_archive(chunked_logfiles(tmp_path, model_time=False),
+                                 tmp_path, cumulative=False,
+                                 model_time_sim=900.)
+    assert np.allclose(archive['model_time'], [300., 600., 900.])
+
+
+def test_single_values_are_not_chunks(tmp_path):
+    logfiles = write_logfiles(tmp_path, [[('time_simulate', 1.)]])
+    assert ctd.parse_logfile(logfiles[0])[1] is None
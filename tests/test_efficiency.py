@@ -0,0 +1,84 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import numpy as np
+import pandas as pd
+
+from efficiency import add_efficiency, efficiency_columns
+
+
+def results(times_by_nodes, model_time_sim=1000.):
+    rows = []
+    for num_nodes, times in times_by_nodes.items():
+        for seed, t in enumerate(times):
+            rows.append({'num_nodes': num_nodes, 'tasks_per_node': 8,
+                         'threads_per_task': 16, 'rng_seed': seed,
+                         'model_time_sim': model_time_sim,
+                         'wall_time_sim': t,
+                         'wall_time_phase_update': t / 2.})
+    return pd.DataFrame(rows)
+
+
+def test_strong_scaling():
+    df = add_efficiency(results({1: [100., 100.], 2: [60., 60.],
+                                 4: [25., 25.]}), 'nodes')
+    by_nodes = df.groupby('num_nodes').first()
+    assert np.allclose(by_nodes.speedup, [1., 100. / 60., 4.])
+    assert np.allclose(by_nodes.parallel_efficiency, [1., 100. / 120., 1.])
+    assert np.allclose(by_nodes.efficiency_phase_update,
+                       by_nodes.parallel_efficiency)
+    # identical seeds have no error
+    assert np.allclose(by_nodes.speedup_err, 0.)
+    assert len(df) == 6
+
+
+def test_weak_scaling():
+    df = add_efficiency(results({1: [100.], 4: [125.]}), 'nodes', weak=True)
+    by_nodes = df.groupby('num_nodes').first()
+    assert np.allclose(by_nodes.weak_scaling_efficiency, [1., 0.8])
+    assert np.allclose(by_nodes.speedup, [1., 3.2])
+    # phases without timers are left out
+    assert set(efficiency_columns(weak=True)) & set(df.columns) == {
+        'speedup', 'speedup_err', 'weak_scaling_efficiency',
+        'weak_scaling_efficiency_err', 'efficiency_phase_update',
+        'efficiency_phase_update_err'}
+
+
+def test_error_propagation():
+    df = add_efficiency(results({1: [90., 110.], 2: [45., 55.]}), 'nodes')
+    row = df[df.num_nodes == 2].iloc[0]
+    assert np.isclose(row.speedup, 2.)
+    # both times have a relative standard error of 10 / 100
+    assert np.isclose(row.speedup_err, 2. * np.sqrt(2.) * 0.1)
+    reference = df[df.num_nodes == 1].iloc[0]
+    assert reference.speedup_err == 0.
+
+
+def test_reference_per_configuration():
+    df = pd.concat([results({2: [80.], 4: [40.]}, model_time_sim=1000.),
+                    results({1: [50.], 2: [25.]}, model_time_sim=500.)])
+    df = add_efficiency(df, 'nodes')
+    assert np.allclose(df.speedup, [1., 2., 1., 2.])
+
+
+def test_thread_scaling_uses_virtual_processes():
+    df = results({1: [100.]})
+    df = pd.concat([df, df.assign(threads_per_task=32, wall_time_sim=50.,
+                                  wall_time_phase_update=25.)])
+    df = add_efficiency(df, 'threads')
+    assert np.allclose(df.parallel_efficiency, [1., 1.])
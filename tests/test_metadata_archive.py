@@ -0,0 +1,80 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import json
+import time
+
+from metadata_archive import Recorder
+from metadata_store import MetadataStore
+
+stub_recordables = {
+    'echo': 'echo recorded',
+    'stderr': "sh -c 'echo warning >&2'",
+    'false': 'false',
+    'missing': 'no-such-command-for-the-recorder',
+}
+
+
+def test_record_concurrent_writes_summary(tmp_path):
+    recorder = Recorder(outdir=str(tmp_path / 'about'))
+    summary = recorder.record_concurrent(stub_recordables, max_workers=4)
+    with open(tmp_path / 'about' / 'recorder-summary.json') as f:
+        assert json.load(f) == summary
+    by_name = {result['name']: result for result in summary}
+    # in the order of the recordables, not of their completion
+    assert [result['name'] for result in summary] == list(stub_recordables)
+    assert by_name['echo']['command'] == 'echo recorded'
+    assert by_name['echo']['status'] == 'ok'
+    assert by_name['echo']['returncode'] == 0
+    assert by_name['echo']['execution_time'] >= 0.
+    assert by_name['echo']['io_time'] >= 0.
+    assert by_name['false']['status'] == 'failed'
+    assert by_name['false']['returncode'] == 1
+    assert by_name['missing']['status'] == 'not-found'
+    assert by_name['missing']['execution_time'] is None
+    assert (tmp_path / 'about' / 'echo.out').read_text() == 'recorded\n'
+    assert (tmp_path / 'about' / 'stderr.err').read_text() == 'warning\n'
+
+
+def test_budget_cuts_recording_short(tmp_path):
+    recorder = Recorder(outdir=str(tmp_path / 'about'), timeout=30)
+    starttime = time.time()
+    summary = recorder.record_concurrent({'slow': 'sleep 20',
+                                          'queued': 'sleep 20'},
+                                         max_workers=1, budget=1.)
+    assert time.time() - starttime < 10.
+    # the running recordable is killed at the end of the budget, the
+    # queued one is not started
+    assert [result['status'] for result in summary] == ['timeout', 'skipped']
+    assert summary[0]['returncode'] != 0
+    assert summary[1] == {'name': 'queued', 'command': 'sleep 20',
+                          'status': 'skipped'}
+    with open(tmp_path / 'about' / 'recorder-summary.json') as f:
+        assert json.load(f) == summary
+
+
+def test_static_recordables_are_cached(tmp_path):
+    store = MetadataStore(str(tmp_path / 'store'))
+    first = Recorder(outdir=str(tmp_path / 'first'), store=store)
+    assert first.record({'lscpu': 'echo topology'})[0]['status'] == 'ok'
+    second = Recorder(outdir=str(tmp_path / 'second'), store=store)
+    assert second.record({'lscpu': 'false'})[0]['status'] == 'cached'
+    digest = (tmp_path / 'second' / 'lscpu.ref').read_text()
+    assert (tmp_path / 'first' / 'lscpu.ref').read_text() == digest
+    assert store.get(digest) == b'topology\n'
+    assert not (tmp_path / 'second' / 'lscpu.out').exists()
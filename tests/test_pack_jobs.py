@@ -0,0 +1,96 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import os
+
+import pytest
+
+from pack_jobs import (dependencies, group, packed_work_packages,
+                       read_header, to_seconds, to_walltime, write_pack)
+
+
+def work_package(run_path, number, nodes, time, dependency=''):
+    work_dir = run_path / f'{number:06d}_bench' / 'work'
+    work_dir.mkdir(parents=True)
+    (work_dir / 'job.slurm').write_text(
+        '#!/bin/bash\n'
+        '#SBATCH --partition=batch\n'
+        '#SBATCH --account=project\n'
+        f'#SBATCH --nodes={nodes}\n'
+        '#SBATCH --ntasks-per-node=4\n'
+        f'#SBATCH --time={time}\n'
+        'srun python run.py\n')
+    (work_dir / 'packed_dependency').write_text(dependency + '\n')
+    return str(work_dir)
+
+
+def test_walltime_conversion():
+    assert to_seconds('01:02:03') == 3723
+    assert to_seconds('90') == 5400
+    assert to_seconds('30:00') == 1800
+    assert to_seconds('1-00:00:00') == 86400
+    assert to_seconds('2-3') == 2 * 86400 + 3 * 3600
+    assert to_seconds('1-01:30') == 86400 + 5400
+    assert to_walltime(3723) == '01:02:03'
+    assert to_walltime(90000) == '25:00:00'
+
+
+def test_read_header(tmp_path):
+    work_dir = work_package(tmp_path, 0, 2, '00:10:00')
+    header = read_header(os.path.join(work_dir, 'job.slurm'))
+    assert header['--nodes'] == '2'
+    assert header['--time'] == '00:10:00'
+
+
+def test_group_by_nodes_and_split_by_time(tmp_path):
+    work_dirs = [work_package(tmp_path, 0, 1, '00:30:00'),
+                 work_package(tmp_path, 1, 1, '00:30:00'),
+                 work_package(tmp_path, 2, 1, '00:30:00'),
+                 work_package(tmp_path, 3, 2, '00:30:00')]
+    packs = group(work_dirs, max_time=3600)
+    sizes = sorted((key[2], len(pack), seconds)
+                   for key, pack, seconds in packs)
+    assert sizes == [('1', 1, 1800), ('1', 2, 3600), ('2', 1, 1800)]
+
+
+def test_skip_ready_and_packed_work_packages(tmp_path):
+    work_dirs = [work_package(tmp_path, i, 1, '00:10:00') for i in range(3)]
+    open(os.path.join(work_dirs[0], 'ready'), 'w').close()
+    open(os.path.join(work_dirs[1], 'packed'), 'w').close()
+    assert packed_work_packages(str(tmp_path)) == [work_dirs[2]]
+
+
+def test_write_pack_and_dependencies(tmp_path):
+    work_dirs = [work_package(tmp_path, 0, 1, '00:10:00', '123'),
+                 work_package(tmp_path, 1, 1, '00:10:00', '123'),
+                 work_package(tmp_path, 2, 1, '00:10:00', '')]
+    (key, pack, seconds), = group(work_dirs)
+    job_file = write_pack(str(tmp_path), 0, key, pack, seconds)
+    header = read_header(job_file)
+    assert header['--time'] == '00:30:00'
+    assert header['--nodes'] == '1'
+    with open(job_file) as f:
+        assert f.read().count('bash job.slurm') == 3
+    assert dependencies(pack) == ['123']
+
+
+def test_invalid_walltime():
+    with pytest.raises(ValueError):
+        to_seconds('1:02:03:04')
+    with pytest.raises(ValueError):
+        to_seconds('1-01:02:03:04')
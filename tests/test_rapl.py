@@ -0,0 +1,78 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import pytest
+
+import rapl
+
+
+def write_zone(powercap, zone, name, energy_uj, max_energy_range_uj):
+    path = powercap / zone
+    path.mkdir()
+    (path / 'name').write_text(name + '\n')
+    if energy_uj is not None:
+        (path / 'energy_uj').write_text(f'{energy_uj}\n')
+    (path / 'max_energy_range_uj').write_text(f'{max_energy_range_uj}\n')
+
+
+def zones(**energies):
+    return {'zones': {zone: {'name': name, 'energy_uj': energy_uj,
+                             'max_energy_range_uj': 1000}
+                      for zone, (name, energy_uj) in energies.items()}}
+
+
+def test_snapshot(tmp_path, monkeypatch):
+    write_zone(tmp_path, 'intel-rapl:0', 'package-0', 5000, 2 ** 32)
+    write_zone(tmp_path, 'intel-rapl:0:0', 'dram', 700, 2 ** 16)
+    # e.g. not readable without root permissions
+    write_zone(tmp_path, 'intel-rapl:1', 'package-1', None, 2 ** 32)
+    (tmp_path / 'other').mkdir()
+    monkeypatch.setattr(rapl, 'powercap_path', str(tmp_path))
+    data = rapl.snapshot()
+    assert data['zones'] == {
+        'intel-rapl:0': {'name': 'package-0', 'energy_uj': 5000,
+                         'max_energy_range_uj': 2 ** 32},
+        'intel-rapl:0:0': {'name': 'dram', 'energy_uj': 700,
+                           'max_energy_range_uj': 2 ** 16},
+    }
+    assert {'host', 'time'} <= set(data)
+
+
+def test_energy():
+    start = zones(**{'intel-rapl:0': ('package-0', 100),
+                     'intel-rapl:0:0': ('dram', 10)})
+    end = zones(**{'intel-rapl:0': ('package-0', 600),
+                   'intel-rapl:0:0': ('dram', 30)})
+    consumed = rapl.energy(start, end)
+    assert consumed['intel-rapl:0'] == ('package-0', pytest.approx(5e-4))
+    assert consumed['intel-rapl:0:0'] == ('dram', pytest.approx(2e-5))
+
+
+def test_energy_wraps_around():
+    start = zones(**{'intel-rapl:0': ('package-0', 900)})
+    end = zones(**{'intel-rapl:0': ('package-0', 100)})
+    # 100 uJ up to the end of the range of 1000 uJ, 100 uJ after it
+    assert rapl.energy(start, end)['intel-rapl:0'] \
+        == ('package-0', pytest.approx(2e-4))
+
+
+def test_zones_missing_at_the_end_are_left_out():
+    start = zones(**{'intel-rapl:0': ('package-0', 100),
+                     'intel-rapl:1': ('package-1', 100)})
+    end = zones(**{'intel-rapl:0': ('package-0', 200)})
+    assert list(rapl.energy(start, end)) == ['intel-rapl:0']
@@ -0,0 +1,114 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import regression
+from regression import compare, completed, permutation_p_value
+from results_index import ResultsIndex
+
+
+def results(wall_times, num_nodes=1):
+    return pd.DataFrame({'model_name': 'microcircuit',
+                         'machine': 'jureca',
+                         'num_nodes': num_nodes,
+                         'tasks_per_node': 8,
+                         'threads_per_task': 16,
+                         'wall_time_sim': wall_times})
+
+
+def test_empty_selection():
+    assert compare(pd.DataFrame(), results([1., 1.1]),
+                   ['wall_time_sim']) == []
+    assert compare(results([1., 1.1]), pd.DataFrame(),
+                   ['wall_time_sim']) == []
+
+
+def test_regression_detected():
+    baseline = results([10.0, 10.1, 9.9, 10.0, 10.05])
+    candidate = results([12.0, 12.1, 11.9, 12.0, 12.05])
+    comparisons = compare(baseline, candidate, ['wall_time_sim'],
+                          num_bootstrap=2000)
+    assert len(comparisons) == 1
+    assert comparisons[0]['verdict'] == 'regression'
+    assert np.isclose(comparisons[0]['relative_change'], 0.2, rtol=1e-2)
+
+
+def test_improvement_and_unchanged():
+    baseline = results([10.0, 10.1, 9.9, 10.0, 10.05])
+    faster = results([8.0, 8.1, 7.9, 8.0, 8.05])
+    same = results([10.02, 10.0, 9.95, 10.08, 10.0])
+    assert compare(baseline, faster, ['wall_time_sim'],
+                   num_bootstrap=2000)[0]['verdict'] == 'improvement'
+    assert compare(baseline, same, ['wall_time_sim'],
+                   num_bootstrap=2000)[0]['verdict'] == 'unchanged'
+
+
+def test_two_seeds_are_inconclusive():
+    # the smallest attainable p-value is 1 / binom(4, 2) = 1/6
+    comparison = compare(results([10., 10.1]), results([20., 20.1]),
+                         ['wall_time_sim'], num_bootstrap=2000)[0]
+    assert comparison['verdict'] == 'inconclusive'
+    assert np.isclose(comparison['p_min'], 1. / 6.)
+
+
+def test_only_matching_configurations_are_compared():
+    baseline = pd.concat([results([1., 1.1], num_nodes=1),
+                          results([1., 1.1], num_nodes=2)])
+    candidate = results([1., 1.1], num_nodes=2)
+    comparisons = compare(baseline, candidate, ['wall_time_sim'],
+                          num_bootstrap=100)
+    assert [c['num_nodes'] for c in comparisons] == [2]
+
+
+def test_permutation_p_value_exact():
+    rng = np.random.default_rng(0)
+    # the candidate holds the largest values: only 1 of binom(6, 3) splits
+    # is as extreme
+    p = permutation_p_value(np.array([1., 2., 3.]), np.array([4., 5., 6.]),
+                            1000, rng)
+    assert np.isclose(p, 1. / 20.)
+
+
+def test_completed_drops_aborted_runs():
+    df = results([1., 2., 3.])
+    df['aborted'] = [0, 1, np.nan]
+    assert list(completed(df).wall_time_sim) == [1., 3.]
+
+
+def test_no_matching_configuration_fails(tmp_path, monkeypatch):
+    path = tmp_path / 'h1.csv'
+    results([10., 10.1, 9.9]).to_csv(path)
+    index = ResultsIndex(str(tmp_path / 'index.sqlite'))
+    index.add(str(path), {'key': 'h1', 'simulator-version': '3.5',
+                          'machine': 'jureca'})
+    index.close()
+    monkeypatch.setattr(regression, 'ResultsIndex', lambda: ResultsIndex(
+        str(tmp_path / 'index.sqlite')))
+    # a typo in the candidate selects nothing
+    monkeypatch.setattr(sys, 'argv', [
+        'regression.py', '--baseline', 'simulator-version=3.5',
+        '--candidate', 'simulator-verison=3.6',
+        '--report', str(tmp_path / 'report.json')])
+    with pytest.raises(SystemExit) as exit_info:
+        regression.main()
+    assert exit_info.value.code == 3
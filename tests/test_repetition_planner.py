@@ -0,0 +1,83 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import numpy as np
+import pandas as pd
+
+from repetition_planner import (followup_parameterset, plan,
+                                relative_ci_width, seeds_needed)
+
+
+def results():
+    # 1 node is quiet, 2 nodes are noisy; every run takes 3600 s
+    rows = []
+    for num_nodes, times in [(1, [100., 100.5, 99.5]),
+                             (2, [50., 60., 40.])]:
+        for seed, t in enumerate(times):
+            rows.append({'num_nodes': num_nodes, 'tasks_per_node': 1,
+                         'threads_per_task': 8, 'rng_seed': seed,
+                         'wall_time_sim': t,
+                         'wall_time_create': 3600. - t})
+    return pd.DataFrame(rows)
+
+
+def test_relative_ci_width():
+    # t quantile for 2 degrees of freedom
+    assert np.isclose(relative_ci_width(10., 1., 3),
+                      2. * 4.303 * 1. / np.sqrt(3.) / 10.)
+
+
+def test_seeds_needed():
+    assert seeds_needed(10., 0.01, 3, 0.05, 20) == 3
+    assert seeds_needed(10., 5., 3, 0.05, 20) == 20
+    n = seeds_needed(10., 0.5, 3, 0.05, 100)
+    assert relative_ci_width(10., 0.5, n) <= 0.05
+    assert relative_ci_width(10., 0.5, n - 1) > 0.05
+
+
+def test_plan_adds_seeds_to_noisy_configurations():
+    configurations = plan(results(), threshold=0.05, budget=np.inf,
+                          overhead=0.)
+    quiet, noisy = sorted(configurations, key=lambda c: c['num_nodes'])
+    assert quiet['seeds_added'] == 0
+    assert noisy['seeds_added'] == noisy['seeds_needed'] - 3 > 0
+    assert np.isclose(noisy['node_hours_per_run'], 2.)
+
+
+def test_plan_respects_budget():
+    configurations = plan(results(), threshold=0.05, budget=5.,
+                          overhead=0.)
+    noisy = [c for c in configurations if c['num_nodes'] == 2][0]
+    # 2 node hours per run
+    assert noisy['seeds_added'] == 2
+
+
+def test_followup_parameterset():
+    configurations = plan(results(), threshold=0.05, budget=5.,
+                          overhead=0.)
+    parameterset = followup_parameterset(configurations, first_seed=3)
+    parameters = {p['name']: p['_']
+                  for p in parameterset['parameterset'][0]['parameter']}
+    assert parameters['followup_index'] == '0,1'
+    assert parameters['num_nodes'] == '[2, 2][$followup_index]'
+    assert parameters['rng_seed'] == '[3, 4][$followup_index]'
+
+
+def test_followup_parameterset_without_runs():
+    configurations = plan(results(), threshold=10., budget=np.inf)
+    assert followup_parameterset(configurations, first_seed=3) is None
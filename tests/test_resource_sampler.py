@@ -0,0 +1,104 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import json
+import os
+import signal
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+import resource_sampler
+from resource_sampler import Sampler, read, samples_per_walltime
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'),
+                                reason='samples /proc and /sys')
+
+
+def test_samples_per_walltime():
+    assert samples_per_walltime('00:10:00', 1.) == 601
+    assert samples_per_walltime('01:00:00', 7.) == 516
+
+
+def test_ring_buffer_keeps_newest_samples(tmp_path):
+    sampler = Sampler(str(tmp_path), interval=0.01, capacity=3)
+    for _ in range(5):
+        sampler.sample()
+    sampler.write_descriptor()
+    samples = read(sampler.descriptor_file)
+    assert len(samples) == 3
+    assert (samples.time[1:] >= samples.time[:-1]).all()
+    assert os.path.getsize(sampler.data_file) \
+        == 3 * len(sampler.columns) * 4
+
+
+class Clock(object):
+    """
+    Fake time advancing by one second whenever it is read.
+    """
+
+    def __init__(self):
+        self.now = 1000.
+
+    def time(self):
+        self.now += 1.
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+def test_read_after_wrap_around_is_chronological(tmp_path, monkeypatch):
+    monkeypatch.setattr(resource_sampler, 'time', Clock())
+    # a job of 2 s sampled every second holds 3 samples
+    capacity = samples_per_walltime('00:00:02', 1.)
+    sampler = Sampler(str(tmp_path), interval=1., capacity=capacity)
+    for _ in range(3 * capacity + 1):
+        sampler.sample()
+    sampler.write_descriptor()
+    with open(sampler.descriptor_file) as f:
+        descriptor = json.load(f)
+    assert descriptor['count'] == 10
+    assert descriptor['capacity'] == 3
+    assert descriptor['columns'] == sampler.columns
+    samples = read(sampler.descriptor_file)
+    # every sample reads the clock once, starting 1 s after the start
+    assert list(samples.time) == [8., 9., 10.]
+    assert samples.dtype.names == tuple(sampler.columns)
+
+
+def test_run_truncates_unused_buffer(tmp_path):
+    handlers = {signum: signal.getsignal(signum)
+                for signum in [signal.SIGTERM, signal.SIGINT]}
+    sampler = Sampler(str(tmp_path), interval=0.01, capacity=100000)
+    timer = threading.Timer(0.2, os.kill, (os.getpid(), signal.SIGTERM))
+    timer.start()
+    try:
+        sampler.run()
+    finally:
+        timer.cancel()
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+    assert 0 < sampler.count < 100000
+    assert os.path.getsize(sampler.data_file) \
+        == sampler.count * len(sampler.columns) * 4
+    samples = read(sampler.descriptor_file)
+    assert len(samples) == sampler.count
+    assert (np.diff(samples.time) > 0).all()
@@ -0,0 +1,129 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from metadata_store import MetadataStore
+from results_archive import ResultsArchive, convert, write_archive
+
+
+def write_run(directory, metadata_uuid, files):
+    run = directory / metadata_uuid
+    for name, content in files.items():
+        (run / name).parent.mkdir(parents=True, exist_ok=True)
+        (run / name).write_text(content)
+    archive = directory / f'{metadata_uuid}.tgz'
+    with tarfile.open(archive, 'w:gz') as tar:
+        tar.add(run, arcname=metadata_uuid)
+    return str(archive)
+
+
+def test_write_and_read(tmp_path):
+    runs = [write_run(tmp_path, 'aaa', {'stderr': 'error a',
+                                        'resources/node.json': '{}'}),
+            write_run(tmp_path, 'bbb', {'stderr': 'error b'})]
+    archive_path = str(tmp_path / 'hash.zip')
+    write_archive(archive_path, runs)
+    with ResultsArchive(archive_path) as archive:
+        assert archive.runs() == ['aaa', 'bbb']
+        assert sorted(archive.members('aaa')) == ['resources/node.json',
+                                                  'stderr']
+        assert archive.read('bbb', 'stderr') == b'error b'
+        with archive.open('aaa', 'stderr') as f:
+            assert f.read() == b'error a'
+        paths = archive.extract('aaa', ['stderr'], str(tmp_path / 'out'))
+    assert paths == [str(tmp_path / 'out' / 'aaa' / 'stderr')]
+
+
+def test_convert(tmp_path):
+    runs = [write_run(tmp_path, 'aaa', {'stderr': 'error a'}),
+            write_run(tmp_path, 'bbb', {'stderr': 'error b'})]
+    tgz_path = str(tmp_path / 'hash.tgz')
+    with tarfile.open(tgz_path, 'w') as tar:
+        for run in runs:
+            tar.add(run, arcname=os.path.join('hash', os.path.basename(run)))
+    archive_path, object_paths = convert(tgz_path)
+    assert object_paths == []
+    assert archive_path == str(tmp_path / 'hash.zip')
+    with ResultsArchive(archive_path) as archive:
+        assert archive.runs() == ['aaa', 'bbb']
+        assert archive.read('aaa', 'stderr') == b'error a'
+
+
+def test_referenced_objects_are_stored_once(tmp_path):
+    store = MetadataStore(str(tmp_path / 'store'))
+    digest = store.put(b'lscpu output')
+    runs = [write_run(tmp_path, metadata_uuid, {'lscpu.ref': digest + '\n'})
+            for metadata_uuid in ['aaa', 'bbb']]
+    archive_path = str(tmp_path / 'hash.zip')
+    object_paths = write_archive(archive_path, runs,
+                                 metadata_store=store.path)
+    objects_dir = tmp_path / 'metadata_objects'
+    assert object_paths == [str(objects_dir / digest[:2] / digest[2:])]
+    assert [p.name for p in objects_dir.rglob('*') if p.is_file()] \
+        == [digest[2:]]
+    with ResultsArchive(archive_path) as archive:
+        assert archive.members('aaa') == ['lscpu.ref']
+        assert archive.read('aaa', 'lscpu.ref') == digest.encode() + b'\n'
+        assert archive.read('bbb', 'lscpu.out') == b'lscpu output'
+        paths = archive.extract('aaa', path=str(tmp_path / 'out'))
+    assert paths == [str(tmp_path / 'out' / 'aaa' / 'lscpu.out')]
+    with open(paths[0], 'rb') as f:
+        assert f.read() == b'lscpu output'
+
+
+def test_stored_objects_do_not_need_the_store(tmp_path):
+    store = MetadataStore(str(tmp_path / 'store'))
+    digest = store.put(b'lscpu output')
+    run = write_run(tmp_path, 'aaa', {'lscpu.ref': digest})
+    write_archive(str(tmp_path / 'first.zip'), [run],
+                  metadata_store=store.path)
+    os.remove(store.object_path(digest))
+    object_paths = write_archive(str(tmp_path / 'second.zip'), [run])
+    assert len(object_paths) == 1
+    with ResultsArchive(str(tmp_path / 'second.zip')) as archive:
+        assert archive.read('aaa', 'lscpu.out') == b'lscpu output'
+
+
+def test_unresolvable_reference_fails(tmp_path):
+    run = write_run(tmp_path, 'aaa', {'lscpu.ref': 'ab' * 32})
+    archive_path = str(tmp_path / 'hash.zip')
+    with pytest.raises(FileNotFoundError):
+        write_archive(archive_path, [run])
+    assert not os.path.exists(archive_path)
+
+
+def test_members_are_compressed_individually(tmp_path):
+    run = write_run(tmp_path, 'aaa', {'stdout': 'x' * 10000,
+                                      'plot.png': 'not compressible'})
+    archive_path = str(tmp_path / 'hash.zip')
+    write_archive(archive_path, [run])
+    with zipfile.ZipFile(archive_path) as zip_obj:
+        stdout = zip_obj.getinfo('aaa/stdout')
+        assert stdout.compress_type == zipfile.ZIP_DEFLATED
+        assert stdout.compress_size < stdout.file_size
+        assert zip_obj.getinfo('aaa/plot.png').compress_type \
+            == zipfile.ZIP_STORED
+    with ResultsArchive(archive_path) as archive:
+        paths = archive.extract('aaa', path=str(tmp_path / 'out'))
+    assert sorted(os.path.basename(p) for p in paths) == ['plot.png',
+                                                          'stdout']
@@ -0,0 +1,96 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from results_index import ResultsIndex, parse_filters
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = ResultsIndex(str(tmp_path / 'index.sqlite'))
+    for timer_hash, version, machine, nodes in [('h1', '3.5', 'jureca', 1),
+                                                ('h2', '3.6', 'jureca', 2),
+                                                ('h3', '3.6', 'juwels', 4)]:
+        path = tmp_path / f'{timer_hash}.csv'
+        pd.DataFrame({'num_nodes': [nodes, nodes],
+                      'rng_seed': [1, 2],
+                      'wall_time_sim': [10. / nodes, 11. / nodes]}
+                     ).to_csv(path)
+        index.add(str(path), {'key': timer_hash,
+                              'simulator-version': version,
+                              'machine': machine})
+    yield index
+    index.close()
+
+
+def test_query_filters(index):
+    df = index.query(**{'simulator-version': '3.6'})
+    assert sorted(df.timer_hash.unique()) == ['h2', 'h3']
+    assert len(df) == 4
+    df = index.query(machine='jureca', **{'simulator-version': '3.*'})
+    assert sorted(df.timer_hash.unique()) == ['h1', 'h2']
+
+
+def test_query_alternatives(index):
+    df = index.query(machine='{jureca,juwels}')
+    assert len(df.timer_hash.unique()) == 3
+
+
+def test_query_without_match(index):
+    assert index.query(machine='jusuf').empty
+    assert index.query(unknown_field='x').empty
+
+
+def test_add_replaces_rows(index, tmp_path):
+    path = tmp_path / 'h1.csv'
+    pd.DataFrame({'num_nodes': [1], 'rng_seed': [3],
+                  'wall_time_sim': [9.]}).to_csv(path)
+    index.add(str(path), {'key': 'h1', 'simulator-version': '3.5',
+                          'machine': 'jureca'})
+    df = index.query(**{'simulator-version': '3.5'})
+    assert list(df.rng_seed) == [3]
+
+
+def test_query_many_runs(tmp_path):
+    # more matching files than older sqlite builds accept bound parameters
+    index = ResultsIndex(str(tmp_path / 'index.sqlite'))
+    if hasattr(index.connection, 'setlimit'):
+        index.connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    hashes = [f'h{i}' for i in range(2000)]
+    with index.connection:
+        index._insert('runs', [{'timer_hash': h, 'file': f'{h}.csv',
+                                'machine': 'jureca'} for h in hashes])
+        index._insert('results', [{'timer_hash': h, 'wall_time_sim': 1.}
+                                  for h in hashes])
+    df = index.query(machine='jureca')
+    index.close()
+    assert len(df) == len(hashes)
+
+
+def test_runs(index):
+    runs = index.runs(machine='jureca')
+    assert sorted(runs.timer_hash) == ['h1', 'h2']
+
+
+def test_parse_filters():
+    assert parse_filters(['machine=jureca', 'simulator-version="3.6"']) \
+        == {'machine': 'jureca', 'simulator-version': '3.6'}
@@ -0,0 +1,75 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import numpy as np
+import pandas as pd
+
+from scaling_model import PhaseFit, ScalingModel
+
+
+def strong_scaling(seeds=3, noise=0., seed=1):
+    """
+    Phases following the model terms exactly, plus optional noise.
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for n in [1, 2, 4, 8, 16]:
+        for s in range(seeds):
+            update = 1. + 64. / n
+            deliver = 0.5 + 32. / n
+            collocate = 0.1 + 4. / n
+            communicate = 0.2 + 0.3 * np.log2(n) + 0.01 * n + 1. / n
+            phases = np.array([update, deliver, collocate, communicate]) \
+                * (1. + noise * rng.standard_normal(4))
+            rows.append({'num_nodes': n, 'rng_seed': s,
+                         'model_time_sim': 1000.,
+                         'wall_time_phase_update': phases[0],
+                         'wall_time_phase_deliver': phases[1],
+                         'wall_time_phase_collocate': phases[2],
+                         'wall_time_phase_communicate': phases[3],
+                         'wall_time_sim': phases.sum() + 0.5})
+    return pd.DataFrame(rows)
+
+
+def test_exact_data_is_recovered():
+    model = ScalingModel(strong_scaling())
+    update = model.summary()['wall_time_phase_update']
+    assert np.isclose(update['terms']['constant'], 1.)
+    assert np.isclose(update['terms']['inverse'], 64.)
+    assert np.isclose(update['r_squared'], 1.)
+    prediction = model.predict([32.])
+    expected = (1. + 2.) + (0.5 + 1.) + (0.1 + 0.125) \
+        + (0.2 + 1.5 + 0.32 + 1. / 32.) + 0.5
+    assert np.isclose(prediction.wall_time_sim[0], expected)
+    assert np.isclose(prediction.sim_factor[0], expected)
+
+
+def test_prediction_band_contains_mean():
+    model = ScalingModel(strong_scaling(noise=0.02))
+    prediction = model.predict([4., 64.])
+    assert (prediction.wall_time_sim_low < prediction.wall_time_sim).all()
+    assert (prediction.wall_time_sim < prediction.wall_time_sim_high).all()
+    # extrapolation is less certain than interpolation
+    width = prediction.wall_time_sim_high - prediction.wall_time_sim_low
+    assert width[1] > width[0]
+
+
+def test_terms_limited_by_distinct_node_counts():
+    fit = PhaseFit(['constant', 'log', 'linear', 'inverse'],
+                   np.array([1, 1, 2, 2]), np.array([3., 3.1, 2., 2.1]))
+    assert fit.terms == ['constant']
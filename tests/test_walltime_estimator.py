@@ -0,0 +1,79 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import numpy as np
+import pandas as pd
+
+from results_index import ResultsIndex
+from walltime_estimator import (estimate, expected_rtf, history,
+                                interpolate, to_walltime)
+
+
+def past_runs():
+    # perfect strong scaling, 100 s of simulation on one node for 1 s of
+    # model time, plus 20 s of construction
+    return pd.DataFrame({'num_nodes': [1, 1, 4, 4],
+                         'model_time_sim': 1000.,
+                         'wall_time_create': 10.,
+                         'wall_time_connect': 10.,
+                         'wall_time_sim': [100., 90., 25., 20.]})
+
+
+def test_to_walltime_rounds_up_to_minutes():
+    assert to_walltime(59.) == '00:01:00'
+    assert to_walltime(3601.) == '01:01:00'
+
+
+def test_interpolate_uses_slowest_seed():
+    df = past_runs().assign(value=lambda df: df.wall_time_sim)
+    assert np.isclose(interpolate(df, 1), 100.)
+    # power law between 1 and 4 nodes
+    assert np.isclose(interpolate(df, 2), 50.)
+    # extrapolated with the same slope
+    assert np.isclose(interpolate(df, 16), 100. / 16.)
+
+
+def test_interpolate_without_history():
+    df = past_runs().assign(value=0.)
+    assert interpolate(df, 2) is None
+
+
+def test_estimate_scales_model_time():
+    # 20 s setup + twice the simulation time of the slowest seed
+    assert np.isclose(estimate(past_runs(), 1, 2000.), 20. + 200.)
+
+
+def test_expected_rtf():
+    assert np.isclose(expected_rtf(past_runs(), 4), 25.)
+
+
+def test_history_prefers_matching_version_and_drops_aborted(tmp_path):
+    index = ResultsIndex(str(tmp_path / 'index.sqlite'))
+    for timer_hash, version, aborted in [('h1', '3.5', 0), ('h2', '3.6', 1),
+                                         ('h3', '3.6', 0)]:
+        path = tmp_path / f'{timer_hash}.csv'
+        past_runs().assign(aborted=aborted).to_csv(path)
+        index.add(str(path), {'key': timer_hash, 'model_name': 'mc',
+                              'machine': 'jureca',
+                              'simulator-version': version})
+    index.close()
+    df = history(str(tmp_path / 'index.sqlite'), 'mc', 'jureca', '3.6')
+    assert list(df.timer_hash.unique()) == ['h3']
+    # without runs of the version, all versions are used
+    df = history(str(tmp_path / 'index.sqlite'), 'mc', 'jureca', '3.7')
+    assert sorted(df.timer_hash.unique()) == ['h1', 'h3']
@@ -0,0 +1,119 @@
+"""
+beNNch - Unified execution, collection, analysis and
+comparison of neural network simulation benchmarks.
+Copyright (C) 2021 Forschungszentrum Juelich GmbH, INM-6
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <https://www.gnu.org/licenses/>.
+
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+
+import signal
+import subprocess
+
+import watchdog
+
+
+class Clock(object):
+    """
+    Fake time in which every sleep lets the simulation append a heartbeat.
+    """
+
+    def __init__(self, heartbeat, model_ms_per_sleep, two_columns=False):
+        self.now = 1000.
+        self.model_time = 0.
+        self.heartbeat = heartbeat
+        self.model_ms_per_sleep = model_ms_per_sleep
+        self.two_columns = two_columns
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.model_time += self.model_ms_per_sleep
+        with open(self.heartbeat, 'a') as f:
+            if self.two_columns:
+                f.write(f'{self.now} {self.model_time}\n')
+            else:
+                f.write(f'{self.model_time}\n')
+
+
+def run_watch(tmp_path, monkeypatch, model_ms_per_sleep, two_columns=False,
+              polls=50):
+    heartbeat = tmp_path / 'heartbeat'
+    clock = Clock(heartbeat, model_ms_per_sleep, two_columns)
+    monkeypatch.setattr(watchdog, 'time', clock)
+    remaining = [polls]
+
+    def alive(pid):
+        remaining[0] -= 1
+        return remaining[0] >= 0
+
+    aborted = []
+    monkeypatch.setattr(watchdog, 'alive', alive)
+    monkeypatch.setattr(watchdog, 'abort',
+                        lambda *args: aborted.append(args))
+    # expected: 10 s per 1000 ms of model time
+    reason = watchdog.watch(1, str(heartbeat), str(tmp_path / 'aborted'),
+                            expected_rtf=10., multiple=3.,
+                            model_time_sim=1000., interval=10.)
+    return reason, aborted
+
+
+def test_slow_single_column_heartbeat_aborts(tmp_path, monkeypatch):
+    # 10 ms of model time per 10 s, a real-time factor of 1000
+    reason, aborted = run_watch(tmp_path, monkeypatch, 10.)
+    assert reason is not None and 'real-time factor' in reason
+    assert len(aborted) == 1
+
+
+def test_slow_two_column_heartbeat_aborts(tmp_path, monkeypatch):
+    reason, aborted = run_watch(tmp_path, monkeypatch, 10., two_columns=True)
+    assert reason is not None
+    assert len(aborted) == 1
+
+
+def test_abort_terminates_the_watched_process(tmp_path, monkeypatch):
+    heartbeat = tmp_path / 'heartbeat'
+    monkeypatch.setattr(watchdog, 'time', Clock(heartbeat, 10.))
+    abort_file = tmp_path / 'aborted'
+    with subprocess.Popen(['sleep', '60']) as proc:
+        try:
+            reason = watchdog.watch(proc.pid, str(heartbeat),
+                                    str(abort_file), expected_rtf=10.,
+                                    multiple=3., model_time_sim=1000.,
+                                    interval=10.)
+        finally:
+            proc.kill()
+        assert proc.wait(timeout=10) == -signal.SIGTERM
+    assert abort_file.read_text() == reason + '\n'
+
+
+def test_expected_heartbeat_runs_to_completion(tmp_path, monkeypatch):
+    # 1000 ms of model time per 10 s, as expected
+    reason, aborted = run_watch(tmp_path, monkeypatch, 1000., polls=5)
+    assert reason is None
+    assert aborted == []
+
+
+def test_projected_rtf():
+    assert watchdog.projected_rtf([(0., 0.), (20., 100.)]) == 200.
+    assert watchdog.projected_rtf([(0., 100.), (20., 100.)]) is None
+
+
+def test_partial_line_is_ignored(tmp_path):
+    heartbeat = tmp_path / 'heartbeat'
+    heartbeat.write_text('100\n20')
+    seen_at = []
+    entries = watchdog.read_heartbeat(str(heartbeat), seen_at)
+    assert [model for _, model in entries] == [100.]
+    assert len(seen_at) == 1